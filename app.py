@@ -1,12 +1,20 @@
 import dash
-from dash.dependencies import Input, Output
+from dash import dcc, html
+from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
 import pandas as pd
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from layout import layout
-from marl_simulation import run_marl_simulation_step
+from layout import build_layout
+from map_figures import base_map_figure, MapPatcher
+import marl_simulation
+from marl_simulation import run_marl_simulation_step, new_session
+from simulation_session import SessionRegistry
+from transit_queue import TransitQueue
+import dataset_cache
 import warnings
+import threading
+import weakref
+import uuid
 import os
 
 # To ignore the warning about the Scattermap
@@ -27,45 +35,77 @@ SPEED_MULTIPLIER = SIM_TOTAL_SECONDS / SIM_DURATION_REAL_SECONDS # Every real se
 BUSY_THRESHOLD = 122.94 + 48.96    # ≈ 188
 UNDERUSED_THRESHOLD = 122.94 - 48.96    # ≈ 58
 
-# === Load data ===
-station_df = pd.read_csv("datasets/all_stations.csv")
+# === Load data (parsed once, then memory-mapped from datasets/.cache) ===
+station_df = dataset_cache.read_csv("datasets/all_stations.csv")
 station_df['lat'] = pd.to_numeric(station_df['lat'], errors='coerce')
 station_df['lon'] = pd.to_numeric(station_df['lon'], errors='coerce')
 station_df = station_df.dropna(subset=['lat', 'lon'])  # Drop stations with missing coords
 
+# Static station geometry, in map trace order
+station_sids = station_df['station_id'].astype(str).tolist()
+
 trip_dfs = {
-    "2022-05-05": pd.read_csv("datasets/all_trips_05_05.csv", parse_dates=["start_time", "end_time"]),
-    "2022-05-11": pd.read_csv("datasets/all_trips_05_11.csv", parse_dates=["start_time", "end_time"]),
+    "2022-05-05": dataset_cache.read_csv("datasets/all_trips_05_05.csv", parse_dates=["start_time", "end_time"]),
+    "2022-05-11": dataset_cache.read_csv("datasets/all_trips_05_11.csv", parse_dates=["start_time", "end_time"]),
 }
 
 station_stats = {
-    "2022-05-05": pd.read_csv("datasets/station_stats_2022-05-05.csv"),
-    "2022-05-11": pd.read_csv("datasets/station_stats_2022-05-11.csv")
+    "2022-05-05": dataset_cache.read_csv("datasets/station_stats_2022-05-05.csv"),
+    "2022-05-11": dataset_cache.read_csv("datasets/station_stats_2022-05-11.csv")
+}
+
+# station_id -> (total_outgoing, total_incoming), instead of scanning station_stats per station
+station_trip_totals = {
+    date: {
+        str(sid): (int(out), int(inc))
+        for sid, out, inc in zip(df["station_id"], df["total_outgoing"], df["total_incoming"])
+    }
+    for date, df in station_stats.items()
 }
 
 # === Dash App ===
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
 app.title = "Madrid Bike-Sharing Map Simulation"
-app.layout = layout
-
-if not os.path.exists("missed_trips.csv"):
-    pd.DataFrame(columns=[
-        "trip_id", "start_time", "end_time", "start_station_id", "end_station_id", "simulated_day"
-    ]).to_csv("datasets/missed_trips.csv", index=False)
-
-# === Global simulation state ===
-stations_global = {} #  dict of current bikes per station {station_id: bike_count}
-in_transit_bikes_global = {} # bikes currently being used, scheduled to return at end_time
-last_update_time_global = {} # last simulation time processed per date
-last_frame_global = {} # last Dash frame (n) processed per date
-
-stations_marl_global = {}
-in_transit_marl_global = {}
-last_update_marl_global = {}
-last_frame_marl_frame = {}
-redistribution_in_transit = {}
+
+# Static base figure of every map, built once: it ships with the page, so each frame
+# (n = 0 included) only sends a Patch, and a lost response is repaired by the next one
+_base_figures = {}
+
+def base_figures():
+    if not _base_figures:
+        basic = base_map_figure(station_df, BASIC_OVERLAY_MARKERS, station_opacity=0.9).to_dict()
+        marl  = marl_simulation.base_map().to_dict()
+        _base_figures.update(map_05_05=basic, map_05_11=basic, map_marl_05_05=marl, map_marl_05_11=marl)
+    return _base_figures
+
+# Every page load gets its own session id (the interval restarts at n = 0 on reload too)
+def serve_layout():
+    return html.Div([dcc.Store(id="session-id", data=uuid.uuid4().hex), build_layout(base_figures())])
+
+app.layout = serve_layout
+
+# === Simulation state: one SimulationSession per browser session ===
+# The first open tab writes the plain filenames the notebooks read (datasets/missed_trips.csv, ...);
+# tabs opened while it is still alive write copies suffixed with their session id.
+_plain_outputs_owner = lambda: None  # weakref to the session holding the plain filenames
+_plain_outputs_lock  = threading.Lock()
+
+def new_tab_session(session_id):
+    global _plain_outputs_owner
+    with _plain_outputs_lock:
+        owner = _plain_outputs_owner()
+        suffix_outputs = owner is not None and owner.session_id != session_id
+        session = new_session(session_id, suffix_outputs=suffix_outputs)
+        if not suffix_outputs:
+            _plain_outputs_owner = weakref.ref(session)
+    return session
+
+sessions = SessionRegistry(factory=new_tab_session)
 STATION_CAPACITY = 30
 
+# Overlay trace under the station markers: black halo for stations that just missed a trip
+BASIC_OVERLAY_MARKERS = [dict(color="black", opacity=1)]
+
 # === Helper functions ===
 def get_color(bike_count):
     if bike_count == 0: return "red"
@@ -73,33 +113,20 @@ def get_color(bike_count):
     elif 15 < bike_count <= 30: return "green"
     else: return "blue"
 
-# === Simulation Callback ===
-@app.callback(
-    [Output('map_05_05', 'figure'),
-     Output('map_05_11', 'figure'),
-     Output('progress-bar', 'value'),
-     Output('missed-trips-05', 'children'),
-     Output('missed-trips-11', 'children'),
-     Output('current-time', 'children'),
-     Output('summary-left', 'children'),
-     Output('summary-right', 'children'),],
-    Input('interval-component', 'n_intervals')
-)
-def update_dual_simulation(n):
+# === Basic simulation step (no redistribution) ===
+def run_basic_simulation_step(session, n):
     summary_left_text = ""
     summary_right_text = ""
     results = []
     for selected_date_str in ["2022-05-05", "2022-05-11"]:
-        global stations_global, last_update_time_global
-
         # Prevent duplicate interval processing
-        if selected_date_str not in last_frame_global:
-            last_frame_global[selected_date_str] = -1
+        if selected_date_str not in session.last_frame:
+            session.last_frame[selected_date_str] = -1
 
-        if n <= last_frame_global[selected_date_str]:
+        if n <= session.last_frame[selected_date_str]:
             raise dash.exceptions.PreventUpdate
 
-        last_frame_global[selected_date_str] = n
+        session.last_frame[selected_date_str] = n
 
         trip_df = trip_dfs[selected_date_str]
         sim_date = datetime.strptime(selected_date_str, "%Y-%m-%d")
@@ -107,27 +134,27 @@ def update_dual_simulation(n):
         progress_percent = int(min((n / 300) * 100, 100))
 
         # Create pending return list if it's the first time
-        if selected_date_str not in in_transit_bikes_global:
-            in_transit_bikes_global[selected_date_str] = []
+        if selected_date_str not in session.in_transit_bikes:
+            session.in_transit_bikes[selected_date_str] = TransitQueue()
 
-        pending_returns = in_transit_bikes_global[selected_date_str]
+        pending_returns = session.in_transit_bikes[selected_date_str]
 
         # Stations start with 5 bikes and the simulation starts from midnight of the chosen day
         if (
-            selected_date_str not in stations_global or
-            selected_date_str not in in_transit_bikes_global or
-            selected_date_str not in last_update_time_global
+            selected_date_str not in session.stations or
+            selected_date_str not in session.in_transit_bikes or
+            selected_date_str not in session.last_update_time
         ):
             sim_date = datetime.strptime(selected_date_str, "%Y-%m-%d")
-            in_transit_bikes_global[selected_date_str] = []
-            last_update_time_global[selected_date_str] = sim_date
+            session.in_transit_bikes[selected_date_str] = TransitQueue()
+            session.last_update_time[selected_date_str] = sim_date
 
             if selected_date_str == "2022-05-05":
-                with open("datasets/missed_trips.csv", "w") as f:
+                with open(session.output_path("datasets/missed_trips.csv"), "w") as f:
                     f.write("")
 
             # Reset bikes and timer
-            stations_global[selected_date_str] = {
+            session.stations[selected_date_str] = {
                 str(sid): {
                     "bike_count": 30,
                     "final_missed_trips": 0,
@@ -141,37 +168,35 @@ def update_dual_simulation(n):
                     "healthy_time": 0,
                     "availability_sum": 0
                 }for sid in station_df['station_id']}
-            last_update_time_global[selected_date_str] = sim_date
+            session.last_update_time[selected_date_str] = sim_date
 
-        bike_counts = stations_global[selected_date_str]
-        last_time = last_update_time_global[selected_date_str]
+        bike_counts = session.stations[selected_date_str]
+        last_time = session.last_update_time[selected_date_str]
         
         # Return bikes whose end_time has arrived
-        to_return = [trip for trip in pending_returns if trip['end_time'] <= current_sim_time]
-        for trip in to_return:
+        for trip in pending_returns.pop_due(current_sim_time):
             end_id = trip['end_id']
-            if end_id in stations_global[selected_date_str]:
-                stations_global[selected_date_str][end_id]["bike_count"] += 1
+            if end_id in session.stations[selected_date_str]:
+                session.stations[selected_date_str][end_id]["bike_count"] += 1
             else:
-                print(f"⚠️ Warning: End station {end_id} not found in stations_global for {selected_date_str}")
-            pending_returns.remove(trip)
+                print(f"⚠️ Warning: End station {end_id} not found in stations for {selected_date_str}")
         
         # Track how often each station is empty or full
-        for sid in stations_global[selected_date_str]:
-            bike_count = stations_global[selected_date_str][sid]["bike_count"]
+        for sid in session.stations[selected_date_str]:
+            bike_count = session.stations[selected_date_str][sid]["bike_count"]
             if bike_count == 0:
-                stations_global[selected_date_str][sid]["was_empty"] += 1
+                session.stations[selected_date_str][sid]["was_empty"] += 1
             elif bike_count >= 27:
-                stations_global[selected_date_str][sid]["was_full"] += 1
+                session.stations[selected_date_str][sid]["was_full"] += 1
 
             #  Count healthy frames 
             if 16 <= bike_count <= 30:
-                stations_global[selected_date_str][sid]["healthy_time"] += 1
+                session.stations[selected_date_str][sid]["healthy_time"] += 1
                 
             # Track availability % over time
-            if "availability_sum" not in stations_global[selected_date_str][sid]:
-                stations_global[selected_date_str][sid]["availability_sum"] = 0
-            stations_global[selected_date_str][sid]["availability_sum"] +=  bike_count / STATION_CAPACITY * 100
+            if "availability_sum" not in session.stations[selected_date_str][sid]:
+                session.stations[selected_date_str][sid]["availability_sum"] = 0
+            session.stations[selected_date_str][sid]["availability_sum"] +=  bike_count / STATION_CAPACITY * 100
 
 
         new_trips = trip_df[
@@ -180,8 +205,8 @@ def update_dual_simulation(n):
         ]
         
         missed_trip_rows = []
-        for sid in stations_global[selected_date_str]:
-            stations_global[selected_date_str][sid]["just_missed"] = False
+        for sid in session.stations[selected_date_str]:
+            session.stations[selected_date_str][sid]["just_missed"] = False
 
 
         for _, trip in new_trips.iterrows():
@@ -189,15 +214,15 @@ def update_dual_simulation(n):
             end_id = str(trip['end_station_id'])
             end_time = trip['end_time']
 
-            if start_id in stations_global[selected_date_str]:
-                if stations_global[selected_date_str][start_id]["bike_count"] > 0:
-                    stations_global[selected_date_str][start_id]["bike_count"] -= 1
-                    in_transit_bikes_global[selected_date_str].append({
+            if start_id in session.stations[selected_date_str]:
+                if session.stations[selected_date_str][start_id]["bike_count"] > 0:
+                    session.stations[selected_date_str][start_id]["bike_count"] -= 1
+                    session.in_transit_bikes[selected_date_str].append({
                         "end_time": end_time,
                         "end_id": end_id
                     })
-                    stations_global[selected_date_str][start_id]["completed_trips"] += 1
-                    stations_global[selected_date_str][start_id]["activity_count"] += 1
+                    session.stations[selected_date_str][start_id]["completed_trips"] += 1
+                    session.stations[selected_date_str][start_id]["activity_count"] += 1
 
                 else:
                     missed_trip_rows.append({
@@ -208,25 +233,25 @@ def update_dual_simulation(n):
                         "end_station_id": end_id,
                         "simulated_day": selected_date_str
                     })
-                    stations_global[selected_date_str][start_id]["final_missed_trips"] += 1
-                    stations_global[selected_date_str][start_id]["has_missed"] = True
-                    stations_global[selected_date_str][start_id]["just_missed"] = True  
-                    stations_global[selected_date_str][start_id]["activity_count"] += 1
+                    session.stations[selected_date_str][start_id]["final_missed_trips"] += 1
+                    session.stations[selected_date_str][start_id]["has_missed"] = True
+                    session.stations[selected_date_str][start_id]["just_missed"] = True  
+                    session.stations[selected_date_str][start_id]["activity_count"] += 1
             else:
-                print(f"⚠️ Skipped trip: Start station {start_id} not found in stations_global for {selected_date_str}")
+                print(f"⚠️ Skipped trip: Start station {start_id} not found in stations for {selected_date_str}")
 
         if missed_trip_rows:
             new_df = pd.DataFrame(missed_trip_rows)
 
             if not new_df.empty:
-                append_df_with_header_check(new_df, "datasets/missed_trips.csv")
+                append_df_with_header_check(new_df, session.output_path("datasets/missed_trips.csv"))
 
-        last_update_time_global[selected_date_str] = current_sim_time
+        session.last_update_time[selected_date_str] = current_sim_time
         
         # Export stats once simulation reaches 100%
         if progress_percent == 100:
             # Evaluate and assign status
-            for sid, data in stations_global[selected_date_str].items():
+            for sid, data in session.stations[selected_date_str].items():
                 total_frames = 300  # or use n if dynamic
                 empty_ratio = data["was_empty"] / total_frames
                 full_ratio = data["was_full"] / total_frames
@@ -245,9 +270,9 @@ def update_dual_simulation(n):
 
                 data["status"] = status
             
-            total_completed = sum(data["completed_trips"] for data in stations_global[selected_date_str].values())
-            total_missed = sum(data["final_missed_trips"] for data in stations_global[selected_date_str].values())
-            total_bikes = sum(data["bike_count"] for data in stations_global[selected_date_str].values())
+            total_completed = sum(data["completed_trips"] for data in session.stations[selected_date_str].values())
+            total_missed = sum(data["final_missed_trips"] for data in session.stations[selected_date_str].values())
+            total_bikes = sum(data["bike_count"] for data in session.stations[selected_date_str].values())
             
             if (total_completed + total_missed) > 0:
                 trip_completion_rate = round((total_completed / (total_completed + total_missed)) * 100, 2)
@@ -256,7 +281,7 @@ def update_dual_simulation(n):
                 
             station_availabilities = [
                 data["availability_sum"] / 300  # 300 frames in a day
-                for data in stations_global[selected_date_str].values()
+                for data in session.stations[selected_date_str].values()
                 if "availability_sum" in data
             ]
             overall_availability = round(sum(station_availabilities) / len(station_availabilities), 2)
@@ -274,7 +299,7 @@ def update_dual_simulation(n):
                 "avg_availability": overall_availability
             }
 
-            summary_path = "datasets/daily_summary.csv"
+            summary_path = session.output_path("datasets/daily_summary.csv")
             write_header = not os.path.exists(summary_path) or os.stat(summary_path).st_size == 0
             pd.DataFrame([summary_row]).to_csv(summary_path, mode="a", header=write_header, index=False)
             
@@ -286,16 +311,9 @@ def update_dual_simulation(n):
             
             # Prepare CSV export    
             stats_rows = []
-            for sid, data in stations_global[selected_date_str].items():
+            for sid, data in session.stations[selected_date_str].items():
                 # Get total outgoing/incoming from precomputed stats
-                stat_row = station_stats[selected_date_str]
-                stat_row = stat_row[stat_row["station_id"] == sid]
-                if not stat_row.empty:
-                    outgoing = int(stat_row["total_outgoing"].values[0])
-                    incoming = int(stat_row["total_incoming"].values[0])
-                else:
-                    outgoing = 0
-                    incoming = 0
+                outgoing, incoming = station_trip_totals[selected_date_str].get(sid, (0, 0))
                 
                 healthy_frames = data.get("healthy_time", 0)
                 healthy_percentage = round(healthy_frames / total_frames * 100)
@@ -311,110 +329,71 @@ def update_dual_simulation(n):
                     "total_incoming": incoming,
                     "healthy_percentage": healthy_percentage
                 })
-            pd.DataFrame(stats_rows).to_csv(f"datasets/station_stats_{selected_date_str}.csv", index=False)
+            pd.DataFrame(stats_rows).to_csv(session.output_path(f"datasets/station_stats_{selected_date_str}.csv"), index=False)
             
-        # === Create the map figure ===
-        latitudes = []
-        longitudes = []
-        colors = []
-        sizes = []
-        hover_texts = []
-        missed_flags = [stations_global[selected_date_str][str(row["station_id"])]["just_missed"] for _, row in station_df.iterrows()]
-
-        for _, row in station_df.iterrows():
-            sid = str(row['station_id'])
-            lat = row['lat']
-            lon = row['lon']
-            name = row['station_name']
-            count = stations_global[selected_date_str][sid]["bike_count"]
-            color = get_color(count)
-
-            latitudes.append(lat)
-            longitudes.append(lon)
-            colors.append(color)
-            sizes.append(min(9 + 0.5 * count, 15))
-            # Only show status in tooltip if simulation is complete
-            status = stations_global[selected_date_str][sid]["status"]
-    
-            if progress_percent == 100:
-                status = stations_global[selected_date_str][sid]["status"]
-                
+        # === Map update: marker patches on the base figure sent with the layout (only what changed) ===
+        stations_now = session.stations[selected_date_str]
+        counts = [stations_now[sid]["bike_count"] for sid in station_sids]
+        sizes = [min(9 + 0.5 * count, 15) for count in counts]
+        missed_flags = [stations_now[sid]["just_missed"] for sid in station_sids]
+
+        frame = {
+            "colors": [get_color(count) for count in counts],
+            "sizes": sizes,
+            "customdata": [[count, round(100 * count / STATION_CAPACITY, 2)] for count in counts],
+            # Black halo trace (for missed trips), size 0 elsewhere
+            "overlays": [{"size": [size + 5 if flag else 0 for size, flag in zip(sizes, missed_flags)]}],
+        }
+
+        # Only show status in tooltip if simulation is complete
+        if progress_percent == 100:
+            hover_texts = []
+            for sid, name, count in zip(station_sids, station_df['station_name'], counts):
+                status = stations_now[sid]["status"]
+
                 # Lookup trip info for this station
-                stats_row = station_stats[selected_date_str]
-                stats_row = stats_row[stats_row["station_id"] == sid]
-                if not stats_row.empty:
-                    outgoing = int(stats_row["total_outgoing"].values[0])
-                    incoming = int(stats_row["total_incoming"].values[0])
+                if sid in station_trip_totals[selected_date_str]:
+                    outgoing, incoming = station_trip_totals[selected_date_str][sid]
                     trips_line = f"<br>Total Outgoing / Incoming: {outgoing} / {incoming}"
                 else:
                     trips_line = ""
 
                 status_line = f"<br>Status: {status}"
-                missed_line = f"<br>Missed Trips: {stations_global[selected_date_str][sid]['final_missed_trips']}"
-                healthy_frames = stations_global[selected_date_str][sid].get("healthy_time", 0)
+                missed_line = f"<br>Missed Trips: {stations_now[sid]['final_missed_trips']}"
+                healthy_frames = stations_now[sid].get("healthy_time", 0)
                 healthy_percentage = round(healthy_frames / total_frames * 100)
                 healthy_line = f"<br>Healthy Time: {healthy_percentage}%"
-                avg_availability = round(stations_global[selected_date_str][sid]["availability_sum"] / total_frames, 2)
+                avg_availability = round(stations_now[sid]["availability_sum"] / total_frames, 2)
                 availability_rate = f"<br><b>Avg Availability: {avg_availability}%"
-            else:
-                status_line = ""
-                trips_line = ""
-                missed_line = ""
-                healthy_line = ""
-                availability = round(100 * count / STATION_CAPACITY, 2)
-                availability_rate = f"<br>Availability: {availability}%"
-
-            hover_texts.append(f"{name}<br><br>Bikes: {count}{status_line}{trips_line}{missed_line}{healthy_line}{availability_rate}")
-
-        fig = go.Figure()
-
-        # Black halo trace (for missed trips)
-        fig.add_trace(go.Scattermapbox(
-            lat=[latitudes[i] for i in range(len(latitudes)) if missed_flags[i]],
-            lon=[longitudes[i] for i in range(len(longitudes)) if missed_flags[i]],
-            mode="markers",
-            marker=go.scattermapbox.Marker(
-                size=[sizes[i] + 5 for i in range(len(sizes)) if missed_flags[i]],
-                color="black",
-                opacity=1,
-            ),
-            hoverinfo='skip',
-            showlegend=False
-        ))
-
-        # Actual station trace
-        fig.add_trace(go.Scattermapbox(
-            lat=latitudes,
-            lon=longitudes,
-            mode="markers",
-            marker=go.scattermapbox.Marker(
-                size=sizes,
-                color=colors,
-                opacity=0.9
-            ),
-            text=hover_texts,
-            hoverinfo='text',
-            name="Stations"
-        ))
-
-        fig.update_layout(
-            mapbox=dict(                
-                style="carto-positron",  
-                center=dict(
-                    lat=sum(latitudes) / len(latitudes),
-                    lon=sum(longitudes) / len(longitudes)
-                ),
-                zoom=12
-            ),
-            margin=dict(l=0, r=0, t=0, b=0),
-            paper_bgcolor="rgba(0,0,0,0)", 
-            plot_bgcolor="rgba(0,0,0,0)",
-            showlegend=False
-        )
-        results.extend([fig, f"❌ Missed trips: {len(missed_trip_rows)}"])
+
+                hover_texts.append(f"{name}<br><br>Bikes: {count}{status_line}{trips_line}{missed_line}{healthy_line}{availability_rate}")
+            frame["hovertext"] = hover_texts
+
+        map_id = f"basic {selected_date_str}"
+        if map_id not in session.map_patchers:
+            session.map_patchers[map_id] = MapPatcher()
+        results.extend([session.map_patchers[map_id].patch(frame), f"❌ Missed trips: {len(missed_trip_rows)}"])
 
     return (results[0], results[2], progress_percent, results[1], results[3], f"Time:  {current_sim_time.strftime('%H:%M')}", summary_left_text, summary_right_text )
 
+# === Simulation Callbacks ===
+@app.callback(
+    [Output('map_05_05', 'figure'),
+     Output('map_05_11', 'figure'),
+     Output('progress-bar', 'value'),
+     Output('missed-trips-05', 'children'),
+     Output('missed-trips-11', 'children'),
+     Output('current-time', 'children'),
+     Output('summary-left', 'children'),
+     Output('summary-right', 'children'),],
+    Input('interval-component', 'n_intervals'),
+    State('session-id', 'data')
+)
+def update_dual_simulation(n, session_id):
+    session = sessions.get(session_id)
+    with session.lock:
+        return run_basic_simulation_step(session, n)
+
 @app.callback(
     [Output('map_marl_05_05', 'figure'),
      Output('map_marl_05_11', 'figure'),
@@ -422,11 +401,15 @@ def update_dual_simulation(n):
      Output('missed-trips-marl-11', 'children'),
      Output('summary-marl-left', 'children'),
      Output('summary-marl-right', 'children')],
-    Input('interval-component', 'n_intervals')
+    Input('interval-component', 'n_intervals'),
+    State('session-id', 'data')
 )
-def update_marl_simulation(n):
-    return run_marl_simulation_step(n, stations_marl_global, in_transit_marl_global, last_update_marl_global, last_frame_marl_frame, redistribution_in_transit)
+def update_marl_simulation(n, session_id):
+    session = sessions.get(session_id)
+    with session.lock:
+        return run_marl_simulation_step(session, n)
 
 # === Run the app ===
 if __name__ == '__main__':
+    marl_simulation.load()  # datasets + DQN agent up front, not on the first MARL frame
     app.run(debug=True)
\ No newline at end of file
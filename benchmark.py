@@ -0,0 +1,355 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Throughput benchmarks for the MARL engine, on the bundled May 5 / May 11 data and
+# on synthetic copies of it with every station (and its trips) replicated `scale` times.
+# Each (case, scale) runs in its own spawned process, after the datasets, demand
+# matrices and trip indexes are loaded, so timings leave startup out and the peak
+# RSS is that case's own. The per-phase breakdown comes from the step's own
+# step_profiler laps (trips, capacity, returns, dqn_update, ...). Results are compared
+# against the baseline stored next to this script (benchmark_baseline.json).
+#
+#   python benchmark.py                                 # every case on the bundled data
+#   python benchmark.py --scale 1 10 100 --save-baseline
+#   python benchmark.py --cases step simulate_one_day   # exits with 1 on a regression
+
+BASELINE_PATH = "benchmark_baseline.json"
+SYNTHETIC_DIR = os.path.join("datasets", ".cache", "benchmark")
+
+# metric -> True if higher is better (regressions are checked in that direction)
+METRICS = {
+    "frames_per_sec":  True,
+    "trips_per_sec":   True,
+    "updates_per_sec": True,
+    "max_frame_ms":    False,
+    "seconds_per_day": False,
+    "ms_per_call":     False,
+    "draw_map_ms":     False,
+    "patch_map_ms":    False,
+    "patch_kb":        False,
+    "peak_rss_mb":     False,
+}
+
+def peak_rss_mb():
+    """ High-water mark of this process's resident memory. """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KB elsewhere
+
+# =========================== Datasets ===========================
+def synthetic_dataset(scale):
+    """
+    Paths of the stations/stats/trip CSVs for one scale: the bundled files for 1,
+    otherwise `scale` copies of every station ("72", "72_1", ...), each copy shifted
+    on the map and with its own copy of the trips between its stations.
+    Written once under datasets/.cache/benchmark.
+    """
+    import marl_simulation as sim
+    if scale == 1:
+        return {"stations": sim.STATIONS_PATH, "stats": sim.STATS_PATH, "trips": dict(sim.TRIP_PATHS)}
+
+    out = os.path.join(SYNTHETIC_DIR, f"x{scale}")
+    def scaled(path):
+        # distinct names: dataset_cache keeps one entry per file name
+        root, ext = os.path.splitext(os.path.basename(path))
+        return os.path.join(out, f"{root}_x{scale}{ext}")
+    paths = {
+        "stations": scaled(sim.STATIONS_PATH),
+        "stats":    scaled(sim.STATS_PATH),
+        "trips":    {date: scaled(path) for date, path in sim.TRIP_PATHS.items()},
+    }
+    if os.path.exists(os.path.join(out, ".complete")):
+        return paths
+
+    os.makedirs(out, exist_ok=True)
+    def replicate(df, id_columns, shift=None):
+        copies = []
+        for c in range(scale):
+            part = df.copy()
+            if c:
+                for column in id_columns:
+                    part[column] = part[column].astype(str) + f"_{c}"
+                if shift:
+                    shift(part, c)
+            copies.append(part)
+        return pd.concat(copies, ignore_index=True)
+
+    def move_tile(part, c):
+        # tile the copies side by side (the real network spans ~0.1° each way)
+        part["lat"] += 0.15 * (c % 10)
+        part["lon"] += 0.20 * (c // 10)
+
+    replicate(pd.read_csv(sim.STATIONS_PATH), ["station_id", "station_name"], move_tile).to_csv(
+        paths["stations"], index=False)
+    replicate(pd.read_csv(sim.STATS_PATH), ["station_id"]).to_csv(paths["stats"], index=False)
+    for date, path in sim.TRIP_PATHS.items():
+        trips = pd.read_csv(path)
+        id_step = int(trips["trip_id"].max()) + 1
+        def new_trip_ids(part, c):
+            part["trip_id"] += c * id_step
+        replicate(trips, ["start_station_id", "end_station_id"], new_trip_ids).to_csv(
+            paths["trips"][date], index=False)
+
+    open(os.path.join(out, ".complete"), "w").close()
+    return paths
+
+# =========================== Cases ===========================
+# Each case gets the loaded marl_simulation module and returns (metrics, phases)
+
+def profiled_session(sim):
+    """ A session without file output whose step laps go to an in-memory StepProfiler. """
+    from step_profiler import StepProfiler
+    session = sim.new_session("benchmark", write_outputs=False)
+    session.profiler = StepProfiler(path=None)
+    return session
+
+def phase_shares(session):
+    """ Share of the profiled time spent in each step_profiler phase, largest first. """
+    totals = session.profiler.phase_totals()
+    total  = sum(totals.values()) or 1.0
+    return {phase: round(ms / total, 4) for phase, ms in sorted(totals.items(), key=lambda item: -item[1])}
+
+def trips_seen(session):
+    return sum(int(st.completed_trips.sum() + st.missed_trips.sum()) for st in session.stations_marl.values())
+
+def run_frames(sim, session, repeat, step):
+    """ `repeat` full days of `step(session, n)`, timed per frame. """
+    total = slowest = 0.0
+    trips = 0
+    for _ in range(repeat):
+        session.reset_marl()
+        for n in range(sim.STEPS_PER_DAY + 1):
+            t0 = time.perf_counter()
+            step(session, n)
+            elapsed = time.perf_counter() - t0
+            total  += elapsed
+            slowest = max(slowest, elapsed)
+        trips += trips_seen(session)
+
+    metrics = {
+        "frames_per_sec": round(repeat * (sim.STEPS_PER_DAY + 1) / total, 2),
+        "trips_per_sec":  round(trips / total, 1),
+        "max_frame_ms":   round(1000 * slowest, 2),
+    }
+    return metrics, phase_shares(session)
+
+def bench_step(sim, repeat):
+    """ run_marl_headless_step: the engine alone, every simulated date per frame. """
+    return run_frames(sim, profiled_session(sim), repeat, sim.run_marl_headless_step)
+
+def bench_dash_step(sim, repeat):
+    """ run_marl_simulation_step: the engine plus the map figures / patches the Dash callback sends. """
+    return run_frames(sim, profiled_session(sim), repeat, sim.run_marl_simulation_step)
+
+def bench_simulate_one_day(sim, repeat):
+    """ simulate_one_day, end-of-day training included. """
+    session = profiled_session(sim)
+    total = trips = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        sim.simulate_one_day(session)
+        total += time.perf_counter() - t0
+        trips += trips_seen(session)
+    return {"seconds_per_day": round(total / repeat, 3), "trips_per_sec": round(trips / total, 1)}, phase_shares(session)
+
+def bench_historical_demand(sim, repeat):
+    """ load_historical_demand on each simulated date's trips. """
+    from marl_demand_utils import load_historical_demand
+    total = trips = calls = 0
+    for _ in range(repeat):
+        for date in sim.SIM_DATES:
+            df = sim.trip_dfs[date]
+            t0 = time.perf_counter()
+            load_historical_demand(df, sim.station_ids)
+            total += time.perf_counter() - t0
+            trips += len(df)
+            calls += 1
+    return {"ms_per_call": round(1000 * total / calls, 2), "trips_per_sec": round(trips / total, 1)}, {}
+
+def bench_draw_map(sim, repeat):
+    """
+    draw_map (full figure) at midday state, then patch_map (per-frame update) over the
+    frames that follow: time per patch and its JSON size, as the dashboard sends them.
+    """
+    from plotly.utils import PlotlyJSONEncoder
+    session = sim.new_session("benchmark", write_outputs=False)
+    noon = sim.STEPS_PER_DAY // 2
+    for n in range(noon + 1):
+        sim.run_marl_headless_step(session, n)
+    date = session.dates[0]
+    stations, current_time = session.stations_marl[date], session.last_update_marl[date]
+
+    sim.draw_map(stations, sim.station_df, current_time)  # warm-up (plotly validators)
+    t0 = time.perf_counter()
+    for _ in range(repeat * 10):
+        sim.draw_map(stations, sim.station_df, current_time)
+    timings = {"draw_map_ms": round(1000 * (time.perf_counter() - t0) / (repeat * 10), 2)}
+
+    elapsed, payload, frames = 0.0, 0, repeat * 10
+    for n in range(noon + 1, noon + 1 + frames):
+        sim.run_marl_headless_step(session, n)
+        t0 = time.perf_counter()
+        patch = sim.patch_map(session, "benchmark", session.stations_marl[date], session.last_update_marl[date])
+        elapsed += time.perf_counter() - t0
+        payload += len(json.dumps(patch.to_plotly_json(), cls=PlotlyJSONEncoder))
+    timings["patch_map_ms"] = round(1000 * elapsed / frames, 2)
+    timings["patch_kb"]     = round(payload / frames / 1024, 2)
+    return timings, {}
+
+def bench_dqn_update(sim, repeat):
+    """ DQNAgent.update on a replay buffer filled with random transitions. """
+    agent = sim.shared_agent
+    n = 10_000
+    agent.store_transitions(np.random.rand(n, sim.state_dim).astype(np.float32),
+                            np.random.randint(sim.action_dim, size=n),
+                            np.random.randn(n).astype(np.float32),
+                            np.random.rand(n, sim.state_dim).astype(np.float32),
+                            np.zeros(n, dtype=np.float32))
+    updates = repeat * 500
+    t0 = time.perf_counter()
+    for _ in range(updates):
+        agent.update()
+    return {"updates_per_sec": round(updates / (time.perf_counter() - t0), 1)}, {}
+
+CASES = {
+    "step":              bench_step,
+    "dash_step":         bench_dash_step,
+    "simulate_one_day":  bench_simulate_one_day,
+    "historical_demand": bench_historical_demand,
+    "draw_map":          bench_draw_map,
+    "dqn_update":        bench_dqn_update,
+}
+SCALE_FREE = {"dqn_update"}  # doesn't depend on the dataset: only run at scale 1
+
+def run_case(case, scale, paths, repeat, seed):
+    """ Worker process: point marl_simulation at the dataset, load it, time one case. """
+    import torch
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    import marl_simulation as sim
+    sim.STATIONS_PATH = paths["stations"]
+    sim.STATS_PATH    = paths["stats"]
+    sim.TRIP_PATHS    = paths["trips"]
+    sim.CKPT_PATH     = os.path.join(SYNTHETIC_DIR, "checkpoints", f"{case}_x{scale}.pth")  # keep the real agent
+    row = {"case": case, "scale": scale}
+    try:
+        sim.load()
+        for date in sim.SIM_DATES:
+            sim.trip_indexes[date]
+            sim.historical_demand[date]
+        row["stations"]     = len(sim.station_ids)
+        row["trips"]        = sum(len(sim.trip_dfs[date]) for date in sim.SIM_DATES)
+        row["setup_rss_mb"] = peak_rss_mb()
+
+        metrics, phases = CASES[case](sim, repeat)
+    except ImportError as e:
+        # dash / plotly are only needed by the map cases
+        return {**row, "skipped": str(e)}
+    sim.checkpointer.flush()
+    return {**row, **metrics, "peak_rss_mb": peak_rss_mb(), "phases": phases}
+
+# =========================== Baseline ===========================
+def result_key(row):
+    return f"{row['case']}@x{row['scale']}"
+
+def load_baseline(path):
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["results"]
+
+def save_baseline(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "machine": platform.node(),
+            "platform": platform.platform(),
+            "cpus":    os.cpu_count(),
+            "python":  platform.python_version(),
+            "results": {result_key(row): {k: v for k, v in row.items() if k in METRICS}
+                        for row in results if "skipped" not in row},
+        }, f, indent=2)
+
+def compare(results, baseline, tolerance):
+    """
+    Fill each row's "vs_baseline" ({metric: % change}) and return the regressions:
+    metrics more than `tolerance` (a fraction) worse than the baseline.
+    """
+    regressions = []
+    for row in results:
+        base = baseline.get(result_key(row), {})
+        for metric, higher_is_better in METRICS.items():
+            if metric not in row or not base.get(metric):
+                continue
+            change = (row[metric] - base[metric]) / base[metric]
+            row.setdefault("vs_baseline", {})[metric] = round(100 * change, 1)
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append((result_key(row), metric, base[metric], row[metric]))
+    return regressions
+
+def print_row(row):
+    if "skipped" in row:
+        print(f"⏭️  {result_key(row):<26} skipped ({row['skipped']})")
+        return
+    changes = row.get("vs_baseline", {})
+    cells = [f"{metric} {row[metric]:g}" + (f" ({changes[metric]:+.1f}%)" if metric in changes else "")
+             for metric in METRICS if metric in row]
+    print(f"⏱️  {result_key(row):<26} {row['stations']:>6} stations {row['trips']:>8} trips | " + " | ".join(cells))
+    if row["phases"]:
+        print("     phases: " + ", ".join(f"{phase} {100 * share:.1f}%" for phase, share in row["phases"].items()))
+
+def run_benchmarks(cases, scales, repeat=3, seed=0):
+    """ Every (case, scale) in its own fresh process, one after the other. """
+    ctx = mp.get_context("spawn")
+    results = []
+    for scale in scales:
+        paths = synthetic_dataset(scale)
+        for case in cases:
+            if case in SCALE_FREE and scale != 1:
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx, max_tasks_per_child=1) as pool:
+                row = pool.submit(run_case, case, scale, paths, repeat, seed).result()
+            results.append(row)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the MARL simulation engine and compare against a baseline.")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--scale", type=int, nargs="+", default=[1],
+                        help="dataset sizes: 1 = bundled data, N = N copies of every station and its trips")
+    parser.add_argument("--repeat", type=int, default=3, help="simulated days (or call batches) per case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown before a regression (0.15 = 15%%)")
+    parser.add_argument("--out", default=None, help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.cases, args.scale, repeat=args.repeat, seed=args.seed)
+    regressions = compare(results, load_baseline(args.baseline), args.tolerance)
+    for row in results:
+        print_row(row)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"📌 Baseline saved to {args.baseline}")
+    elif regressions:
+        for key, metric, before, after in regressions:
+            print(f"⚠️ Regression in {key}: {metric} {before:g} → {after:g}")
+        sys.exit(1)
@@ -0,0 +1,114 @@
+import atexit
+import os
+import queue
+import threading
+import torch
+
+
+class CheckpointWriter:
+    """
+    Throttled, asynchronous checkpoints for a DQNAgent.
+
+    The simulation thread only takes an in-memory snapshot of the state_dicts
+    (DQNAgent.checkpoint_state); torch.save, the atomic rename and the rotation
+    of older files run on a background thread.
+
+    Policies:
+      - every_n_updates: save after this many DQN updates (None = off)
+      - save_on_day_end: save when on_day_end() is called
+      - keep_best:       also write `<name>_best<ext>` when on_day_end() gets a new best score
+      - keep_last:       rotated copies kept next to `path` (<name>.1<ext>, <name>.2<ext>, ...)
+    """
+    def __init__(self, agent, path, every_n_updates=100, save_on_day_end=True,
+                 keep_best=True, keep_last=3):
+        self.agent           = agent
+        self.path            = path
+        self.every_n_updates = every_n_updates
+        self.save_on_day_end = save_on_day_end
+        self.keep_best       = keep_best
+        self.keep_last       = keep_last
+
+        root, ext = os.path.splitext(path)
+        self.best_path  = f"{root}_best{ext}"
+        self.best_score = float("-inf")
+        self._last_saved_step = agent.learn_step_counter
+
+        self._queue  = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # —— policy hooks, called from the simulation ——
+    def on_update(self):
+        """Call after DQNAgent.update(); saves every `every_n_updates` learning steps."""
+        if self.every_n_updates is None:
+            return
+        if self.agent.learn_step_counter - self._last_saved_step >= self.every_n_updates:
+            self.save()
+
+    def on_day_end(self, score=None):
+        """Call once per simulated day; `score` (higher is better) drives the best-so-far copy."""
+        snapshot = None
+        if self.save_on_day_end:
+            snapshot = self.save()
+        if self.keep_best and score is not None and score > self.best_score:
+            self.best_score = score
+            self._queue.put((self.best_path, snapshot or self.agent.checkpoint_state(), False))
+
+    def save(self):
+        """Snapshot now, write in the background."""
+        snapshot = self.agent.checkpoint_state()
+        self._last_saved_step = self.agent.learn_step_counter
+        self._queue.put((self.path, snapshot, True))
+        return snapshot
+
+    def flush(self):
+        """Block until every queued checkpoint is on disk."""
+        self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    # —— background thread ——
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # if the writer fell behind, only the newest snapshot per file matters
+            latest = {}
+            for job in batch:
+                if job is None:
+                    stopping = True
+                else:
+                    latest[job[0]] = job
+
+            for path, snapshot, rotate in latest.values():
+                try:
+                    self._write(path, snapshot, rotate)
+                except Exception as e:
+                    print(f"⚠️ Checkpoint write to {path} failed: {e}")
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, path, snapshot, rotate):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        torch.save(snapshot, tmp_path)
+        if rotate:
+            self._rotate(path)
+        os.replace(tmp_path, path)  # atomic: readers never see a half-written file
+
+    def _rotate(self, path):
+        root, ext = os.path.splitext(path)
+        names = [path] + [f"{root}.{i}{ext}" for i in range(1, self.keep_last)]
+        for older, newer in zip(reversed(names[1:]), reversed(names[:-1])):
+            if os.path.exists(newer):
+                os.replace(newer, older)
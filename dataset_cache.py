@@ -0,0 +1,125 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+# On-disk cache for the CSV datasets and arrays derived from them.
+#
+# Each cached entry is a directory of .npy files (one per column / array) that is
+# opened with np.load(mmap_mode="r"), so a warm start maps the data instead of
+# parsing CSV text. Entries are keyed by the source files' size + mtime and the
+# read options; editing or regenerating a source CSV simply makes a new entry
+# (older ones for the same name are removed).
+#
+#   trips = read_csv("datasets/all_trips_05_05.csv", parse_dates=["start_time", "end_time"])
+#   arrays = cached_arrays("demand_05_05", [trips_csv, stations_csv], build_fn)
+
+CACHE_DIR = os.path.join("datasets", ".cache")
+CACHE_VERSION = 1  # bump when the on-disk layout changes
+
+def _signature(sources, params):
+    """ Cache key: every source's size + mtime, plus the options used to build the entry. """
+    h = hashlib.sha1(f"v{CACHE_VERSION}".encode())
+    for path in sources:
+        st = os.stat(path)
+        h.update(f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}".encode())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+def _entry_dir(name, sources, params):
+    return os.path.join(CACHE_DIR, f"{name}-{_signature(sources, params)}")
+
+def _load_entry(entry):
+    """ {key: memory-mapped array} plus the entry's metadata, or None on a cache miss. """
+    meta_path = os.path.join(entry, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    # plain (read-only) ndarray views of the maps, so pandas/numpy never see the memmap subclass
+    arrays = {key: np.load(os.path.join(entry, f"{i}.npy"), mmap_mode="r").view(np.ndarray)
+              for i, key in enumerate(meta["keys"])}
+    return arrays, meta
+
+def _store_entry(entry, name, arrays, meta):
+    """ Write an entry atomically (temp dir + rename) and drop stale entries of the same name. """
+    tmp = f"{entry}.tmp-{os.getpid()}"
+    try:
+        os.makedirs(tmp, exist_ok=True)
+        for i, values in enumerate(arrays.values()):
+            np.save(os.path.join(tmp, f"{i}.npy"), values, allow_pickle=False)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({**meta, "keys": list(arrays)}, f)
+        os.rename(tmp, entry)
+    except OSError:
+        # read-only tree, or another process stored the same entry first
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+
+    for other in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, other)
+        if other.rsplit("-", 1)[0] == name and path != entry and ".tmp-" not in other:
+            shutil.rmtree(path, ignore_errors=True)
+
+def load_arrays(name, sources, **params):
+    """ The memory-mapped arrays stored for (name, sources, params), or None on a cache miss. """
+    cached = _load_entry(_entry_dir(name, sources, params))
+    return None if cached is None else cached[0]
+
+def store_arrays(name, sources, arrays, **params):
+    """ Store a {key: array} dict for (name, sources, params); returns it as ndarrays. """
+    arrays = {key: np.asarray(values) for key, values in arrays.items()}
+    _store_entry(_entry_dir(name, sources, params), name, arrays, {})
+    return arrays
+
+def cached_arrays(name, sources, build, **params):
+    """
+    Arrays derived from `sources` (a list of file paths): returns `build()`'s
+    {key: ndarray} dict, computed once and memory-mapped afterwards.
+    `params` are extra build options that should be part of the cache key.
+    """
+    arrays = load_arrays(name, sources, **params)
+    if arrays is None:
+        arrays = store_arrays(name, sources, build(), **params)
+    return arrays
+
+def read_csv(path, **kwargs):
+    """
+    pd.read_csv(path, **kwargs) through the cache: columns are stored as .npy
+    (strings as fixed-width unicode, with a missing-value mask) and reassembled
+    with their original dtypes.
+    """
+    name  = os.path.splitext(os.path.basename(path))[0]
+    entry = _entry_dir(name, [path], kwargs)
+    cached = _load_entry(entry)
+    if cached is not None:
+        arrays, meta = cached
+        columns = {}
+        for column, dtype in meta["dtypes"].items():
+            values = arrays[column]
+            if dtype in ("object", "str", "string"):
+                values = values.astype(object)
+                mask_key = f"{column}.na"
+                if mask_key in arrays:
+                    values[arrays[mask_key]] = np.nan
+                columns[column] = pd.Series(values, dtype=dtype)
+            else:
+                columns[column] = pd.Series(values, dtype=dtype, copy=False)
+        return pd.DataFrame(columns, copy=False)
+
+    df = pd.read_csv(path, **kwargs)
+    arrays, dtypes = {}, {}
+    for column in df.columns:
+        series = df[column]
+        dtypes[column] = str(series.dtype)
+        if series.dtype == object or isinstance(series.dtype, pd.StringDtype):
+            na = series.isna().to_numpy()
+            arrays[column] = series.fillna("").to_numpy(dtype=str)
+            if na.any():
+                arrays[f"{column}.na"] = na
+        else:
+            arrays[column] = series.to_numpy()
+    _store_entry(entry, name, arrays, {"dtypes": dtypes})
+    return df
@@ -4,23 +4,135 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 import os
-from collections import deque
+import copy
 
 # ==================== Replay Buffer ====================#
 class ReplayBuffer:
-    def __init__(self, capacity):
-        self.buffer = deque(maxlen=capacity)
+    """
+    Fixed-size ring buffer backed by preallocated arrays, one per field.
+    Once full, new transitions overwrite the oldest ones.
+    """
+    def __init__(self, capacity, state_dim):
+        self.capacity    = capacity
+        self.states      = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.actions     = np.zeros(capacity, dtype=np.int64)
+        self.rewards     = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.dones       = np.zeros(capacity, dtype=np.float32)
+        self.pos  = 0   # next slot to write
+        self.size = 0
 
     def push(self, state, action, reward, next_state, done):
-        self.buffer.append((state, action, reward, next_state, done))
+        self.push_batch([state], [action], [reward], [next_state], [done])
+
+    def push_batch(self, states, actions, rewards, next_states, dones):
+        """ Write n transitions with one vectorized assignment per field; returns the slots written. """
+        n = len(states)
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+        start = max(0, n - self.capacity)  # only the newest `capacity` rows survive anyway
+        idx = (self.pos + np.arange(start, n)) % self.capacity
+        self.states[idx]      = np.asarray(states)[start:]
+        self.actions[idx]     = np.asarray(actions)[start:]
+        self.rewards[idx]     = np.asarray(rewards)[start:]
+        self.next_states[idx] = np.asarray(next_states)[start:]
+        self.dones[idx]       = np.asarray(dones)[start:]
+        self.pos  = (self.pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        return idx
 
     def sample(self, batch_size):
-        batch = random.sample(self.buffer, batch_size)
-        states, actions, rewards, next_states, dones = map(np.array, zip(*batch))
-        return states, actions, rewards, next_states, dones
+        # sample logical positions (0 = oldest) so the draw matches random.sample over a deque
+        oldest = self.pos if self.size == self.capacity else 0
+        idx = (np.array(random.sample(range(self.size), batch_size)) + oldest) % self.capacity
+        return self.states[idx], self.actions[idx], self.rewards[idx], self.next_states[idx], self.dones[idx]
+
+    def contents(self):
+        """ Every stored transition, oldest first, as (states, actions, rewards, next_states, dones) copies. """
+        oldest = self.pos if self.size == self.capacity else 0
+        idx = (oldest + np.arange(self.size)) % self.capacity
+        return self.states[idx], self.actions[idx], self.rewards[idx], self.next_states[idx], self.dones[idx]
 
     def __len__(self):
-        return len(self.buffer)
+        return self.size
+
+# ==================== Prioritized Replay ====================#
+class SumTree:
+    """
+    Binary tree where each parent holds the sum of its children.
+    Leaves are the per-slot priorities; root (index 1) is the total.
+    Updates and prefix-sum lookups are O(log n) and vectorized over a batch.
+    """
+    def __init__(self, capacity):
+        self.n_leaves = 1
+        while self.n_leaves < capacity:
+            self.n_leaves *= 2
+        self.tree = np.zeros(2 * self.n_leaves, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def update(self, slots, priorities):
+        nodes = np.asarray(slots) + self.n_leaves
+        self.tree[nodes] = priorities
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        """ Leaf slot whose cumulative priority range contains each value. """
+        values = np.array(values, dtype=np.float64)
+        nodes  = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.n_leaves:
+            left = 2 * nodes
+            go_right = values > self.tree[left]
+            values  -= np.where(go_right, self.tree[left], 0.0)
+            nodes    = left + go_right
+        return nodes - self.n_leaves
+
+    def priorities(self, slots):
+        return self.tree[np.asarray(slots) + self.n_leaves]
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Proportional prioritized replay (Schaul et al.): slots are sampled with
+    probability p_i^alpha / sum(p^alpha), p_i = |TD error| + eps.
+    New transitions get the current max priority so they are seen at least once.
+    """
+    def __init__(self, capacity, state_dim, alpha=0.6, eps=1e-3):
+        super().__init__(capacity, state_dim)
+        self.alpha = alpha
+        self.eps   = eps
+        self.max_priority = 1.0
+        self.tree  = SumTree(capacity)
+
+    def push_batch(self, states, actions, rewards, next_states, dones):
+        idx = super().push_batch(states, actions, rewards, next_states, dones)
+        if len(idx):
+            self.tree.update(idx, self.max_priority ** self.alpha)
+        return idx
+
+    def sample(self, batch_size, beta=0.4):
+        """ Stratified sample; also returns the slots and normalized importance-sampling weights. """
+        segment = self.tree.total / batch_size
+        values  = (np.arange(batch_size) + np.random.uniform(size=batch_size)) * segment
+        idx = np.minimum(self.tree.find(values), self.size - 1)
+
+        probs   = self.tree.priorities(idx) / self.tree.total
+        weights = (self.size * probs) ** (-beta)
+        weights = (weights / weights.max()).astype(np.float32)
+        return (self.states[idx], self.actions[idx], self.rewards[idx],
+                self.next_states[idx], self.dones[idx], idx, weights)
+
+    def update_priorities(self, idx, td_errors):
+        priorities = np.abs(td_errors) + self.eps
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(idx, priorities ** self.alpha)
 
 # ==================== Q-Network (Neural Net) ====================#
 class QNetwork(nn.Module):
@@ -39,7 +151,8 @@ class QNetwork(nn.Module):
 class DQNAgent:
     def __init__(self, state_dim, action_dim, buffer_capacity=50000,
                  batch_size=64, lr=5e-5, gamma=0.99, target_update_freq=250,
-                 device=None):
+                 device=None, prioritized=False, per_alpha=0.6, per_beta=0.4,
+                 per_beta_steps=100000):
         self.state_dim = state_dim
         self.action_dim = action_dim
         self.batch_size = batch_size
@@ -53,7 +166,15 @@ class DQNAgent:
         self.target_network.eval()
 
         self.optimizer = optim.Adam(self.q_network.parameters(), lr=lr)
-        self.replay_buffer = ReplayBuffer(buffer_capacity)
+        # Uniform or prioritized (sum-tree) experience replay
+        self.prioritized = prioritized
+        if prioritized:
+            self.replay_buffer = PrioritizedReplayBuffer(buffer_capacity, state_dim, alpha=per_alpha)
+        else:
+            self.replay_buffer = ReplayBuffer(buffer_capacity, state_dim)
+        # importance-sampling exponent, annealed from per_beta to 1 over per_beta_steps updates
+        self.per_beta       = per_beta
+        self.per_beta_steps = per_beta_steps
 
         # Epsilon-greedy
         self.epsilon = 1.0
@@ -63,14 +184,20 @@ class DQNAgent:
         self.learn_step_counter = 0
         self.target_update_freq = target_update_freq
 
+    def checkpoint_state(self):
+        """ Detached CPU copy of everything save() writes; safe to hand to another thread. """
+        def to_cpu(state_dict):
+            return {k: v.detach().to("cpu", copy=True) for k, v in state_dict.items()}
+        return {
+            'q_net'      : to_cpu(self.q_network.state_dict()),
+            'target_net' : to_cpu(self.target_network.state_dict()),
+            'opt'        : copy.deepcopy(self.optimizer.state_dict()),
+            'epsilon'    : self.epsilon
+        }
+
     def save(self, path: str):
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        torch.save({
-            'q_net'      : self.q_network.state_dict(),
-            'target_net' : self.target_network.state_dict(),
-            'opt'        : self.optimizer.state_dict(),
-            'epsilon'    : self.epsilon
-        }, path)
+        torch.save(self.checkpoint_state(), path)
 
     def load(self, path: str):
         if not os.path.isfile(path):
@@ -91,22 +218,55 @@ class DQNAgent:
                 q_vals = self.q_network(state_tensor)
             return q_vals.argmax().item()
 
+    def select_actions(self, states):
+        """
+        Epsilon-greedy actions for a (n, state_dim) batch with a single forward pass.
+        Consumes `random` in the same order as calling select_action() row by row.
+        """
+        actions = np.empty(len(states), dtype=np.int64)
+        greedy  = np.zeros(len(states), dtype=bool)
+        for i in range(len(states)):
+            if random.random() < self.epsilon:
+                actions[i] = random.randrange(self.action_dim)
+            else:
+                greedy[i] = True
+
+        if greedy.any():
+            state_tensor = torch.as_tensor(states[greedy], dtype=torch.float32, device=self.device)
+            with torch.no_grad():
+                q_vals = self.q_network(state_tensor)
+            actions[greedy] = q_vals.argmax(dim=1).cpu().numpy()
+        return actions
+
     def store_transition(self, state, action, reward, next_state, done):
         self.replay_buffer.push(state, action, reward, next_state, done)
 
+    def store_transitions(self, states, actions, rewards, next_states, dones):
+        """ Batched store_transition; scalar rewards/dones are broadcast to every row. """
+        n = len(states)
+        self.replay_buffer.push_batch(states, actions,
+                                      np.broadcast_to(rewards, (n,)),
+                                      next_states,
+                                      np.broadcast_to(dones, (n,)))
+
     def update(self):
         if len(self.replay_buffer) < self.batch_size:
             return
         
         # 1) Sample a fresh batch
-        states_np, actions_np, rewards_np, next_states_np, dones_np = \
-            self.replay_buffer.sample(self.batch_size)
-        # 2) Convert to brand‐new tensors via torch.tensor(...)
-        states      = torch.tensor(states_np,      dtype=torch.float32, device=self.device)
-        actions     = torch.tensor(actions_np,     dtype=torch.int64,   device=self.device).unsqueeze(1)
-        rewards     = torch.tensor(rewards_np,     dtype=torch.float32, device=self.device).unsqueeze(1)
-        next_states = torch.tensor(next_states_np, dtype=torch.float32, device=self.device)
-        dones       = torch.tensor(dones_np,       dtype=torch.float32, device=self.device).unsqueeze(1)
+        if self.prioritized:
+            beta = min(1.0, self.per_beta + (1.0 - self.per_beta) * self.learn_step_counter / self.per_beta_steps)
+            states_np, actions_np, rewards_np, next_states_np, dones_np, slots, weights_np = \
+                self.replay_buffer.sample(self.batch_size, beta)
+        else:
+            states_np, actions_np, rewards_np, next_states_np, dones_np = \
+                self.replay_buffer.sample(self.batch_size)
+        # 2) Wrap the sampled arrays (already the right dtypes) as tensors
+        states      = torch.from_numpy(states_np).to(self.device)
+        actions     = torch.from_numpy(actions_np).to(self.device).unsqueeze(1)
+        rewards     = torch.from_numpy(rewards_np).to(self.device).unsqueeze(1)
+        next_states = torch.from_numpy(next_states_np).to(self.device)
+        dones       = torch.from_numpy(dones_np).to(self.device).unsqueeze(1)
 
         # Current Q(s,a)
         q_values = self.q_network(states).gather(1, actions)
@@ -116,8 +276,14 @@ class DQNAgent:
             next_q_vals = self.target_network(next_states).max(1)[0].unsqueeze(1)
             target_q    = rewards + self.gamma * next_q_vals * (1 - dones)
 
-        # Compute loss
-        loss = nn.MSELoss()(q_values, target_q)
+        # Compute loss (importance-weighted when sampling by priority)
+        if self.prioritized:
+            td_errors = target_q - q_values
+            weights   = torch.from_numpy(weights_np).to(self.device).unsqueeze(1)
+            loss = (weights * td_errors.pow(2)).mean()
+            self.replay_buffer.update_priorities(slots, td_errors.detach().squeeze(1).cpu().numpy())
+        else:
+            loss = nn.MSELoss()(q_values, target_q)
 
         # Optimize
         self.optimizer.zero_grad()
@@ -169,3 +335,31 @@ class StationAgent:
             obs['current_hour'],
             0 if obs.get('previous_action','do_nothing')=='do_nothing' else 1
         ], dtype=np.float32)
+
+# ==================== Batched StationAgents ====================#
+class StationAgentGroup:
+    """
+    Every station's agent at once: states are a (n_stations, state_dim) matrix
+    in `station_ids` order, and actions come from one DQNAgent forward pass.
+    """
+    def __init__(self, station_ids, agent: DQNAgent):
+        self.station_ids  = list(station_ids)
+        self.agent        = agent
+        self.last_states  = None
+        self.last_actions = None
+
+    def observe_and_act(self, states):
+        actions = self.agent.select_actions(states)
+        self.last_states  = states
+        self.last_actions = actions
+        return actions
+
+    def record(self, rewards, next_states, done):
+        self.agent.store_transitions(self.last_states,
+                                     self.last_actions,
+                                     rewards,
+                                     next_states,
+                                     done)
+
+    def learn(self):
+        self.agent.update()
@@ -0,0 +1,103 @@
+import os
+import json
+from datetime import datetime, timedelta
+from station_state import StationState
+from transit_queue import TransitQueue
+
+# Where the fleet is at a day boundary, for the carry-over (continuous multi-day) mode:
+# bikes docked at each station, bikes out with riders and bikes on redistribution
+# trucks. The next day starts from it instead of the initial bike counts, and it is
+# saved as JSON at every day boundary so a long run can resume.
+#
+# Arrival times are kept as offsets from the end of the day that was captured and
+# put back onto whichever date restores the fleet: a rider still out 20 minutes
+# past midnight arrives at 00:20 of the next simulated date, even when that date
+# is not the calendar day after (a gap in DATE_RANGE, or the same date replayed).
+
+class FleetState:
+    """ End-of-day fleet of one simulated date slot. """
+    def __init__(self, date, bike_counts, rider_trips=(), truck_trips=()):
+        self.date        = date                # the day that just ended ("YYYY-MM-DD")
+        self.bike_counts = dict(bike_counts)   # station_id -> docked bikes
+        self.rider_trips = list(rider_trips)   # {"end_offset", "end_id"}
+        self.truck_trips = list(truck_trips)   # {"from_id", "end_id", "quantity", "end_offset"}
+
+    @classmethod
+    def capture(cls, date, stations, in_transit, trucks):
+        """ Snapshot a StationState plus its rider and truck TransitQueues. """
+        day_end = datetime.strptime(date, "%Y-%m-%d") + timedelta(days=1)
+
+        def carried(trip):
+            # seconds after the end of `date` (0 or more: anything due earlier has arrived)
+            trip = dict(trip)
+            trip["end_offset"] = max((trip.pop("end_time") - day_end).total_seconds(), 0.0)
+            return trip
+
+        return cls(date,
+                   zip(stations.station_ids, stations.bike_count.tolist()),
+                   (carried(trip) for trip in in_transit.ordered()),
+                   (carried(trip) for trip in trucks.ordered()))
+
+    def restore(self, station_ids, date):
+        """ Fresh (StationState, rider TransitQueue, truck TransitQueue) for `date`, starting from this fleet. """
+        # stations added to all_stations.csv since the snapshot start empty
+        stations = StationState(station_ids, bike_counts=[self.bike_counts.get(sid, 0) for sid in station_ids])
+        day_start = datetime.strptime(date, "%Y-%m-%d")
+
+        def rebased(trip):
+            trip = dict(trip)
+            trip["end_time"] = day_start + timedelta(seconds=trip.pop("end_offset"))
+            return trip
+
+        riders, trucks = TransitQueue(), TransitQueue()
+        for trip in self.rider_trips:
+            riders.append(rebased(trip))
+        for trip in self.truck_trips:
+            trucks.append(rebased(trip))
+        return stations, riders, trucks
+
+    def total_bikes(self):
+        return (sum(self.bike_counts.values()) + len(self.rider_trips)
+                + sum(trip["quantity"] for trip in self.truck_trips))
+
+    # —— JSON ——
+    def to_dict(self):
+        return {
+            "date":        self.date,
+            "bike_counts": self.bike_counts,
+            "rider_trips": self.rider_trips,
+            "truck_trips": self.truck_trips,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        day_end = datetime.strptime(data["date"], "%Y-%m-%d") + timedelta(days=1)
+
+        def carried(trip):
+            # files saved before offsets were introduced hold absolute "end_time"s
+            if "end_time" in trip:
+                trip = dict(trip)
+                end_time = datetime.fromisoformat(trip.pop("end_time"))
+                trip["end_offset"] = max((end_time - day_end).total_seconds(), 0.0)
+            return trip
+
+        return cls(data["date"], data["bike_counts"],
+                   [carried(trip) for trip in data["rider_trips"]],
+                   [carried(trip) for trip in data["truck_trips"]])
+
+
+def save_fleet(fleet, path):
+    """ Write {slot: FleetState} atomically (temp file + rename). """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"slots": {str(slot): state.to_dict() for slot, state in fleet.items()}}, f)
+    os.replace(tmp_path, path)
+
+def load_fleet(path):
+    """ {slot: FleetState} saved by save_fleet, or {} if there is none. """
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        data = json.load(f)
+    return {int(slot): FleetState.from_dict(state) for slot, state in data["slots"].items()}
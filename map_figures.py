@@ -0,0 +1,136 @@
+import json
+import plotly.graph_objects as go
+from dash import Patch
+
+# Station maps are split in two parts:
+#  - a static base figure (station lat/lon, names, overlay styles, mapbox layout), sent once
+#    with the page layout (app.py), so every frame, the first one included, is a patch
+#  - per-frame "frame" dicts with only what changes, sent as a Dash Patch:
+#      {"colors": [...], "sizes": [...], "customdata": [[bikes, availability%], ...],
+#       "overlays": [{"size": [...]}, ...],
+#       "hovertext": [...] (optional, end-of-day summaries)}
+# Overlay traces (glows, missed-trip halos) come first so they are drawn under the
+# stations; the station trace is always the last one. Every trace holds every station,
+# so a frame only sets per-station marker arrays: an overlay marker of size 0 is hidden.
+# Each map of a session has a MapPatcher remembering the frame it sent last, so a frame
+# only carries the markers that changed (and the hover template only when switching
+# between live and end-of-day hovers). Every KEYFRAME_EVERY frames the whole frame
+# goes out again, repairing a map that missed a patch.
+
+KEYFRAME_EVERY  = 20  # frames between full patches
+ASSIGN_OP_BYTES = 90  # JSON size of one per-marker Patch assignment, besides the value
+
+LIVE_HOVERTEMPLATE    = "%{text}<br><br>Bikes: %{customdata[0]}<br>Availability: %{customdata[1]}%<extra></extra>"
+SUMMARY_HOVERTEMPLATE = "%{hovertext}<extra></extra>"
+
+def base_map_figure(station_df, overlay_markers, station_opacity):
+    """ Static station geometry with hidden overlay traces, one per entry of `overlay_markers`. """
+    lats = station_df["lat"].tolist()
+    lons = station_df["lon"].tolist()
+
+    fig = go.Figure()
+    for marker in overlay_markers:
+        fig.add_trace(go.Scattermapbox(
+            lat=lats, lon=lons,
+            mode="markers",
+            marker=go.scattermapbox.Marker(**{**marker, "size": 0}),  # hidden until a frame sizes them
+            hoverinfo="skip",
+            showlegend=False
+        ))
+
+    fig.add_trace(go.Scattermapbox(
+        lat=lats, lon=lons,
+        mode="markers",
+        marker=go.scattermapbox.Marker(opacity=station_opacity),
+        text=station_df["station_name"].tolist(),
+        hovertemplate=LIVE_HOVERTEMPLATE,
+        name="Stations"
+    ))
+
+    fig.update_layout(
+        mapbox=dict(
+            style="carto-positron",
+            center=dict(lat=sum(lats) / len(lats), lon=sum(lons) / len(lons)),
+            zoom=12
+        ),
+        margin=dict(l=0, r=0, t=0, b=0),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        showlegend=False
+    )
+    return fig
+
+def apply_frame(fig, frame):
+    """ Fill a base figure with one frame (full render). """
+    n_overlays = len(frame["overlays"])
+    for trace, overlay in zip(fig.data[:n_overlays], frame["overlays"]):
+        trace.marker.size = overlay["size"]
+
+    stations = fig.data[n_overlays]
+    stations.marker.color = frame["colors"]
+    stations.marker.size  = frame["sizes"]
+    stations.customdata   = frame["customdata"]
+    if frame.get("hovertext") is not None:
+        stations.hovertext     = frame["hovertext"]
+        stations.hovertemplate = SUMMARY_HOVERTEMPLATE
+    else:
+        stations.hovertemplate = LIVE_HOVERTEMPLATE
+    return fig
+
+def frame_patch(frame):
+    """ Same update as apply_frame, as a partial property update for the browser. """
+    patched = Patch()
+    n_overlays = len(frame["overlays"])
+    for i, overlay in enumerate(frame["overlays"]):
+        patched["data"][i]["marker"]["size"] = overlay["size"]
+
+    stations = patched["data"][n_overlays]
+    stations["marker"]["color"] = frame["colors"]
+    stations["marker"]["size"]  = frame["sizes"]
+    stations["customdata"]      = frame["customdata"]
+    if frame.get("hovertext") is not None:
+        stations["hovertext"]     = frame["hovertext"]
+        stations["hovertemplate"] = SUMMARY_HOVERTEMPLATE
+    else:
+        stations["hovertemplate"] = LIVE_HOVERTEMPLATE
+    return patched
+
+
+class MapPatcher:
+    """ frame_patch with memory, for one map of one session: only what changed since the previous frame. """
+    def __init__(self, keyframe_every=KEYFRAME_EVERY):
+        self.keyframe_every = keyframe_every
+        self.frames = 0
+        self.last   = None  # frame sent last
+
+    def patch(self, frame):
+        last = self.last if self.frames % self.keyframe_every else None
+        self.frames += 1
+        self.last = frame
+        if last is None:
+            return frame_patch(frame)
+
+        patched = Patch()
+        n_overlays = len(frame["overlays"])
+        for i, (overlay, before) in enumerate(zip(frame["overlays"], last["overlays"])):
+            patch_changed(patched["data"][i]["marker"], "size", overlay["size"], before["size"])
+
+        stations = patched["data"][n_overlays]
+        patch_changed(stations["marker"], "color", frame["colors"], last["colors"])
+        patch_changed(stations["marker"], "size", frame["sizes"], last["sizes"])
+        patch_changed(stations, "customdata", frame["customdata"], last["customdata"])
+        hovertext = frame.get("hovertext")
+        if hovertext is not None and hovertext != last.get("hovertext"):
+            stations["hovertext"] = hovertext
+        if (hovertext is None) != (last.get("hovertext") is None):
+            stations["hovertemplate"] = LIVE_HOVERTEMPLATE if hovertext is None else SUMMARY_HOVERTEMPLATE
+        return patched
+
+def patch_changed(parent, key, values, before):
+    """ Set parent[key] to `values`: only the entries that differ from `before`, or the whole list if that is smaller. """
+    changed = [i for i, (value, old) in enumerate(zip(values, before)) if value != old]
+    if len(values) != len(before) or len(changed) * ASSIGN_OP_BYTES > len(json.dumps(values)):
+        parent[key] = values
+    else:
+        for i in changed:
+            parent[key][i] = values[i]
@@ -1,20 +1,33 @@
+import numpy as np
 import pandas as pd
-from collections import defaultdict
 
-def load_historical_demand(trip_df):
-    # Create nested dictionaries with default value of 0
-    # Structure: outgoing["station_id"]["hour"] = count
-    outgoing = defaultdict(lambda: defaultdict(int))
-    incoming = defaultdict(lambda: defaultdict(int))
+HOURS_PER_DAY = 24
 
-    for _, row in trip_df.iterrows():
-        start_id = str(row['start_station_id'])
-        end_id = str(row['end_station_id'])
+def load_historical_demand(trip_df, station_ids):
+    # Dense count matrices, one row per station (same order as station_ids)
+    # Structure: outgoing[station_row, hour] = count
+    n_stations = len(station_ids)
+    index = pd.Index([str(sid) for sid in station_ids])
 
-        start_hour = row['start_time'].hour
-        end_hour = row['end_time'].hour
+    def hourly_counts(ids, times):
+        rows = index.get_indexer(ids.astype(str))
+        keep = rows >= 0  # ignore stations missing from all_stations.csv
+        flat = rows[keep] * HOURS_PER_DAY + times.dt.hour.to_numpy()[keep]
+        counts = np.bincount(flat, minlength=n_stations * HOURS_PER_DAY)
+        return counts.reshape(n_stations, HOURS_PER_DAY)
 
-        outgoing[start_id][start_hour] += 1
-        incoming[end_id][end_hour] += 1
+    outgoing = hourly_counts(trip_df['start_station_id'], trip_df['start_time'])
+    incoming = hourly_counts(trip_df['end_station_id'], trip_df['end_time'])
 
     return outgoing, incoming
+
+def lookahead_sum(counts, hours):
+    """
+    Rolling look-ahead: result[:, h] = counts[:, h] + ... + counts[:, h + hours - 1].
+    Hours past midnight count as 0, like the old .get(hour, 0) lookups.
+    """
+    n_stations = counts.shape[0]
+    cumulative = np.zeros((n_stations, HOURS_PER_DAY + hours), dtype=counts.dtype)
+    np.cumsum(counts, axis=1, out=cumulative[:, 1:HOURS_PER_DAY + 1])
+    cumulative[:, HOURS_PER_DAY + 1:] = cumulative[:, [HOURS_PER_DAY]]
+    return cumulative[:, hours:hours + HOURS_PER_DAY] - cumulative[:, :HOURS_PER_DAY]
@@ -1,97 +1,241 @@
-import pandas as pd
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from marl_demand_utils import load_historical_demand
-from plotly.graph_objects import Figure 
+from trip_index import TripCursor
+from transit_queue import TransitQueue
+from station_state import StationState
+from simulation_session import SimulationSession
+from fleet_state import FleetState, save_fleet, load_fleet
+from step_profiler import NULL_PROFILER, profiler_from_env
+from rebalancing import plan_equal_spread
+from truck_fleet import TruckFleet
 import os
-import csv
-from dqn_agent import DQNAgent, StationAgent
+import threading
+import numpy as np
+
+# Importing this module is cheap: datasets, the DQN agent (torch) and the map
+# figures (plotly/dash) are only loaded on first use, through load_data() /
+# load_agent() / load(). Their results are cached singletons published as module
+# globals, so `marl_simulation.shared_agent`, `.station_df`, ... keep working
+# (module __getattr__ at the bottom loads them on first access).
 
 missed_path = "datasets/missed_trips_marl.csv"
+MISSED_TRIPS_FORMAT    = "csv"   # "csv", or "parquet" / "arrow" for the analysis notebooks (needs pyarrow)
+RECORD_COMPLETED_TRIPS = False   # also log completed trips (datasets/completed_trips_marl.*)
 CKPT_PATH = "./checkpoints/dqn_agent.pth"
-
-# Write header only once, if file does not exist
-if not os.path.exists(missed_path):
-    with open(missed_path, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["trip_id", "start_time", "end_time", "start_station_id", "end_station_id", "simulated_day"])
-
-station_df = pd.read_csv("datasets/all_stations.csv")
-trip_dfs = {
-    "2022-05-05": pd.read_csv("datasets/all_trips_05_05.csv", parse_dates=["start_time", "end_time"]),
-    "2022-05-11": pd.read_csv("datasets/all_trips_05_11.csv", parse_dates=["start_time", "end_time"]),
+CKPT_EVERY_N_UPDATES = 100  # background checkpoint every N DQN updates (+ end of day, + best day)
+FLEET_CKPT_PATH = "./checkpoints/fleet_state.json"  # carry-over mode: fleet at the last day boundary
+
+# Rollout workers (parallel_rollout.py) switch this off: they act with a frozen copy
+# of the policy and leave learning and checkpoints to the central learner
+ONLINE_LEARNING = True
+deferred_updates = 0   # DQN updates skipped while ONLINE_LEARNING is off, replayed by the learner
+
+STATIONS_PATH = "datasets/all_stations.csv"
+STATS_PATH    = "datasets/station_stats_2022-05-05.csv"  # initial bike counts
+TRIP_PATHS = {
+    "2022-05-05": "datasets/all_trips_05_05.csv",
+    "2022-05-11": "datasets/all_trips_05_11.csv",
 }
+# One large trip file (e.g. the whole year, cleaned to the all_trips_05_05.csv columns),
+# streamed and partitioned by day on first use (trip_stream.py); None = the TRIP_PATHS files
+TRIP_SOURCE    = None
+DAYS_IN_MEMORY = 8   # days whose trips / demand matrices / trip indexes stay loaded (least recently used go)
 
-# —— DQN imports & initialization ——
+# —— DQN dimensions ——
 # Define your state/action dimensions (must match StationAgent._obs_to_vector)
 state_dim  = 8   # [count, demand_out, demand_in, empty_ratio, full_ratio, hour, prev_action]
 action_dim = 7   # 1 “do nothing” + 3 “send X” + 3 “request X” (we’ll map these below)
-
-# Shared DQN agent and one StationAgent per station
-shared_agent  = DQNAgent(state_dim=state_dim, action_dim=action_dim)
-#shared_agent.load(CKPT_PATH)
-station_ids   = station_df["station_id"].astype(str).tolist()
-station_agents = {
-    sid: StationAgent(station_id=sid, agent=shared_agent)
-    for sid in station_ids
-}
-# — end DQN setup —
-
-initial_bike_counts = {}
-stats_df = pd.read_csv("datasets/station_stats_2022-05-05.csv")
-station_demand = {str(row["station_id"]): row["completed_trips"] for _, row in stats_df.iterrows()}
-
-rebalancing_cost_global = {
-        "2022-05-05": 0,
-        "2022-05-11": 0
-    }
-
-moved_3_4_global   = { date: 0 for date in rebalancing_cost_global }
-moved_12_13_global = { date: 0 for date in rebalancing_cost_global }
-
-redistribution_mapping = {
-    row["station_id"]: row["status"]
-    for _, row in stats_df.iterrows()
-}
-
-for _, row in stats_df.iterrows():
-    sid = str(row["station_id"])
-    initial_bike_counts[sid] = row["final_bike_count"]
-
-# Dictionary to hold outgoing/incoming data per day
-historical_demand = {}
-
-# Loop over all available trip DataFrames (e.g., for May 5 and May 11)
-for day, df in trip_dfs.items():
-    outflow, inflow = load_historical_demand(df)
-    historical_demand[day] = {
-        "outgoing": outflow,
-        "incoming": inflow
-    }
+PRIORITIZED_REPLAY = False  # sample missed-trip / zero-miss transitions by TD error (sum-tree)
 
 SPEED_MULTIPLIER = (24 * 60 * 60) / (5 * 60)  # 24h in 5min
-redistribution_in_transit_list = {}
 STATION_CAPACITY = 40
 STATIC_MAX_CAPACITY = STATION_CAPACITY + 20
 
+# —— Scenario knobs (sweep.py overrides these per run) ——
+INITIAL_FILL  = None    # bikes per station at dawn; None = final_bike_count from station_stats_2022-05-05.csv
+MISSED_WEIGHT = 50.0    # compute_reward_for_station weights
+MOVE_WEIGHT   = 0.005
+EQUAL_SPREAD_HOURS     = (3, 4)    # [start, end) hours of the equal-spread rebalancing
+DEMAND_REBALANCE_HOURS = (12, 13)  # [start, end) hours of the DQN-driven moves
+CARRY_OVER = False  # continuous mode: each day starts from the previous day's bikes, riders and trucks
+TRUCK_KM_COST = 1.0  # rebalancing cost per truck kilometre, on top of 1 per bike moved
+TRUCK_HANDLING_MINUTES = 10  # loading + unloading per move, on top of the drive (travel_times.py)
+TRUCK_FLEET_SIZE = None  # trucks routing the moves (truck_fleet.py); None = one direct truck per move
+TRUCK_CAPACITY   = 20    # bikes per truck
+
 # how many simulation‐steps make up a full day
 STEPS_PER_DAY = 300
 
-# these are your module‐level globals:
-stations_marl_global       = {}
-in_transit_marl_global     = {}
-last_update_marl_global    = {}
-last_frame_marl_frame      = {}
-redistribution_in_transit  = []
-
-def _reset_globals():
-    """Clear out everything so we can start a fresh day."""
-    stations_marl_global.clear()
-    in_transit_marl_global.clear()
-    last_update_marl_global.clear()
-    last_frame_marl_frame.clear()
-    # if you used per-date lists inside a dict, clear those too:
-    redistribution_in_transit.clear()
+# Every knob callers may override (simulate_days.py, sweep.py, benchmark.py, ...): settings()
+# hands their current values to spawned rollout workers, which re-import the defaults
+SETTINGS = ("missed_path", "MISSED_TRIPS_FORMAT", "RECORD_COMPLETED_TRIPS", "CKPT_PATH", "CKPT_EVERY_N_UPDATES",
+            "FLEET_CKPT_PATH", "STATIONS_PATH", "STATS_PATH", "TRIP_PATHS", "TRIP_SOURCE", "DAYS_IN_MEMORY",
+            "PRIORITIZED_REPLAY", "SPEED_MULTIPLIER", "STATION_CAPACITY", "STATIC_MAX_CAPACITY",
+            "INITIAL_FILL", "MISSED_WEIGHT", "MOVE_WEIGHT", "EQUAL_SPREAD_HOURS", "DEMAND_REBALANCE_HOURS",
+            "CARRY_OVER", "TRUCK_KM_COST", "TRUCK_HANDLING_MINUTES", "TRUCK_FLEET_SIZE", "TRUCK_CAPACITY",
+            "STEPS_PER_DAY", "SIM_DATES")
+
+def settings():
+    """ {name: current value} of every SETTINGS knob. """
+    return {name: globals()[name] for name in SETTINGS}
+
+# =========================== Lazy loaders ===========================
+_load_lock    = threading.RLock()
+_data_loaded  = False
+_agent_loaded = False
+
+# names each loader publishes (served by __getattr__ until then)
+DATA_NAMES  = ("station_df", "trip_dfs", "stats_df", "station_ids", "station_index", "station_demand",
+               "redistribution_mapping", "initial_bike_counts", "historical_demand",
+               "station_lats", "station_lons", "station_names", "station_tree", "travel_times", "trip_indexes", "trip_store")
+AGENT_NAMES = ("shared_agent", "agent_lock", "checkpointer")
+
+def build_historical_demand(df, station_ids):
+    from marl_demand_utils import load_historical_demand, lookahead_sum
+    outflow, inflow = load_historical_demand(df, station_ids)
+    return {
+        "outgoing":     outflow,
+        "incoming":     inflow,
+        "outgoing_3hr": lookahead_sum(outflow, 3),  # trips leaving in [hour, hour+3)
+        "outgoing_5hr": lookahead_sum(outflow, 5),  # trips leaving in [hour, hour+5)
+    }
+
+def load_data():
+    """ Read the stations/trips/stats datasets and build the demand matrices and trip indexes (once). """
+    global _data_loaded
+    if _data_loaded:
+        return
+    with _load_lock:
+        if _data_loaded:
+            return
+        import dataset_cache
+        from trip_index import TripIndex
+        from spatial_index import StationTree
+        from travel_times import load_travel_times
+        from trip_stream import TripStore, DayCache
+
+        # CSVs are parsed once, then memory-mapped from datasets/.cache (see dataset_cache.py)
+        station_df = dataset_cache.read_csv(STATIONS_PATH)
+        station_ids   = station_df["station_id"].astype(str).tolist()
+        station_index = {sid: i for i, sid in enumerate(station_ids)}  # row in StationState, the demand matrices and the map
+
+        stats_df  = dataset_cache.read_csv(STATS_PATH)
+        stats_ids = stats_df["station_id"].astype(str).tolist()
+
+        # Trips, demand and trip indexes are loaded per day, when a run first reaches that day
+        trip_store = TripStore(TRIP_SOURCE) if TRIP_SOURCE else None
+
+        def trip_path(day):
+            if trip_store is not None:
+                return TRIP_SOURCE
+            if day not in TRIP_PATHS:
+                raise KeyError(f"no trip file for {day}: add it to TRIP_PATHS or set TRIP_SOURCE")
+            return TRIP_PATHS[day]
+
+        def load_trips(day):
+            if trip_store is not None:
+                return trip_store.day(day)
+            return dataset_cache.read_csv(trip_path(day), parse_dates=["start_time", "end_time"])
+
+        def build_trip_index(day):
+            df = trip_dfs[day]
+            # trips from stations missing in all_stations.csv have no bikes to take
+            known = df["start_station_id"].astype(str).isin(station_ids)
+            return TripIndex(df if known.all() else df[known])
+
+        trip_dfs = DayCache(load_trips, DAYS_IN_MEMORY)
+
+        # outgoing/incoming (n_stations, 24) matrices per day, cached next to the CSVs
+        historical_demand = DayCache(
+            lambda day: dataset_cache.cached_arrays(
+                f"historical_demand_{day}" if trip_store is None else f"historical_demand_{trip_store.name}_{day}",
+                [trip_path(day), STATIONS_PATH],
+                lambda: build_historical_demand(trip_dfs[day], station_ids)
+            ),
+            DAYS_IN_MEMORY,
+        )
+
+        # Road km / truck minutes between stations, calibrated on the bundled trip files
+        travel_times = load_travel_times(
+            station_ids, station_df["lat"].to_numpy(dtype=float), station_df["lon"].to_numpy(dtype=float),
+            [path for path in TRIP_PATHS.values() if os.path.exists(path)], STATIONS_PATH,
+            lambda path: dataset_cache.read_csv(path, parse_dates=["start_time", "end_time"]),
+        )
+
+        globals().update(
+            station_df             = station_df,
+            trip_dfs               = trip_dfs,
+            stats_df               = stats_df,
+            station_ids            = station_ids,
+            station_index          = station_index,
+            station_demand         = dict(zip(stats_ids, stats_df["completed_trips"].tolist())),
+            redistribution_mapping = dict(zip(stats_df["station_id"].tolist(), stats_df["status"].tolist())),
+            initial_bike_counts    = dict(zip(stats_ids, stats_df["final_bike_count"].tolist())),
+            historical_demand      = historical_demand,
+            # Station coordinates/names by row (station_index), for the map overlays
+            station_lats           = station_df["lat"].to_numpy(dtype=float),
+            station_lons           = station_df["lon"].to_numpy(dtype=float),
+            station_names          = station_df["station_name"].tolist(),
+            # KD-tree over the same rows: nearest partners, rebalancing pairs
+            station_tree           = StationTree(station_df["lat"].to_numpy(dtype=float),
+                                                 station_df["lon"].to_numpy(dtype=float)),
+            travel_times           = travel_times,
+            # Time-sorted trip arrays, built once per day and read through a per-run cursor
+            trip_indexes           = DayCache(build_trip_index, DAYS_IN_MEMORY),
+            trip_store             = trip_store,
+        )
+        _data_loaded = True
+
+def load_agent():
+    """ Build the shared DQN agent (imports torch) and its background checkpoint writer (once). """
+    global _agent_loaded
+    if _agent_loaded:
+        return
+    with _load_lock:
+        if _agent_loaded:
+            return
+        from dqn_agent import DQNAgent
+        from checkpointing import CheckpointWriter
+
+        # Shared DQN agent, acting for every station in one batch (and for every session)
+        shared_agent = DQNAgent(state_dim=state_dim, action_dim=action_dim, prioritized=PRIORITIZED_REPLAY)
+        #shared_agent.load(CKPT_PATH)
+        globals().update(
+            shared_agent = shared_agent,
+            agent_lock   = threading.RLock(),  # sessions in other threads act/learn on the same network
+            checkpointer = CheckpointWriter(shared_agent, CKPT_PATH, every_n_updates=CKPT_EVERY_N_UPDATES),
+        )
+        _agent_loaded = True
+
+def load():
+    """ Everything a simulation run needs: datasets, the shared agent and the default session. """
+    global default_session
+    load_data()
+    load_agent()
+    with _load_lock:
+        if "default_session" not in globals():
+            # Session used by headless callers (simulate_days.py) that don't bring their own
+            default_session = new_session("default")
+
+def new_session(session_id=None, write_outputs=True, dates=None, carry_over=None, suffix_outputs=False):
+    """
+    A SimulationSession wired to the shared agent, with its own station agents and trip log,
+    simulating `dates` side by side (default SIM_DATES), in carry-over mode if `carry_over`
+    (default CARRY_OVER). Outputs keep the plain filenames unless `suffix_outputs`.
+    """
+    from dqn_agent import StationAgentGroup
+    from trip_events import TripEventSink
+    load_data()
+    load_agent()
+    session = SimulationSession(session_id, write_outputs=write_outputs, dates=dates or SIM_DATES,
+                                carry_over=CARRY_OVER if carry_over is None else carry_over,
+                                suffix_outputs=suffix_outputs)
+    session.station_agents = StationAgentGroup(station_ids=station_ids, agent=shared_agent)
+    # Missed (and optionally completed) trips are buffered and written in bulk
+    session.trip_event_sink = TripEventSink(session.output_path(missed_path), fmt=MISSED_TRIPS_FORMAT,
+                                            record_completed=RECORD_COMPLETED_TRIPS)
+    # Per-frame phase timings, only when MARL_PROFILE is set
+    session.profiler = profiler_from_env(session.session_id)
+    return session
 
 # Helper function for marker colors
 def get_color(count):
@@ -100,6 +244,10 @@ def get_color(count):
     elif 15 < count <= 30: return "green"
     else: return "blue"
 
+def get_colors(counts):
+    """ get_color for a whole array of bike counts. """
+    return np.select([counts == 0, counts <= 15, counts <= 30], ["red", "orange", "green"], "blue").tolist()
+
 def build_agent_observation(
     station_id,
     current_hour,
@@ -110,18 +258,16 @@ def build_agent_observation(
     donors=None,
     receivers=None
 ):
+    load_data()
     # Base two lines unchanged
     station_data = station_data.get(station_id, {})
     
-    outgoing = historical_demand[selected_date]["outgoing"][station_id].get(current_hour, 0)
-    incoming = historical_demand[selected_date]["incoming"][station_id].get(current_hour, 0)
-    
-    outgoing_1 = outgoing
-    outgoing_2 = historical_demand[selected_date]["outgoing"][station_id].get(current_hour + 1, 0)
-    outgoing_3 = historical_demand[selected_date]["outgoing"][station_id].get(current_hour + 2, 0)
-    outgoing_4 = historical_demand[selected_date]["outgoing"][station_id].get(current_hour + 3, 0)
-    outgoing_5 = historical_demand[selected_date]["outgoing"][station_id].get(current_hour + 4, 0)
-    outgoing_5hr = outgoing_1 + outgoing_2 + outgoing_3 + outgoing_4 + outgoing_5
+    demand = historical_demand[selected_date]
+    row    = station_index[station_id]
+
+    outgoing     = demand["outgoing"][row, current_hour]
+    incoming     = demand["incoming"][row, current_hour]
+    outgoing_5hr = demand["outgoing_5hr"][row, current_hour]
 
 
     was_empty_ratio = station_data.get("was_empty", 0) / total_frames if total_frames > 0 else 0
@@ -143,10 +289,11 @@ def build_agent_observation(
     }
 
     # ——— Wire in dynamic donors/receivers passed from run_marl_simulation_step ———
+    # the 3 nearest of them, not the 3 best ranked across the city
     if station_id in donors:
-        partners = receivers[:3]
+        partners = nearest_partners(station_id, receivers)
     else:
-        partners = donors[:3]
+        partners = nearest_partners(station_id, donors)
 
     # Now actually put them into the observation
     for idx, pid in enumerate(partners, start=1):
@@ -158,6 +305,58 @@ def build_agent_observation(
 
     return obs
 
+def build_observation_matrix(current_hour, stations, historical_demand, selected_date, total_frames):
+    """
+    Observations for every station at once, one row per station in station_ids order.
+    Columns match StationAgent._obs_to_vector.
+    """
+    load_data()
+    demand = historical_demand[selected_date]
+    states = np.empty((len(station_ids), state_dim), dtype=np.float32)
+    states[:, 0] = stations.bike_count
+    states[:, 1] = demand["outgoing"][:, current_hour]
+    states[:, 2] = demand["incoming"][:, current_hour]
+    states[:, 3] = demand["outgoing_5hr"][:, current_hour]
+    states[:, 4] = stations.was_empty / total_frames if total_frames > 0 else 0
+    states[:, 5] = stations.was_full  / total_frames if total_frames > 0 else 0
+    states[:, 6] = current_hour
+    states[:, 7] = stations.previous_action != "do_nothing"
+    return states
+
+def nearest_partners(station_id, candidates, k=3):
+    """ The k stations of `candidates` nearest to `station_id` (never itself), nearest first. """
+    load_data()
+    row  = station_index[station_id]
+    mask = np.zeros(len(station_ids), dtype=bool)
+    mask[[station_index[sid] for sid in candidates if sid in station_index]] = True
+    mask[row] = False
+    rows, _ = station_tree.query(station_lats[row], station_lons[row], k, mask=mask)
+    return [station_ids[r] for r in rows.tolist()]
+
+def build_partner_table(donors, receivers):
+    """
+    top_partner_1..3 for every station (same rule as build_agent_observation):
+    donors pick the nearest receivers, everyone else the nearest donors,
+    padded with the station itself (self-loop => “do nothing”).
+    """
+    load_data()
+    is_donor    = np.zeros(len(station_ids), dtype=bool)
+    is_receiver = np.zeros(len(station_ids), dtype=bool)
+    is_donor[[station_index[sid] for sid in donors]]       = True
+    is_receiver[[station_index[sid] for sid in receivers]] = True
+
+    nearest = [None] * len(station_ids)
+    for group, candidates in ((np.flatnonzero(is_donor), is_receiver), (np.flatnonzero(~is_donor), is_donor)):
+        # one extra in case the station is among its own candidates
+        rows, _ = station_tree.query_many(station_lats[group], station_lons[group], 4, mask=candidates)
+        for row, near in zip(group.tolist(), rows.tolist()):
+            nearest[row] = [r for r in near if r != row][:3]
+
+    partners = []
+    for row, sid in enumerate(station_ids):
+        candidates = [station_ids[r] for r in nearest[row]]
+        partners.append(candidates + [sid] * (3 - len(candidates)))
+    return partners
     
 def compute_reward_for_station(station_id, stations, missed_weight=50.0, move_weight=0.005):
     """
@@ -196,517 +395,568 @@ def transfer_bikes(from_id: str, to_id: str, qty: int, stations: dict):
     stations[to_id]["bike_count"]        = stations[to_id].get("bike_count", 0) + moved
     stations[to_id]["received_bikes"]    = stations[to_id].get("received_bikes", 0) + moved
 
-# Main function of MARL sim
-def run_marl_simulation_step(n, stations_marl_global, in_transit_marl_global, last_update_marl_global, last_frame_marl_frame, redistribution_in_transit_list):
-    results = []
-    missed_path = f"datasets/missed_trips_marl.csv"
-    
-    blank_fig = go.Figure()
-    blank_fig.update_layout(
-        mapbox_style="carto-positron",
-        mapbox_zoom=12,
-        mapbox_center={"lat": 40.4168, "lon": -3.7038}
-    )
-    results = [blank_fig, "", "", blank_fig, "", ""]  # pre-fill map placeholders
-
-    for selected_date in ["2022-05-05", "2022-05-11"]:
-        trip_df = trip_dfs[selected_date]
-        sim_date = datetime.strptime(selected_date, "%Y-%m-%d")
-        current_time = sim_date + timedelta(seconds=n * SPEED_MULTIPLIER)
-        rebalancing_cost = 0
-
-        # Create redistribution list if not exists
-        if "redistribution_in_transit_list" not in in_transit_marl_global:
-            in_transit_marl_global["redistribution_in_transit_list"] = {}
-
-        if selected_date not in in_transit_marl_global["redistribution_in_transit_list"]:
-            in_transit_marl_global["redistribution_in_transit_list"][selected_date] = []
-
-        redistribution_in_transit_list = in_transit_marl_global["redistribution_in_transit_list"][selected_date]
-
-        # Init state
-        if n == 0 or selected_date not in stations_marl_global:
-            stations_marl_global[selected_date] = {
-                sid: {
-                    "bike_count": initial_bike_counts.get(sid, 30),
-                    "completed_trips": 0,
-                    "missed_trips": 0,
-                    "was_empty": 0,
-                    "was_full": 0,
-                    "previous_action": "do_nothing",
-                    "sent_bikes": 0,
-                    "received_bikes": 0
-                }for sid in station_df["station_id"].astype(str)
-            }
-            in_transit_marl_global[selected_date] = []
-            last_update_marl_global[selected_date] = sim_date
-            redistribution_in_transit_list = in_transit_marl_global["redistribution_in_transit_list"][selected_date]
-                        
-            # Overwrite missed_trips_marl.csv for fresh start (only once)
-            if selected_date == "2022-05-05":
-                with open("datasets/missed_trips_marl.csv", "w", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow(["trip_id", "start_time", "end_time", "start_station_id", "end_station_id", "simulated_day"])
-
-        stations = stations_marl_global[selected_date]
-        in_transit = in_transit_marl_global[selected_date]
-        last_time = last_update_marl_global[selected_date]
-        
-        # Skip duplicate frames
-        if selected_date not in last_frame_marl_frame:
-            last_frame_marl_frame[selected_date] = -1
-        if n <= last_frame_marl_frame[selected_date]:
-            from dash.exceptions import PreventUpdate
-            raise PreventUpdate
-        
-        last_frame_marl_frame[selected_date] = n
- 
-        # Track how often each MARL station is empty or full
-        for sid in stations:
-            count = stations[sid]["bike_count"]
-            if count == 0:
-                stations[sid]["was_empty"] += 1
-            elif count >= 27:
-                stations[sid]["was_full"] += 1
+def truck_trip(from_row, to_row):
+    """ (arrival delay, road km) of a redistribution truck between two station rows. """
+    minutes = TRUCK_HANDLING_MINUTES + travel_times.minutes(from_row, to_row)
+    return timedelta(minutes=minutes), travel_times.km(from_row, to_row)
 
-            # Track availability % over time
-            availability = 100 * count / STATION_CAPACITY
-            if "availability_sum" not in stations[sid]:
-                stations[sid]["availability_sum"] = 0
-            stations[sid]["availability_sum"] += availability
+def dispatch_trucks(session, selected_date, moves, current_time, deadline):
+    """
+    Schedule a batch of (from_row, to_row, qty) moves on the date's redistribution
+    queue: one direct truck per move, or routes of the TRUCK_FLEET_SIZE trucks
+    (arrivals follow each truck's route, moves they can't deliver by `deadline` are
+    dropped). Returns ([(from_row, to_row, qty), ...] scheduled, truck km driven).
+    """
+    queue = session.in_transit_marl["redistribution_in_transit_list"][selected_date]
+    if TRUCK_FLEET_SIZE is None:
+        deliveries, km = [], 0.0
+        for frm, to, qty in moves:
+            delay, move_km = truck_trip(frm, to)
+            deliveries.append((frm, to, qty, current_time + delay))
+            km += move_km
+    else:
+        fleets = session.in_transit_marl.setdefault("truck_fleet", {})
+        if selected_date not in fleets:
+            # trucks leave from the station nearest the middle of the network
+            depot, _ = station_tree.query(float(np.mean(station_lats)), float(np.mean(station_lons)), 1)
+            fleets[selected_date] = TruckFleet(TRUCK_FLEET_SIZE, TRUCK_CAPACITY, travel_times, int(depot[0]),
+                                               stop_minutes=TRUCK_HANDLING_MINUTES / 2)
+        deliveries, km = fleets[selected_date].plan(moves, current_time, deadline)
+
+    for frm, to, qty, arrival in deliveries:
+        queue.append({
+            "from_id":  station_ids[frm],
+            "end_id":   station_ids[to],
+            "quantity": qty,
+            "end_time": arrival
+        })
+    return [(frm, to, qty) for frm, to, qty, _ in deliveries], km
+
+# Dates simulated side by side
+SIM_DATES = ["2022-05-05", "2022-05-11"]
+
+def learn(n_updates=1, profiler=NULL_PROFILER):
+    """ Run n DQN updates (with background checkpoints), or count them when learning is deferred. """
+    global deferred_updates
+    if not ONLINE_LEARNING:
+        deferred_updates += n_updates
+        return
+    with agent_lock:
+        for _ in range(n_updates):
+            shared_agent.update()
+            profiler.lap("dqn_update")
+            checkpointer.on_update()
+            profiler.lap("checkpoint")
+        profiler.count("updates", n_updates)
+        profiler.set("replay_size", len(shared_agent.replay_buffer))
+
+def day_completion_rate(session):
+    """ Completed / (completed + missed) over every simulated date; the best-checkpoint score. """
+    finished  = [session.stations_marl[date] for date in session.dates if date in session.stations_marl]
+    completed = sum(int(st.completed_trips.sum()) for st in finished)
+    missed    = sum(int(st.missed_trips.sum()) for st in finished)
+    return completed / max(completed + missed, 1)
+
+def summarize_day(session, selected_date):
+    """ End-of-day totals for one date: a daily_summary_marl.csv row. """
+    stations = session.stations_marl[selected_date]
+    total_completed = int(stations.completed_trips.sum())
+    total_missed = int(stations.missed_trips.sum())
+    # only count bikes actually at stations
+    total_bikes = int(stations.bike_count.sum())
+
+    if (total_completed + total_missed) > 0:
+        trip_completion_rate = round((total_completed / (total_completed + total_missed)) * 100, 2)
+    else:
+        trip_completion_rate = 0
+
+    station_availabilities = stations.availability_sum / 300  # 300 frames in a day
+    overall_availability = round(sum(station_availabilities.tolist()) / len(station_availabilities), 2)
+
+    return {
+        "simulated_day": selected_date,
+        "method": "MARL",
+        "completed_trips": total_completed,
+        "missed_trips": total_missed,
+        "completion_rate": trip_completion_rate,
+        "rebalancing_cost": round(session.rebalancing_cost[selected_date], 1),
+        "avg_availability": overall_availability,
+        "ramaining_bikes": total_bikes,
+        "moved_3_4_h":   session.moved_3_4[selected_date],
+        "moved_12_13_h": session.moved_12_13[selected_date],
+        "truck_km":      round(session.truck_km[selected_date], 1),
+    }
 
+def append_summary_row(path, row):
+    """ Append one row to a summary CSV; a file written before a column was added is rewritten once. """
+    import pandas as pd
+    df = pd.DataFrame([row])
+    if not os.path.exists(path) or os.stat(path).st_size == 0:
+        df.to_csv(path, index=False)
+        return
+    header = pd.read_csv(path, nrows=0).columns.tolist()
+    if set(df.columns) <= set(header):
+        df.reindex(columns=header).to_csv(path, mode="a", header=False, index=False)
+    else:
+        tmp_path = f"{path}.tmp"
+        pd.concat([pd.read_csv(path), df], ignore_index=True).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)  # atomic: a crash mid-write never truncates the old rows
 
-        for sid in stations:
-            stations[sid]["just_missed"] = False
-    
-        # Handle new trips
-        new_trips = trip_df[
-            (trip_df["start_time"] >= last_time) & (trip_df["start_time"] < current_time)
-        ]
-        missed = 0
-        stations[sid]["just_missed"] = False
-
-        for _, row in new_trips.iterrows():
-            start_id = str(row["start_station_id"])
-            end_id = str(row["end_station_id"])
-            trip_time = row["start_time"]
-
-            # Only process trips that should happen right now (current_time window)
-            if trip_time <= current_time:
-                if start_id in stations and stations[start_id]["bike_count"] > 0:
-                    stations[start_id]["bike_count"] -= 1
-                    in_transit.append({
-                        "end_time": row["end_time"],
-                        "end_id": end_id
-                    })
-                    stations[start_id]["completed_trips"] += 1
-                else:
-                    stations[start_id]["missed_trips"] += 1
-                    missed += 1
-                    stations[start_id]["just_missed"] = True
-
-                    # Save missed trip to CSV
-                    with open(missed_path, "a", newline="") as f:
-                        writer = csv.writer(f)
-                        writer.writerow([
-                            row["trip_id"],
-                            row["start_time"],
-                            row["end_time"],
-                            start_id,
-                            end_id,
-                            selected_date
-                        ])
-                        
-        # Build Observation for each agent
-        total_frames = n + 1
-        current_hour = current_time.hour
-        
-        # ——— Dynamic per-station capacity ———
-        station_capacity = {}
-        for sid, data in stations.items():
-            # sum outgoing demand for next 3 hours
-            future_demand = sum(
-                historical_demand[selected_date]["outgoing"][sid].get(h, 0)
-                for h in range(current_hour, current_hour + 3)
+# Headless engine: advances one date by one frame, no figures and no Dash
+def advance_marl_date(session, n, selected_date):
+    """
+    Advance `selected_date` to frame `n` and return its metrics
+    ({"current_time", "missed", "summary"}), or None if frame `n` was already processed.
+    """
+    load_data()
+    load_agent()
+    trip_index = trip_indexes[selected_date]
+    sim_date = datetime.strptime(selected_date, "%Y-%m-%d")
+    current_time = sim_date + timedelta(seconds=n * SPEED_MULTIPLIER)
+    rebalancing_cost = 0
+
+    # Create redistribution list if not exists
+    if "redistribution_in_transit_list" not in session.in_transit_marl:
+        session.in_transit_marl["redistribution_in_transit_list"] = {}
+
+    if selected_date not in session.in_transit_marl["redistribution_in_transit_list"]:
+        session.in_transit_marl["redistribution_in_transit_list"][selected_date] = TransitQueue()
+
+    redistribution_in_transit_list = session.in_transit_marl["redistribution_in_transit_list"][selected_date]
+
+    # Create trip cursors if not exists
+    if "trip_cursor" not in session.in_transit_marl:
+        session.in_transit_marl["trip_cursor"] = {}
+
+    # Init state
+    if n == 0 or selected_date not in session.stations_marl:
+        carried = session.fleet.get(session.dates.index(selected_date)) if session.carry_over else None
+        if carried is not None:
+            # continuous mode: pick up yesterday's docked bikes, riders and trucks
+            stations, riders, trucks = carried.restore(station_ids, selected_date)
+            session.stations_marl[selected_date] = stations
+            session.in_transit_marl[selected_date] = riders
+            session.in_transit_marl["redistribution_in_transit_list"][selected_date] = trucks
+        else:
+            session.stations_marl[selected_date] = StationState(
+                station_ids,
+                bike_counts=[initial_bike_counts.get(sid, 30) if INITIAL_FILL is None else INITIAL_FILL
+                             for sid in station_ids]
             )
-            # allow +1 slot per 5 forecasted trips, up to + 20 extra
-            extra_slots = min(future_demand // 5, 20)
-            station_capacity[sid] = STATION_CAPACITY + extra_slots
-        # ————————————————————————————————
-
-        # Handle returns
-        to_return = [trip for trip in in_transit if trip["end_time"] <= current_time]
-        for trip in to_return:
-            end_id = str(trip["end_id"])
-            if end_id in stations:
-                # riders always return their bikes
-                stations[end_id]["bike_count"] += 1
-            in_transit.remove(trip)
-            
-        # Handle redistributed bikes arriving after delay
-        redistributed_arrivals = [t for t in redistribution_in_transit_list if t["end_time"] <= current_time]
-        for trip in redistributed_arrivals:
-            end_id = str(trip["end_id"])
-            if end_id in stations:
-               # we planned correctly, so just add back every bike we moved
-                # we guaranteed this at plan time—just add back everything
-                stations[end_id]["bike_count"] += trip["quantity"]
-                stations[end_id]["received_bikes"] += trip["quantity"]
-                stations[end_id]["early_received_glow"] = 3
-
-            redistribution_in_transit_list.remove(trip)
-        
-        # == 3:00–4:00 equal‐spread rebalancing ==
-        if 3 <= current_hour < 4:
-            counts = [data["bike_count"] for data in stations.values()]
-            avg = sum(counts) // len(counts)
-            donors    = {sid: data["bike_count"] - avg
-                         for sid, data in stations.items() if data["bike_count"] > avg}
-            receivers = {sid: avg - data["bike_count"]
-                         for sid, data in stations.items() if data["bike_count"] < avg}
-            for from_id, surplus in donors.items():
-                for to_id, need in list(receivers.items()):
-                    qty = min(surplus, need)
-                    qty = min(qty, stations[from_id]["bike_count"])  # <-- clamp to what’s actually there
-                    if qty <= 0:
-                        continue
+            session.in_transit_marl[selected_date] = TransitQueue()
+        session.last_update_marl[selected_date] = sim_date
+        session.in_transit_marl["trip_cursor"][selected_date] = TripCursor(trip_index, sim_date)
+        session.in_transit_marl.setdefault("equal_spread_planned", set()).discard(selected_date)
+        session.in_transit_marl.setdefault("truck_fleet", {}).pop(selected_date, None)
+        redistribution_in_transit_list = session.in_transit_marl["redistribution_in_transit_list"][selected_date]
                     
-                    # 1) schedule the move for +1 hour
-                    redistribution_in_transit_list.append({
-                        "from_id":    from_id,
-                        "end_id":     to_id,
-                        "quantity":   qty,
-                        "end_time":   current_time + timedelta(hours=1)
-                    })
-
-                   # 2) immediately remove bikes from sender
-                    stations[from_id]["bike_count"]   -= qty
-                    stations[from_id]["sent_bikes"]   = stations[from_id].get("sent_bikes", 0) + qty
-
-                    # 3) glow
-                    stations[from_id]["early_sent_glow"] = 3
-
-                    # 4) cost
-                    rebalancing_cost += qty
-                    rebalancing_cost_global[selected_date] += qty
-                    moved_3_4_global[selected_date] += qty
-
-                    # 5) reduce outstanding need
-                    receivers[to_id] -= qty
-                    surplus         -= qty
+        # Overwrite this session's missed_trips_marl_<id>.csv for fresh start (only once)
+        if selected_date == session.dates[0] and session.write_outputs:
+            session.trip_event_sink.reset()
 
+    stations = session.stations_marl[selected_date]
+    in_transit = session.in_transit_marl[selected_date]
+    trip_cursor = session.in_transit_marl["trip_cursor"][selected_date]
+    
+    # Skip duplicate frames
+    if selected_date not in session.last_frame_marl:
+        session.last_frame_marl[selected_date] = -1
+    if n <= session.last_frame_marl[selected_date]:
+        return None
+    
+    session.last_frame_marl[selected_date] = n
+    profiler = session.profiler
+    profiler.start_frame(selected_date, n, current_time)
+
+    # Fade glows and reset the previous frame's move counters
+    stations.early_sent_glow[stations.early_sent_glow > 0]         -= 1
+    stations.early_received_glow[stations.early_received_glow > 0] -= 1
+    stations.sent_bikes     = 0
+    stations.received_bikes = 0
+ 
+    # Track how often each MARL station is empty or full
+    counts = stations.bike_count
+    stations.was_empty += counts == 0
+    stations.was_full  += counts >= 27
+
+    # Track availability % over time
+    stations.availability_sum += 100 * counts / STATION_CAPACITY
+
+    stations.just_missed = False
+    profiler.lap("bookkeeping")
+
+    # Handle new trips: only the ones that started since the last frame
+    missed = 0
+    bike_count = stations.bike_count
+    started = trip_cursor.advance(current_time)
+    for i in started:
+        start_id = trip_index.start_ids[i]
+        end_id = trip_index.end_ids[i]
+        s = stations.index[start_id]
+
+        if bike_count[s] > 0:
+            bike_count[s] -= 1
+            in_transit.append({
+                "end_time": trip_index.end_times[i],
+                "end_id": end_id
+            })
+            stations.completed_trips[s] += 1
+            if session.write_outputs and session.trip_event_sink.record_completed:
+                session.trip_event_sink.completed(trip_index.trip_ids[i], trip_index.start_times[i],
+                                                  trip_index.end_times[i], start_id, end_id, selected_date)
+        else:
+            stations.missed_trips[s] += 1
+            missed += 1
+            stations.just_missed[s] = True
+
+            # Buffer missed trip (written in bulk at frame/day end)
+            if session.write_outputs:
+                session.trip_event_sink.missed(trip_index.trip_ids[i], trip_index.start_times[i],
+                                               trip_index.end_times[i], start_id, end_id, selected_date)
+    profiler.lap("trips")
+    profiler.count("trips_processed", len(started))
+    profiler.count("trips_missed", missed)
+
+    # Build Observation for each agent
+    total_frames = n + 1
+    current_hour = current_time.hour
+    
+    # ——— Dynamic per-station capacity ———
+    # sum outgoing demand for next 3 hours,
+    # allow +1 slot per 5 forecasted trips, up to + 20 extra
+    future_demand    = historical_demand[selected_date]["outgoing_3hr"][:, current_hour]
+    station_capacity = STATION_CAPACITY + np.minimum(future_demand // 5, 20)
+    # ————————————————————————————————
+    profiler.lap("capacity")
+
+    # Handle returns
+    returns = in_transit.pop_due(current_time)
+    for trip in returns:
+        end_id = str(trip["end_id"])
+        if end_id in stations:
+            # riders always return their bikes
+            bike_count[stations.index[end_id]] += 1
         
-        # Demand-based redistribution (12:00–13:00) 
-        if 12 <= current_hour < 13:
-            # ——— DYNAMIC DONOR/RECEIVER RANKING ———
-            # Score each station by (predicted demand next hour) - (current bike count)
-            scores = {}
-            for sid, data in stations.items():
-                # data["historical_demand_next_hr"] is already in your obs,
-                # but here we read directly from historical_demand
-                demand = historical_demand[selected_date]["outgoing"][sid].get(current_hour, 0)
-                bikes  = data["bike_count"]
-                scores[sid] = demand - bikes
-
-            # sort ascending: lowest scores (surplus) are donors, highest (need) are receivers
-            sorted_sids = sorted(scores, key=scores.get)
-            demand_donors    = sorted_sids[:60]
-            demand_receivers = sorted_sids[-60:]
-            # print(f"[12h] donors (first 5): {demand_donors[:5]}, receivers (first 5): {demand_receivers[:5]}")
-
-            # ——————————————————————————————
-            
-            # 1) Build observations for every station
-            observations = {
-                sid: build_agent_observation(
-                        station_id     = sid,
-                        current_hour   = current_hour,
-                        station_data   = stations,
-                        historical_demand = historical_demand,
-                        selected_date  = selected_date,
-                        total_frames   = total_frames,
-                        donors         = demand_donors,
-                        receivers      = demand_receivers
-                    )
-                for sid in station_ids
-            }
-
-            # 2) Have each StationAgent choose an action
-            actions = {
-                sid: station_agents[sid].observe_and_act(observations[sid])
-                for sid in station_ids
-            }
-
-            # 3) Map each action index to a concrete bike move
-            moves = []      # list of (from_id, to_id, qty)
-            for sid, act in actions.items():
-                if act == 0:
-                    continue  # do nothing
-                # acts 1–3 = send 5 bikes to top_partner_1/2/3
-                elif 1 <= act <= 3:
-                    partner = observations[sid][f"top_partner_{act}"]
-                    # only send as many as destination can hold
-                    # how many we *could* add
-                    desired = 5
-                    free_slots = STATIC_MAX_CAPACITY - stations[partner]["bike_count"]
-                    # record overflow attempts
-                    overflow = max(0, desired - free_slots)
-                    if overflow > 0:
-                        stations[sid].setdefault("overflow_attempts", 0)
-                        stations[sid]["overflow_attempts"] += overflow                    
-                    send_qty  = min(5, stations[sid]["bike_count"], free_slots)
-                    if send_qty > 0:
-                        moves.append((sid, partner, send_qty))                
-                # acts 4–6 = request 5 bikes from top_partner_{act-3}
-                else:
-                    partner = observations[sid][f"top_partner_{act-3}"]
-                    moves.append((partner, sid, 5))
-
-            # 4) Apply all moves in bulk
-            for frm, to, requested_qty in moves:
-                # clamp to what’s actually available
-                moved_qty = min(requested_qty, stations[frm]["bike_count"])
-                if moved_qty <= 0:
-                  continue
-        
-                # remove from sender now
-                stations[frm]["bike_count"] -= moved_qty
-                stations[frm]["sent_bikes"] = stations[frm].get("sent_bikes", 0) + moved_qty
-                stations[frm]["early_sent_glow"] = 1
-        
-                # schedule exactly what we removed
-                redistribution_in_transit_list.append({
-                    "from_id":  frm,
-                    "end_id":   to,
-                    "quantity": moved_qty,
-                    "end_time": current_time + timedelta(hours=1)
-                })
+    # Handle redistributed bikes arriving after delay
+    arrivals = redistribution_in_transit_list.pop_due(current_time)
+    for trip in arrivals:
+        end_id = str(trip["end_id"])
+        if end_id in stations:
+           # we planned correctly, so just add back every bike we moved
+            # we guaranteed this at plan time—just add back everything
+            stations[end_id]["bike_count"] += trip["quantity"]
+            stations[end_id]["received_bikes"] += trip["quantity"]
+            stations[end_id]["early_received_glow"] = 3
+    profiler.lap("returns")
+    profiler.count("returns", len(returns))
+    profiler.count("truck_arrivals", len(arrivals))
+    profiler.set("in_transit", len(in_transit))
+    
+    # == 3:00–4:00 equal‐spread rebalancing ==
+    # planned once per window: stations above the mean send their surplus to the
+    # nearest stations below it (rebalancing.py), each truck arrives after its drive
+    spread_planned = session.in_transit_marl.setdefault("equal_spread_planned", set())
+    if EQUAL_SPREAD_HOURS[0] <= current_hour < EQUAL_SPREAD_HOURS[1] and selected_date not in spread_planned:
+        spread_planned.add(selected_date)
+        spread_moves = [(frm, to, qty) for frm, to, qty, _ in plan_equal_spread(stations.bike_count, station_tree)
+                        if frm != to]
+        profiler.lap("equal_spread")
+
+        # trucks take what they can deliver before the window closes, plus their kilometres in the cost
+        window_end = sim_date + timedelta(hours=EQUAL_SPREAD_HOURS[1])
+        scheduled, km = dispatch_trucks(session, selected_date, spread_moves, current_time, window_end)
+        rebalancing_cost += TRUCK_KM_COST * km
+        session.rebalancing_cost[selected_date] += TRUCK_KM_COST * km
+        session.truck_km[selected_date] += km
+        profiler.lap("truck_routing")
+
+        for frm, to, qty in scheduled:
+            from_id = station_ids[frm]
+
+            # 1) remove the scheduled bikes from the sender
+            stations[from_id]["bike_count"]   -= qty
+            stations[from_id]["sent_bikes"]   = stations[from_id].get("sent_bikes", 0) + qty
+
+            # 2) glow
+            stations[from_id]["early_sent_glow"] = 3
+
+            # 3) cost per bike moved
+            rebalancing_cost += qty
+            session.rebalancing_cost[selected_date] += qty
+            session.moved_3_4[selected_date] += qty
+
+            profiler.count("moves_applied")
+            profiler.count("bikes_moved", qty)
+        profiler.lap("equal_spread")
+
+    
+    # Demand-based redistribution (12:00–13:00) 
+    if DEMAND_REBALANCE_HOURS[0] <= current_hour < DEMAND_REBALANCE_HOURS[1]:
+        # ——— DYNAMIC DONOR/RECEIVER RANKING ———
+        # Score each station by (predicted demand next hour) - (current bike count)
+        # data["historical_demand_next_hr"] is already in your obs,
+        # but here we read directly from historical_demand
+        demand = historical_demand[selected_date]["outgoing"][:, current_hour]
+        scores = demand - stations.bike_count
+
+        # sort ascending: lowest scores (surplus) are donors, highest (need) are receivers
+        sorted_sids = [station_ids[i] for i in np.argsort(scores, kind="stable")]
+        demand_donors    = sorted_sids[:60]
+        demand_receivers = sorted_sids[-60:]
+        # print(f"[12h] donors (first 5): {demand_donors[:5]}, receivers (first 5): {demand_receivers[:5]}")
+
+        # ——————————————————————————————
         
-                # track the cost on the same moved_qty
-                rebalancing_cost += moved_qty
-                rebalancing_cost_global[selected_date] += moved_qty
-                moved_12_13_global[selected_date] += moved_qty
+        # 1) Build observations for every station
+        observations = build_observation_matrix(current_hour, stations, historical_demand,
+                                                selected_date, total_frames)
+        partners = build_partner_table(demand_donors, demand_receivers)
+
+        # 2) Have every station choose an action in one forward pass
+        with agent_lock:
+            actions = session.station_agents.observe_and_act(observations)
+
+        # 3) Map each action index to a concrete bike move
+        moves = []      # list of (from_id, to_id, qty)
+        for sid, act, top_partners in zip(station_ids, actions.tolist(), partners):
+            if act == 0:
+                continue  # do nothing
+            # acts 1–3 = send 5 bikes to top_partner_1/2/3
+            elif 1 <= act <= 3:
+                partner = top_partners[act - 1]
+                # only send as many as destination can hold
+                # how many we *could* add
+                desired = 5
+                free_slots = STATIC_MAX_CAPACITY - stations[partner]["bike_count"]
+                # record overflow attempts
+                overflow = max(0, desired - free_slots)
+                if overflow > 0:
+                    stations[sid].setdefault("overflow_attempts", 0)
+                    stations[sid]["overflow_attempts"] += overflow                    
+                send_qty  = min(5, stations[sid]["bike_count"], free_slots)
+                if send_qty > 0:
+                    moves.append((sid, partner, send_qty))                
+            # acts 4–6 = request 5 bikes from top_partner_{act-3}
+            else:
+                partner = top_partners[act - 4]
+                moves.append((partner, sid, 5))
+
+        # 4) Clamp every move to what the sender still has once the earlier ones left
+        truck_moves = []
+        available = stations.bike_count.copy()
+        for frm, to, requested_qty in moves:
+            frm_row, to_row = station_index[frm], station_index[to]
+            moved_qty = min(requested_qty, available[frm_row])
+            if moved_qty <= 0 or frm_row == to_row:
+              continue
+            available[frm_row] -= moved_qty
+            truck_moves.append((frm_row, to_row, int(moved_qty)))
+        profiler.lap("dqn_actions")
+
+        # trucks take what they can deliver before the window closes, plus their kilometres in the cost
+        window_end = sim_date + timedelta(hours=DEMAND_REBALANCE_HOURS[1])
+        scheduled, km = dispatch_trucks(session, selected_date, truck_moves, current_time, window_end)
+        rebalancing_cost += TRUCK_KM_COST * km
+        session.rebalancing_cost[selected_date] += TRUCK_KM_COST * km
+        session.truck_km[selected_date] += km
+        profiler.lap("truck_routing")
+
+        # 5) Apply the scheduled moves in bulk
+        for frm_row, to_row, moved_qty in scheduled:
+            frm = station_ids[frm_row]
+
+            # remove from sender now
+            stations[frm]["bike_count"] -= moved_qty
+            stations[frm]["sent_bikes"] = stations[frm].get("sent_bikes", 0) + moved_qty
+            stations[frm]["early_sent_glow"] = 1
+    
+            # track the cost on the same moved_qty
+            rebalancing_cost += moved_qty
+            session.rebalancing_cost[selected_date] += moved_qty
+            session.moved_12_13[selected_date] += moved_qty
+            profiler.count("moves_applied")
+            profiler.count("bikes_moved", moved_qty)
+        profiler.lap("dqn_actions")
 
+    
+        # 6) Record the reward & next observation for each station
+        rewards = np.empty(len(station_ids), dtype=np.float32)
+        for i, sid in enumerate(station_ids):
+            # dynamic ideal: 1 slot per 2 forecasted trips + base 15
+            outgoing = historical_demand[selected_date]["outgoing"][station_index[sid], current_hour]
+            ideal    = 15 + (outgoing / 2)
+            # now get the reward
+            reward = compute_reward_for_station(
+                sid, stations,
+                missed_weight=MISSED_WEIGHT,
+                move_weight=MOVE_WEIGHT
+            )
+            # subtract deviation from that ideal
+            count = stations[sid]["bike_count"]
+            reward -= 0.2 * abs(count - ideal)
+            rewards[i] = reward
+
+        next_observations = build_observation_matrix(current_hour, stations, historical_demand,
+                                                     selected_date, total_frames)
+        with agent_lock:
+            session.station_agents.record(rewards, next_observations, done=False)
+        profiler.lap("rewards")
         
-            # 5) Record the reward & next observation for each station
-            for sid in station_ids:
-                # dynamic ideal: 1 slot per 2 forecasted trips + base 15
-                outgoing = historical_demand[selected_date]["outgoing"][sid].get(current_hour, 0)
-                ideal    = 15 + (outgoing / 2)
-                # now get the reward
-                reward = compute_reward_for_station(
-                    sid, stations,
-                    missed_weight=50.0,
-                    move_weight=0.005
-                )
-                # subtract deviation from that ideal
-                count = stations[sid]["bike_count"]
-                reward -= 0.2 * abs(count - ideal)
-                
-                next_obs= build_agent_observation(
-                             station_id = sid,
-                             current_hour= current_hour,
-                             station_data= stations,
-                             historical_demand= historical_demand,
-                             selected_date= selected_date,
-                             total_frames= total_frames,
-                             donors = demand_donors,
-                             receivers = demand_receivers
-                         )
-                station_agents[sid].record(reward, next_obs, done=False)
+        learn(profiler=profiler)
             
-            shared_agent.update()
-            shared_agent.save(CKPT_PATH)
-                
-            #print("Replay buffer size:", len(shared_agent.replay_buffer))
-            #print("Sample action dist:", {a: list(actions.values()).count(a) for a in set(actions.values())})
+        #print("Replay buffer size:", len(shared_agent.replay_buffer))
+        #print("Sample action dist:", {a: list(actions.values()).count(a) for a in set(actions.values())})
 
-        
-        # === Draw map ===
-        lats, lons, colors, sizes, hovers = [], [], [], [], []
-        # === Track which stations sent or received redistributed bikes recently ===
-        show_redistribution_icons = []
-        redistribution_color_map = []
-
-        for sid in stations:
-            station = stations[sid]
-            sent = station.get("sent_bikes", 0)
-            received = station.get("received_bikes", 0)
-
-            # If redistribution just occurred within the last hour
-            if 12 <= current_time.hour <= 13:
-                if received > 0:
-                    show_redistribution_icons.append((sid, "received"))
-                elif sent > 0:
-                    show_redistribution_icons.append((sid, "sent"))
-
-        for _, row in station_df.iterrows():
-            sid = str(row["station_id"])
-            lat, lon = row["lat"], row["lon"]
-            name = row["station_name"]
-            count = stations.get(sid, {}).get("bike_count", 0)
-
-            lats.append(lat)
-            lons.append(lon)
-            colors.append(get_color(count))
-            sizes.append(min(9 + 0.5 * count, 15))
-            sent = stations.get(sid, {}).get("sent_bikes", 0)
-            received = stations.get(sid, {}).get("received_bikes", 0)
-            hovers.append(f"{name}<br><br>Bikes: {count}<br>Sent / Received: {sent} / {received}")
-
-        fig = draw_map(stations, station_df, current_time)
-        if selected_date == "2022-05-05":
-            results[0] = fig  # map
-            results[1] = f"❌ Missed Trips: {missed}"
-        elif selected_date == "2022-05-11":
-            results[3] = fig  # map
-            results[4] = f"❌ Missed Trips: {missed}"
+    
+    summary_text = None
+    if n == 300:  # Only print when simulation ends
+        import pandas as pd
+        if session.write_outputs:
+            # the last date of the frame finishes the day's parquet / arrow files
+            if selected_date == session.dates[-1]:
+                session.trip_event_sink.close()
+            else:
+                session.trip_event_sink.flush()
+
+      #  print(f"\n Simulation Summary for {selected_date}:")
+
+        # === 1. Empty / Full Count Debug ===
+     #   print("\n Empty / Full Tracking (first 5 stations):")
+      #  for sid, data in list(stations.items())[:5]:
+     #      print(f"  Station {sid} → was_empty: {data['was_empty']}, was_full: {data['was_full']}")
+
+        # === 2. Incoming / Outgoing Demand Debug ===
+       # current_hour = current_time.hour
+     #   print(f"\n Historical Demand (Hour {current_hour}) for first 5 stations:")
+        #for sid in list(stations.keys())[:5]:
+        #    row = station_index[sid]
+        #    outgoing = historical_demand[selected_date]["outgoing"][row, current_hour]
+        #    incoming = historical_demand[selected_date]["incoming"][row, current_hour]
+        #    print(f"  Station {sid} → Outgoing: {outgoing}, Incoming: {incoming}")
+            
+        # print(f"\n🧠 Agent Observations for {selected_date} (first 5 stations):")
+        #for sid, obs in list(agent_observations.items())[:5]:
+        #    print(f"  {sid}: {obs}")
+            
+        # print(f"\n🔄 Bike Movements for {selected_date} (first 5 stations):")
+        #for sid, data in list(stations.items())[:5]:
+        #    print(f"  {sid}: Sent → {data['sent_bikes']} | Received → {data['received_bikes']}")
 
+        # Summary text for Dash
+       
+        stats_rows = []
         
-        if n == 300:  # Only print when simulation ends
-            # Make sure results has at least 6 slots (for index 2 and 5)
-            while len(results) < 6:
-                results.append("")
-          #  print(f"\n Simulation Summary for {selected_date}:")
-
-            # === 1. Empty / Full Count Debug ===
-         #   print("\n Empty / Full Tracking (first 5 stations):")
-          #  for sid, data in list(stations.items())[:5]:
-         #      print(f"  Station {sid} → was_empty: {data['was_empty']}, was_full: {data['was_full']}")
-
-            # === 2. Incoming / Outgoing Demand Debug ===
-           # current_hour = current_time.hour
-         #   print(f"\n Historical Demand (Hour {current_hour}) for first 5 stations:")
-            for sid in list(stations.keys())[:5]:
-                outgoing = historical_demand[selected_date]["outgoing"][sid].get(current_hour, 0)
-                incoming = historical_demand[selected_date]["incoming"][sid].get(current_hour, 0)
-                #print(f"  Station {sid} → Outgoing: {outgoing}, Incoming: {incoming}")
-                
-            # print(f"\n🧠 Agent Observations for {selected_date} (first 5 stations):")
-            #for sid, obs in list(agent_observations.items())[:5]:
-            #    print(f"  {sid}: {obs}")
-                
-            # print(f"\n🔄 Bike Movements for {selected_date} (first 5 stations):")
-            #for sid, data in list(stations.items())[:5]:
-            #    print(f"  {sid}: Sent → {data['sent_bikes']} | Received → {data['received_bikes']}")
-
-            # Summary text for Dash
-           
-            stats_rows = []
-            
-            total_completed = sum(data["completed_trips"] for data in stations.values())
-            total_missed = sum(data["missed_trips"] for data in stations.values())
-            # only count bikes actually at stations
-            total_bikes = sum(data["bike_count"] for data in stations.values())
-                     
-            if (total_completed + total_missed) > 0:
-                trip_completion_rate = round((total_completed / (total_completed + total_missed)) * 100, 2)
+        # === Save to daily_summary.csv ===
+        summary_row = summarize_day(session, selected_date)
+        summary_text = f"""✅ Completed: {summary_row['completed_trips']} | ❌ Missed: {summary_row['missed_trips']} | 🚲 Remaining Bikes: {summary_row['ramaining_bikes']} | 🎯 Completion Rate: {summary_row['completion_rate']}% | 📈 Availability: {summary_row['avg_availability']}% | 💸 Rebalancing Cost: {summary_row['rebalancing_cost']} (🔄 Moved 3–4 h: {summary_row['moved_3_4_h']} & 🔄 Moved 12–13 h: {summary_row['moved_12_13_h']} | 🚚 {summary_row['truck_km']} km)"""
+
+        summary_path = session.output_path("datasets/daily_summary_marl.csv")
+        if session.write_outputs:
+            append_summary_row(summary_path, summary_row)
+
+        for sid, data in stations.items():
+            # Get total outgoing/incoming from historical demand (May 5th)
+            # Compute dynamically for both days
+            total_out = int(historical_demand[selected_date]["outgoing"][station_index[sid]].sum())
+            total_in = int(historical_demand[selected_date]["incoming"][station_index[sid]].sum())
+
+            # Determine status
+            activity = data["completed_trips"] + data["missed_trips"]
+            empty_ratio = data["was_empty"] / 300
+            full_ratio = data["was_full"] / 300
+
+            if activity > 188:
+                status = "busy"
+            elif activity < 58:
+                status = "underused"
+            elif empty_ratio > 0.25:
+                status = "always_empty"
+            elif full_ratio > 0.25:
+                status = "always_full"
             else:
-                trip_completion_rate = 0
-
-            station_availabilities = [
-                data["availability_sum"] / 300  # 300 frames in a day
-                for data in stations.values()
-                if "availability_sum" in data
-            ]
-            overall_availability = round(sum(station_availabilities) / len(station_availabilities), 2)
-
-            cost = rebalancing_cost_global[selected_date]
-            m3_4  = moved_3_4_global[selected_date]
-            m12_13 = moved_12_13_global[selected_date]
-      
-            summary_text = f"""✅ Completed: {total_completed} | ❌ Missed: {total_missed} | 🚲 Remaining Bikes: {total_bikes} | 🎯 Completion Rate: {trip_completion_rate}% | 📈 Availability: {overall_availability}% | 💸 Rebalancing Cost: {cost} (🔄 Moved 3–4 h: {m3_4} & 🔄 Moved 12–13 h: {m12_13})"""
-
-          #  print(f"✅ FINAL rebalancing cost for {selected_date}: {cost}")
-           # print(f"📊 Summary Text for {selected_date}: {summary_text}")
-
-            # === Save to daily_summary.csv ===
-            summary_row = {
+                status = "balanced"
+
+            # Healthy %
+            healthy_frames = 300 - data["was_empty"] - data["was_full"]
+            healthy_percentage = round((healthy_frames / 300) * 100)
+
+            stats_rows.append({
+                "station_id": sid,
+                "completed_trips": data["completed_trips"],
+                "missed_trips": data["missed_trips"],
+                "final_bike_count": data["bike_count"],
                 "simulated_day": selected_date,
-                "method": "MARL",
-                "completed_trips": total_completed,
-                "missed_trips": total_missed,
-                "completion_rate": trip_completion_rate,
-                "rebalancing_cost": cost,
-                "avg_availability": overall_availability,
-                "ramaining_bikes": total_bikes,
-                "moved_3_4_h":   m3_4,
-                "moved_12_13_h": m12_13,
-            }
-
-            summary_path = "datasets/daily_summary_marl.csv"
-            write_header = not os.path.exists(summary_path) or os.stat(summary_path).st_size == 0
-            pd.DataFrame([summary_row]).to_csv(summary_path, mode="a", header=write_header, index=False)
-
-            # Assign summary to correct side
-            if selected_date == "2022-05-05":
-                results[2] = summary_text
-            else:
-                results[5] = summary_text
-            
-            for sid, data in stations.items():
-                # Get total outgoing/incoming from historical demand (May 5th)
-                # Store into results[2] and results[5]
-                # Compute dynamically for both days
-                total_out = sum(historical_demand[selected_date]["outgoing"][sid].values())
-                total_in = sum(historical_demand[selected_date]["incoming"][sid].values())
-
-                # Determine status
-                activity = data["completed_trips"] + data["missed_trips"]
-                empty_ratio = data["was_empty"] / 300
-                full_ratio = data["was_full"] / 300
-
-                if activity > 188:
-                    status = "busy"
-                elif activity < 58:
-                    status = "underused"
-                elif empty_ratio > 0.25:
-                    status = "always_empty"
-                elif full_ratio > 0.25:
-                    status = "always_full"
-                else:
-                    status = "balanced"
-
-                # Healthy %
-                healthy_frames = 300 - data["was_empty"] - data["was_full"]
-                healthy_percentage = round((healthy_frames / 300) * 100)
-
-                stats_rows.append({
-                    "station_id": sid,
-                    "completed_trips": data["completed_trips"],
-                    "missed_trips": data["missed_trips"],
-                    "final_bike_count": data["bike_count"],
-                    "simulated_day": selected_date,
-                    "status": status,
-                    "total_outgoing": total_out,
-                    "total_incoming": total_in,
-                    "healthy_percentage": healthy_percentage,
-                    "avg_availability": round(data.get("availability_sum", 0) / 300, 2)
-                })
-
-            filename = f"datasets/station_stats_marl_{selected_date}.csv"
+                "status": status,
+                "total_outgoing": total_out,
+                "total_incoming": total_in,
+                "healthy_percentage": healthy_percentage,
+                "avg_availability": round(data.get("availability_sum", 0) / 300, 2)
+            })
+
+        filename = session.output_path(f"datasets/station_stats_marl_{selected_date}.csv")
+        if session.write_outputs:
             pd.DataFrame(stats_rows).to_csv(filename, index=False)
-            #print(f"✅ MARL stats exported to {filename}")
+        #print(f"✅ MARL stats exported to {filename}")
+
+        # Carry-over mode: hand the fleet to the next day, checkpoint it once every date is done
+        if session.carry_over:
+            session.fleet[session.dates.index(selected_date)] = FleetState.capture(
+                selected_date, stations, in_transit, redistribution_in_transit_list)
+            if selected_date == session.dates[-1] and session.write_outputs:
+                save_fleet(session.fleet, FLEET_CKPT_PATH)
+        
+        profiler.lap("day_end")
+
+        # ——— Train DQN with today’s experiences ———
+        n_updates = 50
+        learn(n_updates, profiler=profiler)
+
+        # once every date has finished, checkpoint the day (score = overall completion rate)
+        if selected_date == session.dates[-1] and ONLINE_LEARNING:
+            checkpointer.on_day_end(score=day_completion_rate(session))
+            profiler.lap("checkpoint")
             
-            # ——— Train DQN with today’s experiences ———
-            n_updates = 50
-            for _ in range(n_updates):
-                shared_agent.update()
-                
-           # print(f"End of day training done. ε = {shared_agent.epsilon:.3f}")
-
-        for station in stations.values():
-            if isinstance(station.get("early_sent_glow"), int) and station["early_sent_glow"] > 0:
-                station["early_sent_glow"] -= 1
-            if isinstance(station.get("early_received_glow"), int) and station["early_received_glow"] > 0:
-                station["early_received_glow"] -= 1
-                
-           
-            station["sent_bikes"] = 0
-            station["received_bikes"] = 0
-
-        last_update_marl_global[selected_date] = current_time        
-    
+       # print(f"End of day training done. ε = {shared_agent.epsilon:.3f}")
+
+    session.last_update_marl[selected_date] = current_time
+
+    return {
+        "current_time": current_time,
+        "missed":       missed,
+        "summary":      summary_text,  # only set on the last frame of the day
+    }
+
+def run_marl_headless_step(session, n):
+    """ Advance every simulated date of `session` by one frame; returns {date: metrics}. """
+    metrics = {selected_date: advance_marl_date(session, n, selected_date) for selected_date in session.dates}
+    if n == STEPS_PER_DAY:
+        session.profiler.flush()
+    return metrics
+
+# Main function of MARL sim (Dash callback)
+def run_marl_simulation_step(session, n):
+    from dash.exceptions import PreventUpdate
+
+    results = [None, "", "", None, "", ""]
+    for slot, selected_date in zip((0, 3), session.dates):
+        metrics = advance_marl_date(session, n, selected_date)
+        if metrics is None:
+            raise PreventUpdate
+
+        # keep the CSV live for the dashboard: one bulk write per frame
+        session.trip_event_sink.flush()
+        session.profiler.lap("trip_log")
+
+        # patches only (end-of-day hovers included): the base figure comes with the layout (base_map)
+        stations, current_time = session.stations_marl[selected_date], metrics["current_time"]
+        results[slot] = patch_map(session, f"marl {selected_date}", stations, current_time)
+        session.profiler.lap("map")
+        results[slot + 1] = f"❌ Missed Trips: {metrics['missed']}"
+        if metrics["summary"]:
+            results[slot + 2] = metrics["summary"]
+
+    if n == STEPS_PER_DAY:
+        session.profiler.flush()
     return (
         results[0],  # map_marl_05_05
         results[3],  # map_marl_05_11
@@ -716,153 +966,136 @@ def run_marl_simulation_step(n, stations_marl_global, in_transit_marl_global, la
         results[5],  # summary-marl-right
     )
 
-def draw_map(stations, station_df, current_time):
-    import plotly.graph_objects as go
-
-    fig = go.Figure()
-    lats, lons, colors, sizes, hovers = [], [], [], [], []
-
-    # Base station markers and hovers
-    for _, row in station_df.iterrows():
-        sid = str(row["station_id"])
-        lat, lon = row["lat"], row["lon"]
-        name = row["station_name"]
-        count = stations.get(sid, {}).get("bike_count", 0)
-        sent = stations.get(sid, {}).get("sent_bikes", 0)
-        received = stations.get(sid, {}).get("received_bikes", 0)
-
-        lats.append(lat)
-        lons.append(lon)
-        colors.append(get_color(count))
-        sizes.append(min(9 + 0.5 * count, 15))
-        if current_time.hour == 00 and current_time.minute == 00:
-            availability = round(stations[sid].get("availability_sum", 0) / 300, 2)
-            hovers.append(f"{name}<br><br>Bikes: {count}<br><b>Avg Availability: {availability}%</b>")
-        else:
-            availability = round(100 * count / STATION_CAPACITY, 2)
-            hovers.append(f"{name}<br><br>Bikes: {count}<br>Availability: {availability}%")
-
-    # --- Glow logic ---
-    for sid in stations:
-        station = stations[sid]
-        row = station_df[station_df["station_id"] == sid]
-        if row.empty:
-            continue
-        lat = row.iloc[0]["lat"]
-        lon = row.iloc[0]["lon"]
-
-        # 💙 Early morning sender glow
-        if isinstance(station.get("early_sent_glow"), int) and station["early_sent_glow"] > 0:
-            fig.add_trace(go.Scattermapbox(
-                lat=[lat],
-                lon=[lon],
-                mode="markers",
-                marker=go.scattermapbox.Marker(size=22, color="cyan", opacity=0.8),
-                hoverinfo="skip",
-                showlegend=False
-            ))
-
-        # 💚 Early morning receiver glow
-        if isinstance(station.get("early_received_glow"), int) and station["early_received_glow"] > 0:
-            fig.add_trace(go.Scattermapbox(
-                lat=[lat],
-                lon=[lon],
-                mode="markers",
-                marker=go.scattermapbox.Marker(size=22, color="chartreuse", opacity=0.8),
-                hoverinfo="skip",
-                showlegend=False
-            ))
-
-    # ⛔ Missed trip glow
-    for sid in stations:
-        station = stations[sid]
-        if station.get("just_missed", False):
-            row = station_df[station_df["station_id"] == sid]
-            if row.empty:
-                continue
-            lat = row.iloc[0]["lat"]
-            lon = row.iloc[0]["lon"]
-            size = min(9 + 0.5 * station["bike_count"], 15) + 5
-
-            fig.add_trace(go.Scattermapbox(
-                lat=[lat],
-                lon=[lon],
-                mode="markers",
-                marker=go.scattermapbox.Marker(size=size, color="black", opacity=1),
-                hoverinfo="skip",
-                showlegend=False
-            ))
-
-    # Add final visible markers (stations)
-    fig.add_trace(go.Scattermapbox(
-        lat=lats, lon=lons,
-        mode="markers",
-        marker=go.scattermapbox.Marker(size=sizes, color=colors, opacity=0.8),
-        text=hovers,
-        hoverinfo='text'
-    ))
-
-    fig.update_layout(
-        mapbox=dict(
-            style="carto-positron",
-            center=dict(lat=sum(lats)/len(lats), lon=sum(lons)/len(lons)),
-            zoom=12
-        ),
-        margin=dict(l=0, r=0, t=0, b=0),
-        paper_bgcolor="rgba(0,0,0,0)", 
-        plot_bgcolor="rgba(0,0,0,0)",
-        showlegend=False
-    )
+# Overlay traces under the MARL station markers: sender glow, receiver glow, missed-trip halo
+MARL_OVERLAY_MARKERS = [
+    dict(color="cyan", opacity=0.8),        # 💙 sent bikes
+    dict(color="chartreuse", opacity=0.8),  # 💚 received bikes
+    dict(color="black", opacity=1),         # ⛔ missed trip
+]
+GLOW_SIZE = 22  # sender / receiver glow marker size
 
-    return fig
+def marl_map_frame(stations, current_time):
+    """
+    Per-frame marker colors/sizes/hover data and glow overlays for one MARL map,
+    read straight from the StationState columns (rows follow station_index).
+    """
+    load_data()
+    counts = stations.bike_count
+    sizes  = np.minimum(9 + 0.5 * counts, 15)
+    availability = np.round(100 * counts / STATION_CAPACITY, 2)
+
+    # --- Glow logic: at most one batched trace per kind ---
+    sent     = stations.early_sent_glow > 0      # 💙 Early morning sender glow
+    received = stations.early_received_glow > 0  # 💚 Early morning receiver glow
+    missed   = stations.just_missed              # ⛔ Missed trip glow
+
+    frame = {
+        "colors":     get_colors(counts),
+        "sizes":      sizes.tolist(),
+        "customdata": [list(pair) for pair in zip(counts.tolist(), availability.tolist())],  # ints stay ints on the wire
+        "overlays": [  # size 0 hides a station's overlay marker
+            {"size": np.where(sent, GLOW_SIZE, 0).tolist()},
+            {"size": np.where(received, GLOW_SIZE, 0).tolist()},
+            {"size": np.where(missed, sizes + 5, 0).tolist()},
+        ],
+        "hovertext": None,
+    }
 
-def simulate_one_day():
+    if current_time.hour == 00 and current_time.minute == 00:
+        avg_availability = np.round(stations.availability_sum / 300, 2)
+        frame["hovertext"] = [
+            f"{name}<br><br>Bikes: {count}<br><b>Avg Availability: {avg}%</b>"
+            for name, count, avg in zip(station_names, counts.tolist(), avg_availability.tolist())
+        ]
+    return frame
+
+def base_map():
+    """ Static MARL map (station geometry, empty overlays): the figure app.py puts in the layout. """
+    from map_figures import base_map_figure
+    load_data()
+    return base_map_figure(station_df, MARL_OVERLAY_MARKERS, station_opacity=0.8)
+
+def draw_map(stations, station_df, current_time):
+    """ Full MARL map figure (static base + this frame). """
+    from map_figures import base_map_figure, apply_frame
+    fig = base_map_figure(station_df, MARL_OVERLAY_MARKERS, station_opacity=0.8)
+    return apply_frame(fig, marl_map_frame(stations, current_time))
+
+def patch_map(session, map_id, stations, current_time):
+    """ Only what changed since the frame `session` last sent to `map_id`: marker colors/sizes, hover data and glows. """
+    from map_figures import MapPatcher
+    if map_id not in session.map_patchers:
+        session.map_patchers[map_id] = MapPatcher()
+    return session.map_patchers[map_id].patch(marl_map_frame(stations, current_time))
+
+def simulate_one_day(session=None):
+    load()
     shared_agent.epsilon = max(shared_agent.epsilon, 0.2)
 
-    """ Resets globals, runs a full day, trains, and returns (summary_text, cost). """
-    # --- reset all per-day globals, leave shared_agent intact ---
-    stations_marl_global.clear()
-    in_transit_marl_global.clear()
-    last_update_marl_global.clear()
-    last_frame_marl_frame.clear()
-    redistribution_in_transit.clear()
-
-    for date in rebalancing_cost_global:
-        rebalancing_cost_global[date] = 0
-        moved_3_4_global[date]   = 0
-        moved_12_13_global[date] = 0
+    """ Resets the session (default_session if None), runs a full day, trains, and returns (summary_text, cost). """
+    session = session or default_session
+    # --- reset the session's day state, leave shared_agent intact ---
+    session.reset_marl()
         
     day_summary = None
     day_cost    = 0
 
     for n in range(STEPS_PER_DAY + 1):
-        out = run_marl_simulation_step(
-            n,
-            stations_marl_global,
-            in_transit_marl_global,
-            last_update_marl_global,
-            last_frame_marl_frame,
-            redistribution_in_transit
-        )
+        metrics = run_marl_headless_step(session, n)
         if n == STEPS_PER_DAY:
-            day_summary = out[4]
+            day_summary = metrics[session.dates[0]]["summary"]
 
             # — Compute total_missed from final stations — 
-            sim_date       = list(stations_marl_global.keys())[0]
-            final_stations = stations_marl_global[sim_date]
+            sim_date       = list(session.stations_marl.keys())[0]
+            final_stations = session.stations_marl[sim_date]
             total_missed   = sum(s.get("missed_trips", 0) for s in final_stations.values())
             
             # global zero-miss bonus
-            for sid, data in final_stations.items():   # ← use final_stations instead of stations
-                if data.get("missed_trips", 0) == 0:
-                    station_agents[sid].agent.store_transition(
-                        station_agents[sid].last_state,
-                        station_agents[sid].last_action,
-                        20.0,                # per‐station zero‐miss bonus
-                        station_agents[sid].last_state,
-                        True
-                    )
-            # parse the cost directly from your global tracker, e.g.:
-            day_cost = rebalancing_cost_global["2022-05-05"]
-
-    return day_summary, day_cost
\ No newline at end of file
+            no_miss = final_stations.missed_trips == 0   # ← use final_stations instead of stations
+            with agent_lock:
+                shared_agent.store_transitions(
+                    session.station_agents.last_states[no_miss],
+                    session.station_agents.last_actions[no_miss],
+                    20.0,                # per‐station zero‐miss bonus
+                    session.station_agents.last_states[no_miss],
+                    True
+                )
+            # parse the cost directly from the session's tracker
+            day_cost = round(session.rebalancing_cost[session.dates[0]], 1)
+
+    return day_summary, day_cost
+
+def simulate_dates(dates, session=None, resume=False):
+    """
+    One training day per calendar date in `dates` (e.g. trip_stream.date_range(...) over
+    TRIP_SOURCE), each simulated on its own; yields (date, summary_text, cost).
+    With `resume`, reload the agent checkpoint and (carry-over mode) the saved fleet,
+    and skip the dates that were already simulated.
+    """
+    load()
+    session = session or new_session("dates")
+    if resume:
+        with agent_lock:
+            shared_agent.load(CKPT_PATH)
+        fleet = load_fleet(FLEET_CKPT_PATH) if session.carry_over else {}
+        if fleet:
+            done    = max(state.date for state in fleet.values())
+            dates   = [date for date in dates if date > done]
+            session.fleet = {0: fleet[max(fleet)]}  # one date per day here: the last slot carries on
+            print(f"▶️ Resuming after {done} with {fleet[max(fleet)].total_bikes()} bikes")
+    for date in dates:
+        session.dates = [date]
+        yield (date, *simulate_one_day(session))
+
+
+def __getattr__(name):
+    """ Load the lazily built globals (station_df, shared_agent, default_session, ...) on first access. """
+    if name in DATA_NAMES:
+        load_data()
+    elif name in AGENT_NAMES:
+        load_agent()
+    elif name == "default_session":
+        load()
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return globals()[name]
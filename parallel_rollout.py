@@ -0,0 +1,97 @@
+import os
+import random
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import torch
+
+# Parallel day rollouts for simulate_days.py:
+#  - every worker process runs whole simulated days (both SIM_DATES) headless with a
+#    read-only copy of the policy weights; it keeps its transitions instead of learning
+#  - the parent process is the central learner: it owns marl_simulation.shared_agent,
+#    stores each day's transitions, replays the DQN updates the day would have run
+#    online, checkpoints, and ships the new weights with the next round of days
+# Days of one round all act with the same weights, so the policy is up to `workers`
+# days behind the serial run; within a day the worker policy does not change.
+# Carry-over mode is serial only: days run out of order on different workers.
+# Spawned workers re-import marl_simulation, so they are handed the parent's
+# marl_simulation.settings() (every SETTINGS knob) before their first day.
+
+_session = None  # this worker's SimulationSession
+
+def _init_worker(settings):
+    """ Runs once per worker process: the parent's settings, one torch thread each, learning and file output off. """
+    global _session
+    torch.set_num_threads(1)
+    import marl_simulation as sim
+    for name, value in settings.items():
+        setattr(sim, name, value)
+    sim.ONLINE_LEARNING = False
+    _session = sim.new_session(write_outputs=False)
+
+def rollout_day(q_net_state, epsilon, seed):
+    """
+    Simulate one day with the given policy weights; returns the day's transitions and metrics:
+    {"summary", "cost", "score", "n_updates", "transitions": (states, actions, rewards, next_states, dones)}
+    """
+    import marl_simulation as sim
+    from dqn_agent import ReplayBuffer
+
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    agent = sim.shared_agent
+    agent.q_network.load_state_dict(q_net_state)
+    agent.epsilon = epsilon
+    # fresh buffer per day: everything in it is this day's experience
+    agent.replay_buffer = ReplayBuffer(agent.replay_buffer.capacity, agent.state_dim)
+    sim.deferred_updates = 0
+
+    summary_text, day_cost = sim.simulate_one_day(_session)
+    return {
+        "summary":     summary_text,
+        "cost":        day_cost,
+        "score":       sim.day_completion_rate(_session),
+        "n_updates":   sim.deferred_updates,
+        "transitions": agent.replay_buffer.contents(),
+    }
+
+def learn_from_rollout(agent, checkpointer, result):
+    """ Central learner step: store a worker's transitions, run its deferred updates, checkpoint the day. """
+    agent.store_transitions(*result["transitions"])
+    for _ in range(result["n_updates"]):
+        agent.update()
+        checkpointer.on_update()
+    checkpointer.on_day_end(score=result["score"])
+
+def train_parallel(days, workers=None, seed=0):
+    """
+    Run `days` simulated days on a process pool, learning centrally.
+    Yields (summary_text, day_cost) per day in day order, like simulate_one_day().
+    """
+    import marl_simulation as sim
+    if sim.CARRY_OVER:
+        # each worker runs whichever days it is handed: there is no previous day to carry from
+        raise ValueError("CARRY_OVER needs the serial day loop: set WORKERS = 1 (or CARRY_OVER = False)")
+    agent   = sim.shared_agent
+    workers = workers or os.cpu_count()
+
+    # spawn: workers start clean instead of inheriting torch/checkpoint threads
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(sim.settings(),)) as pool:
+        day = 0
+        while day < days:
+            batch   = min(workers, days - day)
+            weights = {k: v.detach().cpu() for k, v in agent.q_network.state_dict().items()}
+            agent.epsilon = max(agent.epsilon, 0.2)  # same exploration floor simulate_one_day applies
+            futures = [pool.submit(rollout_day, weights, agent.epsilon, seed + day + i) for i in range(batch)]
+
+            for future in futures:
+                result = future.result()
+                learn_from_rollout(agent, sim.checkpointer, result)
+                yield result["summary"], result["cost"]
+            day += batch
+
+    sim.checkpointer.flush()
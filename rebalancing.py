@@ -0,0 +1,162 @@
+import time
+import numpy as np
+
+# Night-time (equal-spread) rebalancing planner.
+#
+# Every station above the network mean gives its surplus, every station below it
+# receives its shortfall, and bikes travel as little as possible: a transportation
+# problem, solved with the least-cost rule (cheapest donor -> receiver pair first).
+# Each donor only considers its `k` nearest receivers (a StationTree query), so the
+# candidate list is O(donors × k) instead of every pair; if that leaves demand unmet,
+# the search widens (k doubles) over what is left. The greedy plan is then improved
+# by cancelling negative cycles over the same candidate pairs (swapping which donor
+# serves which receiver whenever that shortens the total distance) until none is left
+# or IMPROVE_BUDGET_S runs out: with every pair a candidate, the plan is optimal.
+# Rows are station rows (station_index).
+
+EARTH_RADIUS_KM = 6371.0
+CANDIDATES_PER_DONOR = 8
+IMPROVE_BUDGET_S = 0.5  # seconds spent shortening the greedy plan
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """ Great-circle distance in km; broadcasts over NumPy arrays. """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def nearest_pairs(donors, receivers, tree, k):
+    """ (donor, receiver, km) arrays: each donor row with its k nearest receiver rows. """
+    receiver_mask = np.zeros(len(tree), dtype=bool)
+    receiver_mask[receivers] = True
+    rows, km = tree.query_many(tree.lats[donors], tree.lons[donors], k, mask=receiver_mask)
+    return np.repeat(donors, rows.shape[1]), rows.ravel(), km.ravel()
+
+def plan_transport(supply, demand, tree, k=CANDIDATES_PER_DONOR, budget_s=IMPROVE_BUDGET_S):
+    """
+    Moves [(from_row, to_row, qty, km), ...] covering `demand` (bikes needed per row)
+    from `supply` (bikes spare per row), shortest pairs first.
+    Demand beyond the total supply stays unmet.
+    """
+    supply = np.asarray(supply, dtype=np.int64)
+    demand = np.asarray(demand, dtype=np.int64)
+    spare, unmet = supply.copy(), demand.copy()
+    pairs = {}  # (donor, receiver) -> km, every candidate pair looked at
+    moves = []
+    while True:
+        donors    = np.flatnonzero(spare > 0)
+        receivers = np.flatnonzero(unmet > 0)
+        if not len(donors) or not len(receivers):
+            break
+
+        pair_d, pair_r, pair_km = nearest_pairs(donors, receivers, tree, k)
+        pairs.update(zip(zip(pair_d.tolist(), pair_r.tolist()), pair_km.tolist()))
+        for p in np.argsort(pair_km, kind="stable").tolist():
+            d, r = pair_d[p], pair_r[p]
+            qty = min(spare[d], unmet[r])
+            if qty <= 0:
+                continue
+            moves.append((int(d), int(r), int(qty), float(pair_km[p])))
+            spare[d] -= qty
+            unmet[r] -= qty
+
+        if k >= len(receivers):
+            break  # every pair was a candidate: nothing left to match
+        k *= 2
+    return improve_moves(moves, supply, demand, pairs, budget_s)
+
+def improve_moves(moves, supply, demand, pairs, budget_s=IMPROVE_BUDGET_S):
+    """
+    `moves` with the same bikes sent and received per row but a shorter total distance,
+    using only the `pairs` ({(donor, receiver): km}) as routes. Cancels negative cycles
+    of the residual graph (Bellman-Ford) until there are none, or after `budget_s`.
+    """
+    if len(moves) < 2:
+        return moves
+    stop_at = time.perf_counter() + budget_s
+    keys = list(pairs)
+    pair_d  = np.array([d for d, _ in keys])
+    pair_r  = np.array([r for _, r in keys])
+    pair_km = np.array([pairs[key] for key in keys])
+    flow = np.zeros(len(keys), dtype=np.int64)
+    index = {key: p for p, key in enumerate(keys)}
+    for d, r, qty, _ in moves:
+        flow[index[(d, r)]] += qty
+    n = len(supply)
+    source, sink = n, n + 1  # "spare supply" and "unmet demand" nodes
+
+    while time.perf_counter() < stop_at:
+        sent     = np.bincount(pair_d, weights=flow, minlength=n).astype(np.int64)
+        received = np.bincount(pair_r, weights=flow, minlength=n).astype(np.int64)
+        used  = np.flatnonzero(flow > 0)
+        spare = np.flatnonzero(sent < supply)
+        shed  = np.flatnonzero(sent > 0)
+        unmet = np.flatnonzero(received < demand)
+        taken = np.flatnonzero(received > 0)
+        # residual edges: one more bike on a pair, one less on a used pair,
+        # a donor sending one more / one less, a receiver getting one more / one less
+        u    = np.concatenate([pair_d, pair_r[used], np.full(len(spare), source), shed,
+                               unmet, np.full(len(taken), sink)])
+        v    = np.concatenate([pair_r, pair_d[used], spare, np.full(len(shed), source),
+                               np.full(len(unmet), sink), taken])
+        slack = len(u) - len(keys) - len(used)
+        cost = np.concatenate([pair_km, -pair_km[used], np.zeros(slack)])
+        cap  = np.concatenate([np.full(len(keys), np.iinfo(np.int64).max), flow[used],
+                               supply[spare] - sent[spare], sent[shed],
+                               demand[unmet] - received[unmet], received[taken]])
+        pair = np.concatenate([np.arange(len(keys)), used, np.full(slack, -1)])  # pair an edge changes
+        step = np.concatenate([np.ones(len(keys)), -np.ones(len(used)), np.zeros(slack)]).astype(np.int64)
+
+        cycle = _negative_cycle(u, v, cost, n + 2)
+        if cycle is None:
+            break  # optimal over the candidate pairs
+        qty = int(cap[cycle].min())
+        on_pairs = cycle[pair[cycle] >= 0]
+        np.add.at(flow, pair[on_pairs], qty * step[on_pairs])
+
+    used = np.flatnonzero(flow > 0)
+    return [(int(pair_d[p]), int(pair_r[p]), int(flow[p]), float(pair_km[p]))
+            for p in used[np.argsort(pair_km[used], kind="stable")]]
+
+def plan_equal_spread(counts, tree, k=CANDIDATES_PER_DONOR):
+    """ Moves bringing every station to the network mean (rounded down): see plan_transport. """
+    counts = np.asarray(counts, dtype=np.int64)
+    avg = counts.sum() // len(counts)
+    return plan_transport(np.maximum(counts - avg, 0), np.maximum(avg - counts, 0), tree, k)
+
+def _negative_cycle(u, v, cost, n_nodes, eps=1e-9):
+    """ Edge indices of a negative-cost cycle of the graph (u -> v, cost), or None. """
+    dist = np.zeros(n_nodes)  # as if a zero-cost edge led to every node
+    pred = np.full(n_nodes, -1)
+    for _ in range(n_nodes):
+        reach  = dist[u] + cost
+        better = np.flatnonzero(reach < dist[v] - eps)
+        if not len(better):
+            return None
+        better = better[np.argsort(-reach[better], kind="stable")]  # cheapest edge into a node assigned last
+        dist[v[better]] = reach[better]
+        pred[v[better]] = better
+        # a cycle among the predecessor edges is a negative one (checked from every updated node
+        # once the rounds get quiet, from the last one before that)
+        starts = np.unique(v[better]) if len(better) <= 64 else v[better[-1:]]
+        for start in starts.tolist():
+            cycle = _pred_cycle(start, u, pred)
+            if cycle is not None and cost[cycle].sum() < -eps:
+                return cycle
+    return None
+
+def _pred_cycle(start, u, pred):
+    """ The cycle reached by following predecessor edges back from `start`, or None. """
+    seen, node = {}, start
+    while node not in seen:
+        edge = pred[node]
+        if edge < 0:
+            return None
+        seen[node] = edge
+        node = u[edge]
+    cycle, at = [], node
+    while True:
+        cycle.append(seen[at])
+        at = u[seen[at]]
+        if at == node:
+            return np.array(cycle[::-1])
@@ -1,7 +1,10 @@
 # simulate_days.py
 
 import re
-from marl_simulation import simulate_one_day
+import marl_simulation
+from marl_simulation import simulate_one_day, simulate_dates
+from trip_stream import date_range
+from parallel_rollout import train_parallel
 from dqn_agent import DQNAgent
 
 
@@ -14,19 +17,35 @@ def parse_summary(summary_text):
 
 if __name__ == "__main__":
     DAYS = 100
+    WORKERS = 1  # > 1: roll days out on a process pool, learn centrally (parallel_rollout.py)
+    TRIP_SOURCE = None  # e.g. "datasets/all_trips_2022.csv": one big trip file, streamed by day
+    DATE_RANGE  = None  # e.g. ("2022-05-01", "2022-05-31"): one day per date instead of DAYS × SIM_DATES
+    CARRY_OVER  = False # bikes, riders and trucks roll into the next day (fleet saved per day boundary)
+    RESUME      = False # DATE_RANGE only: continue from the last checkpointed agent / fleet
+    TRUCKS      = None  # e.g. 8: a fleet of 8 trucks routes the moves (truck_fleet.py); None = one truck per move
     
     # 1) Instantiate the shared DQN agent once
     shared_agent = DQNAgent(state_dim=8, action_dim=7)
     # 2) Load the pretrained weights & epsilon
     shared_agent.load('./checkpoints/dqn_agent.pth')
 
-    print("Day |  Comp | Miss | Rate (%) | Avail (%) | Cost")
-    print("-------------------------------------------------")
+    print("Day |  Comp | Miss | Rate (%) | Avail (%) |    Cost")
+    print("---------------------------------------------------")
 
     prev_c = prev_m = prev_cost = 0
-    for day in range(1, DAYS+1):
-        summary_text, day_cost = simulate_one_day()
+    marl_simulation.TRIP_SOURCE = TRIP_SOURCE
+    marl_simulation.CARRY_OVER  = CARRY_OVER
+    marl_simulation.TRUCK_FLEET_SIZE = TRUCKS
+    if DATE_RANGE:
+        days = ((summary_text, day_cost)
+                for _, summary_text, day_cost in simulate_dates(date_range(*DATE_RANGE), resume=RESUME))
+    elif WORKERS > 1:
+        days = train_parallel(DAYS, workers=WORKERS)
+    else:
+        days = (simulate_one_day() for _ in range(DAYS))
+
+    for day, (summary_text, day_cost) in enumerate(days, start=1):
         comp, missed, rate, avail = parse_summary(summary_text)
 
         # now comp, missed and day_cost are already "per-day"
-        print(f"{day:3d} | {comp:5d} | {missed:4d} | {rate:8.2f} | {avail:9.2f} | {day_cost:5d}")
\ No newline at end of file
+        print(f"{day:3d} | {comp:5d} | {missed:4d} | {rate:8.2f} | {avail:9.2f} | {day_cost:7.1f}")
\ No newline at end of file
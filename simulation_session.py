@@ -0,0 +1,116 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict, defaultdict
+from step_profiler import NULL_PROFILER
+
+# One SimulationSession per run (browser tab, headless day loop, sweep scenario).
+# The engines in app.py and marl_simulation.py keep every piece of per-run state on
+# the session they are handed instead of in module globals, so several runs can
+# share one process. Only the DQN agent is shared between sessions on purpose.
+# Headless runs keep the plain output filenames the notebooks read; sessions created
+# with suffix_outputs (extra browser tabs) write their own copies (output_path), so
+# concurrent runs never truncate or interleave each other's CSVs.
+
+class SimulationSession:
+    """
+    Mutable state of one simulation run, for both dashboards:
+    per-date dicts keyed by date string ("2022-05-05", ...).
+    """
+    def __init__(self, session_id=None, write_outputs=True, dates=(), carry_over=False, suffix_outputs=False):
+        self.session_id    = session_id or uuid.uuid4().hex
+        self.write_outputs = write_outputs   # CSV/trip-event output; off for sweeps and rollout workers
+        self.suffix_outputs = suffix_outputs  # output files suffixed with the session id (extra Dash tabs)
+        self.dates         = list(dates)     # MARL dates simulated side by side, each with its own map
+        self.carry_over    = carry_over      # start each MARL day from the previous day's fleet
+        self.lock          = threading.RLock()  # callbacks of one session run one at a time
+        self.last_seen     = time.monotonic()
+
+        # —— basic simulation (app.py) ——
+        self.stations         = {}  # date -> {station_id: {...}}
+        self.in_transit_bikes = {}  # date -> TransitQueue of rider returns
+        self.last_update_time = {}  # date -> last simulation time processed
+        self.last_frame       = {}  # date -> last Dash frame (n) processed
+
+        # —— MARL simulation (marl_simulation.py) ——
+        self.stations_marl    = {}  # date -> StationState
+        self.in_transit_marl  = {}  # date -> TransitQueue, plus trip cursors / truck queues
+        self.last_update_marl = {}
+        self.last_frame_marl  = {}
+        self.rebalancing_cost = defaultdict(int)
+        self.moved_3_4        = defaultdict(int)
+        self.moved_12_13      = defaultdict(int)
+        self.truck_km         = defaultdict(float)  # date -> redistribution truck kilometres
+        self.station_agents   = None  # StationAgentGroup: last states/actions of this run
+        self.trip_event_sink  = None  # TripEventSink for this run's missed/completed trips
+        self.fleet            = {}    # slot in dates -> FleetState the next day starts from (carry-over mode)
+        self.profiler         = NULL_PROFILER  # StepProfiler when MARL_PROFILE is set (step_profiler.py)
+        self.map_patchers     = {}    # Dash map id -> MapPatcher: the frame that map was sent last
+
+    def output_path(self, path):
+        """ `path` with this session's id before the extension (datasets/x.csv -> datasets/x_<id>.csv) if suffix_outputs. """
+        if not self.suffix_outputs:
+            return path
+        root, ext = os.path.splitext(path)
+        return f"{root}_{self.session_id}{ext}"
+
+    def reset_marl(self):
+        """ Forget the MARL day in progress (the shared DQN agent and the carried fleet are left intact). """
+        self.stations_marl.clear()
+        self.in_transit_marl.clear()
+        self.last_update_marl.clear()
+        self.last_frame_marl.clear()
+        self.rebalancing_cost.clear()
+        self.moved_3_4.clear()
+        self.moved_12_13.clear()
+        self.truck_km.clear()
+
+
+class SessionRegistry:
+    """
+    Sessions keyed by session id, created on first use by `factory(session_id)`.
+    Sessions idle for `idle_timeout` seconds, or beyond `max_sessions`
+    (least recently used first), are dropped.
+    """
+    def __init__(self, factory=SimulationSession, max_sessions=32, idle_timeout=30 * 60):
+        self.factory      = factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions    = OrderedDict()
+        self._lock        = threading.Lock()  # guards the registry dict only, never a simulation step
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                return self._touch(session_id, session)
+        # the factory may load the datasets and the agent: never under the registry lock
+        created = self.factory(session_id)
+        with self._lock:
+            # another callback of the same tab may have created it meanwhile: keep the first
+            return self._touch(session_id, self._sessions.get(session_id, created))
+
+    def _touch(self, session_id, session):
+        now = time.monotonic()
+        session.last_seen = now
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)  # most recently used last
+        self._evict(now)
+        return session
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict(self, now):
+        for sid in [sid for sid, s in self._sessions.items() if now - s.last_seen > self.idle_timeout]:
+            del self._sessions[sid]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
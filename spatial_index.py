@@ -0,0 +1,162 @@
+import heapq
+import numpy as np
+
+# KD-tree over the station coordinates, for "which stations are near this one" queries
+# (DQN partner selection, the rebalancing planner).
+#
+# Stations are stored as 3D unit vectors, so straight-line (chord) distance orders
+# them exactly like great-circle distance, with no longitude scaling; distances
+# handed back are great-circle km. Rows are the rows the tree was built from
+# (station_index order in marl_simulation). A boolean `mask` over rows restricts
+# a query to some stations (e.g. only the receivers).
+#
+#   tree = StationTree(station_lats, station_lons)
+#   rows, km = tree.query(40.4168, -3.7038, k=3)            # 3 nearest to Puerta del Sol
+#   rows, km = tree.query_radius(40.4168, -3.7038, 0.5)     # everything within 500 m
+#   rows, km = tree.query_many(lats, lons, k=3, mask=receivers)
+
+EARTH_RADIUS_KM = 6371.0
+LEAF_SIZE       = 16
+BRUTE_FORCE_PAIRS = 32_000_000  # query_many: up to this many (point, candidate) pairs, compare all at once
+PAIRS_PER_BLOCK   = 1 << 20     # brute-force distances computed per block (bounds memory)
+
+def to_unit_vectors(lats, lons):
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / 2, 1.0))
+
+def km_to_chord(km):
+    return 2 * np.sin(np.minimum(np.asarray(km) / (2 * EARTH_RADIUS_KM), np.pi / 2))
+
+
+class StationTree:
+    """
+    Static KD-tree with bounding boxes per node: k-nearest and radius queries
+    visit O(log n) nodes instead of scanning every station.
+    """
+    def __init__(self, lats, lons, leaf_size=LEAF_SIZE):
+        self.lats   = np.asarray(lats, dtype=float)
+        self.lons   = np.asarray(lons, dtype=float)
+        self.points = to_unit_vectors(self.lats, self.lons)
+        self.order  = np.arange(len(self.points))  # rows, permuted so every node is a contiguous slice
+
+        lo, hi, start, end, left, right = [], [], [], [], [], []
+        def build(first, last):
+            node = len(start)
+            pts = self.points[self.order[first:last]]
+            lo.append(pts.min(axis=0))
+            hi.append(pts.max(axis=0))
+            start.append(first)
+            end.append(last)
+            left.append(-1)
+            right.append(-1)
+            if last - first > leaf_size:
+                # split the widest dimension at its median
+                dim = int(np.argmax(hi[node] - lo[node]))
+                mid = (last - first) // 2
+                self.order[first:last] = self.order[first:last][np.argpartition(pts[:, dim], mid)]
+                left[node]  = build(first, first + mid)
+                right[node] = build(first + mid, last)
+            return node
+
+        if len(self.points):
+            build(0, len(self.points))
+        self._lo, self._hi = np.array(lo).reshape(-1, 3), np.array(hi).reshape(-1, 3)
+        self._start, self._end = start, end
+        self._left, self._right = left, right
+
+    def __len__(self):
+        return len(self.points)
+
+    def _box_dist2(self, node, q):
+        """ Squared distance from q to the node's bounding box (0 inside it). """
+        gap = np.maximum(self._lo[node] - q, 0) + np.maximum(q - self._hi[node], 0)
+        return float(gap @ gap)
+
+    def _leaf_rows(self, node, mask):
+        rows = self.order[self._start[node]:self._end[node]]
+        return rows if mask is None else rows[mask[rows]]
+
+    def query(self, lat, lon, k, mask=None):
+        """ (rows, km) of the k nearest stations to (lat, lon), nearest first. """
+        q = to_unit_vectors([lat], [lon])[0]
+        best_rows = np.empty(0, dtype=np.int64)
+        best_d2   = np.empty(0)
+        heap = [(0.0, 0)] if len(self) and k > 0 else []
+        while heap:
+            d2, node = heapq.heappop(heap)
+            if len(best_d2) == k and d2 > best_d2[-1]:
+                break  # every box left is farther than the k-th best
+            if self._left[node] < 0:
+                rows = self._leaf_rows(node, mask)
+                if not len(rows):
+                    continue
+                diff = self.points[rows] - q
+                best_rows = np.concatenate([best_rows, rows])
+                best_d2   = np.concatenate([best_d2, np.einsum("ij,ij->i", diff, diff)])
+                keep = np.argsort(best_d2, kind="stable")[:k]
+                best_rows, best_d2 = best_rows[keep], best_d2[keep]
+            else:
+                for child in (self._left[node], self._right[node]):
+                    heapq.heappush(heap, (self._box_dist2(child, q), child))
+        return best_rows, chord_to_km(np.sqrt(best_d2))
+
+    def query_radius(self, lat, lon, radius_km, mask=None):
+        """ (rows, km) of every station within `radius_km` of (lat, lon), nearest first. """
+        q  = to_unit_vectors([lat], [lon])[0]
+        r2 = float(km_to_chord(radius_km)) ** 2
+        found_rows, found_d2 = [], []
+        stack = [0] if len(self) else []
+        while stack:
+            node = stack.pop()
+            if self._box_dist2(node, q) > r2:
+                continue
+            if self._left[node] < 0:
+                rows = self._leaf_rows(node, mask)
+                diff = self.points[rows] - q
+                d2   = np.einsum("ij,ij->i", diff, diff)
+                found_rows.append(rows[d2 <= r2])
+                found_d2.append(d2[d2 <= r2])
+            else:
+                stack.extend((self._left[node], self._right[node]))
+        if not found_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        rows, d2 = np.concatenate(found_rows), np.concatenate(found_d2)
+        order = np.argsort(d2, kind="stable")
+        return rows[order], chord_to_km(np.sqrt(d2[order]))
+
+    def query_many(self, lats, lons, k, mask=None):
+        """
+        k nearest stations for every (lat, lon): (rows, km) arrays of shape (m, k'),
+        k' = min(k, number of candidate stations), nearest first in each row.
+        Up to BRUTE_FORCE_PAIRS point/candidate pairs are compared all at once (vectorized,
+        in blocks); beyond that each point goes through the tree.
+        """
+        candidates = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        k = min(k, len(candidates))
+        m = len(lats)
+        rows = np.full((m, k), -1, dtype=np.int64)
+        km   = np.full((m, k), np.inf)
+        if k == 0:
+            return rows, km
+
+        if m * len(candidates) <= BRUTE_FORCE_PAIRS:
+            q = to_unit_vectors(lats, lons)
+            targets = self.points[candidates]
+            block = max(1, PAIRS_PER_BLOCK // len(candidates))
+            for first in range(0, m, block):
+                # pick with |a - b|^2 = 2 - 2 a·b (unit vectors), then measure the k picked exactly
+                points  = q[first:first + block]
+                nearest = np.argpartition(-(points @ targets.T), k - 1, axis=1)[:, :k]
+                diff    = targets[nearest] - points[:, None, :]
+                near_d2 = np.einsum("ijk,ijk->ij", diff, diff)
+                order   = np.argsort(near_d2, axis=1, kind="stable")
+                rows[first:first + block] = candidates[np.take_along_axis(nearest, order, axis=1)]
+                km[first:first + block]   = chord_to_km(np.sqrt(np.take_along_axis(near_d2, order, axis=1)))
+        else:
+            for i, (lat, lon) in enumerate(zip(lats, lons)):
+                rows[i], km[i] = self.query(lat, lon, k, mask)
+        return rows, km
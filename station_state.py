@@ -0,0 +1,95 @@
+from collections.abc import Mapping, MutableMapping
+import numpy as np
+
+# Every per-station field the MARL simulation tracks, with its array dtype
+STATION_COLUMNS = {
+    "bike_count":          np.int64,
+    "completed_trips":     np.int64,
+    "missed_trips":        np.int64,
+    "was_empty":           np.int64,
+    "was_full":            np.int64,
+    "availability_sum":    np.float64,
+    "sent_bikes":          np.int64,
+    "received_bikes":      np.int64,
+    "overflow_attempts":   np.int64,
+    "early_sent_glow":     np.int64,
+    "early_received_glow": np.int64,
+    "just_missed":         np.bool_,
+    "previous_action":     object,
+}
+
+
+class StationState(Mapping):
+    """
+    Columnar station state: one contiguous NumPy array per field, indexed
+    through a station_id -> int mapping.
+
+    Per-frame bookkeeping works on whole columns (`state.bike_count == 0`),
+    while `state[sid]["bike_count"]` still behaves like the old dict-of-dicts
+    so map drawing and CSV export keep working.
+    """
+    def __init__(self, station_ids, bike_counts=None):
+        station_ids = [str(sid) for sid in station_ids]
+        n = len(station_ids)
+        columns = {name: np.zeros(n, dtype=dtype) for name, dtype in STATION_COLUMNS.items()}
+        columns["previous_action"][:] = "do_nothing"
+        if bike_counts is not None:
+            columns["bike_count"][:] = bike_counts
+
+        # bypass __setattr__ below
+        self.__dict__["station_ids"] = station_ids
+        self.__dict__["index"]       = {sid: i for i, sid in enumerate(station_ids)}
+        self.__dict__["columns"]     = columns
+
+    # —— column access: state.bike_count, state.was_empty, ... ——
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["columns"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        # keep in-place updates (state.was_empty += mask) inside the same array
+        if name in self.columns:
+            self.columns[name][:] = value
+        else:
+            super().__setattr__(name, value)
+
+    # —— dict-like view: state[sid][field] ——
+    def __getitem__(self, sid):
+        return StationRecord(self, self.index[sid])
+
+    def __contains__(self, sid):
+        return sid in self.index
+
+    def __iter__(self):
+        return iter(self.station_ids)
+
+    def __len__(self):
+        return len(self.station_ids)
+
+
+class StationRecord(MutableMapping):
+    """Row view of one station inside a StationState."""
+    __slots__ = ("_columns", "_i")
+
+    def __init__(self, state: StationState, i: int):
+        self._columns = state.columns
+        self._i       = i
+
+    def __getitem__(self, key):
+        value = self._columns[key][self._i]
+        # hand back plain Python scalars (isinstance(..., int) checks, CSV output)
+        return value.item() if isinstance(value, np.generic) else value
+
+    def __setitem__(self, key, value):
+        self._columns[key][self._i] = value
+
+    def __delitem__(self, key):
+        raise TypeError("station fields cannot be removed")
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
@@ -0,0 +1,170 @@
+import os
+import csv
+import json
+from time import perf_counter
+
+# Per-frame timing of the MARL step, off unless MARL_PROFILE is set:
+#
+#   MARL_PROFILE=1 python app.py                             # -> datasets/profile_marl_<session>.csv
+#   MARL_PROFILE=datasets/profile.json python simulate_days.py  # .json: one record per frame
+#
+# The step calls profiler.lap("trips") after each part of the frame; a lap charges the
+# time since the previous lap (or the frame start) to that phase. Counters are per
+# frame (count) or sampled values (set). Disabled sessions hold NULL_PROFILER, whose
+# hooks do nothing.
+
+PROFILE_ENV        = "MARL_PROFILE"
+DEFAULT_TRACE_PATH = "datasets/profile_marl.csv"
+TICK_BUDGET_S      = 1.0  # the dashboard's dcc.Interval: one frame per second
+
+# Phases in frame order (CSV columns); other lap names still show up in the JSON trace
+PHASES = ["bookkeeping", "trips", "capacity", "returns", "equal_spread", "dqn_actions",
+          "truck_routing", "rewards", "dqn_update", "checkpoint", "day_end", "trip_log", "map"]
+COUNTERS = ["trips_processed", "trips_missed", "returns", "truck_arrivals",
+            "moves_applied", "bikes_moved", "updates", "replay_size", "in_transit"]
+
+
+class NullProfiler:
+    """ Profiling switched off: every hook is a no-op. """
+    enabled = False
+
+    def start_frame(self, date, n, sim_time=None):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+    def flush(self):
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+
+class StepProfiler:
+    """
+    Phase timers and counters per (date, frame), exported as CSV (one row per frame,
+    appended at every flush) or JSON (the whole trace, rewritten at every flush).
+    With path=None the trace stays in memory (benchmark.py reads phase_totals()).
+    """
+    enabled = True
+
+    def __init__(self, path=DEFAULT_TRACE_PATH, budget=TICK_BUDGET_S):
+        self.path   = path
+        self.fmt    = None if path is None else "json" if path.endswith(".json") else "csv"
+        self.budget = budget
+        self._pending = []     # finished frames not written yet
+        self._written = []     # JSON rewrites the whole trace; in-memory traces keep every frame here
+        self._started = False  # output file truncated by the first flush
+        self._frame   = None
+        self._last    = None
+
+    def start_frame(self, date, n, sim_time=None):
+        """ Close the previous frame and start timing frame `n` of `date`. """
+        self._finish()
+        self._last  = perf_counter()
+        self._frame = {"date": date, "frame": n,
+                       "sim_time": sim_time.isoformat() if sim_time is not None else None,
+                       "start": self._last, "phases": {}, "counters": {}}
+
+    def lap(self, phase):
+        """ Charge the time since the previous lap to `phase`. """
+        if self._frame is None:
+            return
+        now = perf_counter()
+        phases = self._frame["phases"]
+        phases[phase] = phases.get(phase, 0.0) + (now - self._last)
+        self._last = now
+
+    def count(self, name, value=1):
+        if self._frame is not None:
+            counters = self._frame["counters"]
+            counters[name] = counters.get(name, 0) + value
+
+    def set(self, name, value):
+        if self._frame is not None:
+            self._frame["counters"][name] = value
+
+    def _finish(self):
+        frame = self._frame
+        if frame is None:
+            return
+        total = self._last - frame.pop("start")
+        updates = frame["counters"].get("updates", 0)
+        frame["total_ms"]    = round(1000 * total, 3)
+        frame["over_budget"] = total > self.budget
+        frame["phases"]      = {phase: round(1000 * seconds, 3) for phase, seconds in frame["phases"].items()}
+        if updates:
+            frame["counters"]["update_latency_ms"] = round(frame["phases"].get("dqn_update", 0.0) / updates, 3)
+        self._pending.append(frame)
+        self._frame = None
+
+    def flush(self):
+        """ Close the current frame and write every finished one. """
+        self._finish()
+        frames = self._pending
+        if not frames:
+            return
+        if self.path is None:
+            self._written.extend(frames)
+            frames.clear()
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self.fmt == "csv":
+            columns = (["date", "frame", "sim_time", "total_ms", "over_budget"]
+                       + [f"{phase}_ms" for phase in PHASES] + COUNTERS + ["update_latency_ms"])
+            with open(self.path, "a" if self._started else "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+                if not self._started:
+                    writer.writeheader()
+                for frame in frames:
+                    writer.writerow({
+                        **{k: frame[k] for k in ("date", "frame", "sim_time", "total_ms", "over_budget")},
+                        **{f"{phase}_ms": frame["phases"].get(phase, 0.0) for phase in PHASES},
+                        **{name: frame["counters"].get(name, "") for name in COUNTERS + ["update_latency_ms"]},
+                    })
+        else:
+            self._written.extend(frames)
+            with open(self.path, "w") as f:
+                json.dump({"budget_ms": 1000 * self.budget, "frames": self._written}, f)
+        self._started = True
+
+        slow = sum(frame["over_budget"] for frame in frames)
+        totals = {}
+        for frame in frames:
+            for phase, ms in frame["phases"].items():
+                totals[phase] = totals.get(phase, 0.0) + ms
+        top = sorted(totals.items(), key=lambda item: -item[1])[:3]
+        print(f"⏱️ {len(frames)} frames profiled to {self.path}: {slow} over the {self.budget:g}s tick budget; "
+              + ", ".join(f"{phase} {ms / 1000:.2f}s" for phase, ms in top))
+        frames.clear()
+
+
+    def phase_totals(self):
+        """ {phase: ms} summed over every frame finished so far (in-memory traces, or not flushed yet). """
+        self._finish()
+        totals = {}
+        for frame in self._written + self._pending:
+            for phase, ms in frame["phases"].items():
+                totals[phase] = totals.get(phase, 0.0) + ms
+        return totals
+
+
+def profiler_from_env(session_id=None):
+    """
+    NULL_PROFILER unless MARL_PROFILE is set ("1" = DEFAULT_TRACE_PATH, otherwise
+    the trace path). Each session writes its own file, suffixed with its id.
+    """
+    value = os.environ.get(PROFILE_ENV, "").strip()
+    if value.lower() in ("", "0", "false", "off"):
+        return NULL_PROFILER
+    path = DEFAULT_TRACE_PATH if value.lower() in ("1", "true", "on") else value
+    if session_id:
+        root, ext = os.path.splitext(path)
+        path = f"{root}_{session_id}{ext}"
+    return StepProfiler(path)
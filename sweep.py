@@ -0,0 +1,135 @@
+import os
+import time
+import random
+import argparse
+import itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+
+# Scenario sweep on top of simulate_one_day: every combination of the grid below
+# trains its own fresh DQN agent for `--days` days in its own worker process and
+# reports one row per (scenario, day, date) into a single results table.
+#
+#   python sweep.py --fill 20 30 40 --days 100
+#   python sweep.py --fill 30 --capacity 30 40 --missed-weight 25 50 --demand-hours 11-12 12-13
+
+RESULTS_PATH    = "datasets/sweep_results.csv"
+SWEEP_CKPT_DIR  = "./checkpoints/sweep"
+SCENARIO_FIELDS = ["initial_fill", "capacity", "missed_weight", "move_weight",
+                   "equal_spread_hours", "demand_hours"]
+
+def hour_window(text):
+    """ "3-4" -> (3, 4): a [start, end) hour window. """
+    start, end = (int(h) for h in text.split("-"))
+    if not 0 <= start < end <= 24:
+        raise argparse.ArgumentTypeError(f"bad hour window '{text}', expected start-end within 0-24")
+    return start, end
+
+def fill_level(text):
+    """ Bikes per station, or "stats" for the final counts in station_stats_2022-05-05.csv. """
+    return None if text == "stats" else int(text)
+
+def scenario_grid(fills, capacities, missed_weights, move_weights, equal_spread_hours, demand_hours):
+    """ Every combination of the sweep axes, as scenario dicts. """
+    return [
+        dict(zip(SCENARIO_FIELDS, values))
+        for values in itertools.product(fills, capacities, missed_weights, move_weights,
+                                        equal_spread_hours, demand_hours)
+    ]
+
+def scenario_name(scenario):
+    fill = "stats" if scenario["initial_fill"] is None else scenario["initial_fill"]
+    return (f"fill{fill}_cap{scenario['capacity']}_miss{scenario['missed_weight']:g}"
+            f"_move{scenario['move_weight']:g}"
+            f"_spread{scenario['equal_spread_hours'][0]}-{scenario['equal_spread_hours'][1]}"
+            f"_demand{scenario['demand_hours'][0]}-{scenario['demand_hours'][1]}")
+
+def apply_scenario(sim, scenario):
+    """ Point marl_simulation's scenario knobs at one grid entry. """
+    sim.INITIAL_FILL           = scenario["initial_fill"]
+    sim.STATION_CAPACITY       = scenario["capacity"]
+    sim.STATIC_MAX_CAPACITY    = scenario["capacity"] + 20
+    sim.MISSED_WEIGHT          = scenario["missed_weight"]
+    sim.MOVE_WEIGHT            = scenario["move_weight"]
+    sim.EQUAL_SPREAD_HOURS     = scenario["equal_spread_hours"]
+    sim.DEMAND_REBALANCE_HOURS = scenario["demand_hours"]
+
+def run_scenario(scenario, days, seed):
+    """ Train a fresh agent on one scenario for `days` days; returns its result rows. """
+    import torch
+    torch.set_num_threads(1)  # one core per scenario, the pool uses the rest
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    # each scenario gets a new process (max_tasks_per_child=1), so this import builds a fresh agent
+    import marl_simulation as sim
+    from checkpointing import CheckpointWriter
+
+    name = scenario_name(scenario)
+    apply_scenario(sim, scenario)
+    session = sim.new_session(name, write_outputs=False)  # the per-day CSVs would clash between workers
+    sim.checkpointer.close()
+    sim.checkpointer = CheckpointWriter(sim.shared_agent, os.path.join(SWEEP_CKPT_DIR, f"{name}.pth"),
+                                        every_n_updates=sim.CKPT_EVERY_N_UPDATES)
+
+    rows = []
+    for day in range(1, days + 1):
+        sim.simulate_one_day(session)
+        for date in session.dates:
+            rows.append({
+                "scenario": name,
+                **scenario,
+                "initial_fill": "stats" if scenario["initial_fill"] is None else scenario["initial_fill"],
+                "equal_spread_hours": "{}-{}".format(*scenario["equal_spread_hours"]),
+                "demand_hours":       "{}-{}".format(*scenario["demand_hours"]),
+                "day": day,
+                **sim.summarize_day(session, date),
+                "epsilon": round(sim.shared_agent.epsilon, 4),
+            })
+    sim.checkpointer.close()
+    return rows
+
+def run_sweep(scenarios, days, workers=None, seed=0, out_path=RESULTS_PATH):
+    """ Run every scenario on a process pool and write one consolidated CSV. """
+    workers = min(workers or os.cpu_count(), len(scenarios))
+    ctx = mp.get_context("spawn")
+    rows = []
+    t0 = time.time()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, max_tasks_per_child=1) as pool:
+        futures = {pool.submit(run_scenario, scenario, days, seed): scenario for scenario in scenarios}
+        for done, future in enumerate(as_completed(futures), start=1):
+            scenario_rows = future.result()
+            rows.extend(scenario_rows)
+            last = scenario_rows[-1]
+            print(f"✅ [{done}/{len(scenarios)}] {last['scenario']} "
+                  f"(day {last['day']}: {last['completion_rate']}% completed, cost {last['rebalancing_cost']}) "
+                  f"— {time.time() - t0:.0f}s")
+
+    results = pd.DataFrame(rows).sort_values(["scenario", "day", "simulated_day"], kind="stable")
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    results.to_csv(out_path, index=False)
+    print(f"📊 {len(results)} rows written to {out_path}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the MARL simulation over a grid of scenarios.")
+    parser.add_argument("--fill", type=fill_level, nargs="+", default=[None],
+                        help='initial bikes per station, or "stats" for station_stats_2022-05-05.csv (default)')
+    parser.add_argument("--capacity", type=int, nargs="+", default=[40], help="STATION_CAPACITY values")
+    parser.add_argument("--missed-weight", type=float, nargs="+", default=[50.0])
+    parser.add_argument("--move-weight", type=float, nargs="+", default=[0.005])
+    parser.add_argument("--equal-spread-hours", type=hour_window, nargs="+", default=[(3, 4)])
+    parser.add_argument("--demand-hours", type=hour_window, nargs="+", default=[(12, 13)])
+    parser.add_argument("--days", type=int, default=1, help="training days per scenario")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: every core)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    scenarios = scenario_grid(args.fill, args.capacity, args.missed_weight, args.move_weight,
+                              args.equal_spread_hours, args.demand_hours)
+    print(f"🔄 {len(scenarios)} scenarios × {args.days} days")
+    run_sweep(scenarios, args.days, workers=args.workers, seed=args.seed, out_path=args.out)
@@ -0,0 +1,54 @@
+import os
+import sys
+import threading
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class RandomStationAgents:
+    """ Stand-in for dqn_agent.StationAgentGroup: random actions, nothing learned (no torch). """
+    def __init__(self, n_stations, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.n_stations = n_stations
+
+    def observe_and_act(self, observations):
+        return self.rng.integers(0, 7, self.n_stations)
+
+    def record(self, rewards, next_observations, done):
+        pass
+
+
+@pytest.fixture
+def sim(monkeypatch):
+    """ marl_simulation on the bundled datasets, with a random policy in place of the DQN agent. """
+    monkeypatch.chdir(ROOT)
+    import marl_simulation as sim
+    sim.load_data()
+    monkeypatch.setattr(sim, "_agent_loaded", True)
+    monkeypatch.setitem(vars(sim), "agent_lock", threading.RLock())
+    monkeypatch.setattr(sim, "ONLINE_LEARNING", False)
+    monkeypatch.setattr(sim, "deferred_updates", 0)
+    return sim
+
+
+@pytest.fixture
+def make_session(sim):
+    """ A session without file output whose stations act at random. """
+    from simulation_session import SimulationSession
+
+    def make(dates=("2022-05-05",), carry_over=False, seed=0):
+        session = SimulationSession("test", write_outputs=False, dates=dates, carry_over=carry_over)
+        session.station_agents = RandomStationAgents(len(sim.station_ids), seed)
+        return session
+    return make
+
+
+def fleet_total(session, date):
+    """ Bikes docked, out with riders and on trucks for one date of a session. """
+    stations = session.stations_marl[date]
+    trucks   = session.in_transit_marl["redistribution_in_transit_list"][date]
+    return (int(stations.bike_count.sum()) + len(session.in_transit_marl[date])
+            + sum(trip["quantity"] for trip in trucks))
@@ -0,0 +1,33 @@
+import os
+import pytest
+import benchmark
+from conftest import ROOT
+
+
+@pytest.fixture(autouse=True)
+def at_root(monkeypatch):
+    monkeypatch.chdir(ROOT)  # dataset and baseline paths are relative to the repo
+
+
+def test_baseline_covers_every_case():
+    baseline = benchmark.load_baseline(benchmark.BASELINE_PATH)
+    for case in benchmark.CASES:
+        assert baseline.get(f"{case}@x1"), f"{case}@x1 missing from {benchmark.BASELINE_PATH}"
+
+
+def test_compare_flags_regressions_in_the_metric_direction():
+    baseline = {"step@x1": {"frames_per_sec": 100.0, "max_frame_ms": 10.0}}
+    slower = [{"case": "step", "scale": 1, "frames_per_sec": 80.0, "max_frame_ms": 10.5}]
+    faster = [{"case": "step", "scale": 1, "frames_per_sec": 120.0, "max_frame_ms": 5.0}]
+
+    assert benchmark.compare(slower, baseline, tolerance=0.15) == [("step@x1", "frames_per_sec", 100.0, 80.0)]
+    assert benchmark.compare(faster, baseline, tolerance=0.15) == []
+    assert faster[0]["vs_baseline"] == {"frames_per_sec": 20.0, "max_frame_ms": -50.0}
+
+
+@pytest.mark.skipif(not os.environ.get("MARL_BENCHMARK"), reason="timing run: set MARL_BENCHMARK=1")
+def test_step_against_baseline():
+    pytest.importorskip("torch")
+    results = benchmark.run_benchmarks(["step"], [1], repeat=1)
+    # loose: the baseline may come from another machine
+    assert benchmark.compare(results, benchmark.load_baseline(benchmark.BASELINE_PATH), tolerance=0.5) == []
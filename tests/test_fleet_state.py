@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from conftest import fleet_total
+from fleet_state import FleetState
+from station_state import StationState
+from transit_queue import TransitQueue
+
+
+def test_carried_times_move_to_the_next_date():
+    stations = StationState(["a", "b"], bike_counts=[3, 4])
+    riders, trucks = TransitQueue(), TransitQueue()
+    riders.append({"end_time": datetime(2022, 5, 6, 0, 20), "end_id": "a"})
+    trucks.append({"from_id": "a", "end_id": "b", "quantity": 5, "end_time": datetime(2022, 5, 6, 1)})
+    state = FleetState.from_dict(FleetState.capture("2022-05-05", stations, riders, trucks).to_dict())
+
+    # replaying the same date, and a later one after a gap
+    for date in ("2022-05-05", "2022-05-11"):
+        _, riders, trucks = state.restore(["a", "b"], date)
+        day = datetime.strptime(date, "%Y-%m-%d")
+        assert [trip["end_time"] for trip in riders] == [day + timedelta(minutes=20)]
+        assert [trip["end_time"] for trip in trucks] == [day + timedelta(hours=1)]
+    assert state.total_bikes() == 3 + 4 + 1 + 5
+
+
+def test_replaying_a_date_keeps_the_fleet(sim, make_session, monkeypatch):
+    monkeypatch.setattr(sim, "TRUCK_FLEET_SIZE", 8)
+    session = make_session(carry_over=True)
+    date = session.dates[0]
+
+    totals = []
+    for _ in range(3):
+        session.reset_marl()
+        for n in range(sim.STEPS_PER_DAY + 1):
+            sim.advance_marl_date(session, n, date)
+        totals.append(fleet_total(session, date))
+        assert session.fleet[0].total_bikes() == totals[-1]
+    assert totals == [totals[0]] * 3
+    # nothing carried is stranded in the past or on trucks for days
+    assert session.stations_marl[date].bike_count.sum() > 0.9 * totals[-1]
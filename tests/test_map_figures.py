@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+from map_figures import MapPatcher, apply_frame, base_map_figure
+
+OVERLAYS = [dict(color="cyan"), dict(color="black")]
+COLORS   = np.array(["red", "orange", "green", "blue"])
+
+
+def apply_patch(figure, patch):
+    """ What the Dash renderer does with a Patch of Assign operations. """
+    for op in patch.to_plotly_json()["operations"]:
+        assert op["operation"] == "Assign"
+        *path, last = op["location"]
+        target = figure
+        for key in path:
+            target = target.setdefault(key, {}) if isinstance(target, dict) else target[key]
+        target[last] = op["params"]["value"]
+
+def random_frame(rng, counts, summary=False):
+    sizes = np.minimum(9 + 0.5 * counts, 15)
+    frame = {
+        "colors":     COLORS[np.minimum(counts // 10, 3)].tolist(),
+        "sizes":      sizes.tolist(),
+        "customdata": [[count, 2.5 * count] for count in counts.tolist()],
+        "overlays": [
+            {"size": np.where(rng.random(len(counts)) < 0.05, 22, 0).tolist()},
+            {"size": np.where(counts == 0, sizes + 5, 0).tolist()},
+        ],
+    }
+    if summary:
+        frame["hovertext"] = [f"station {i}: {count}" for i, count in enumerate(counts.tolist())]
+    return frame
+
+
+def test_patches_rebuild_every_frame():
+    rng = np.random.default_rng(0)
+    stations = pd.DataFrame({"lat": rng.uniform(40.3, 40.5, 60), "lon": rng.uniform(-3.8, -3.6, 60),
+                             "station_name": [f"s{i}" for i in range(60)]})
+    browser = base_map_figure(stations, OVERLAYS, station_opacity=0.8).to_plotly_json()
+    patcher = MapPatcher(keyframe_every=7)
+    counts  = rng.integers(0, 40, 60)
+    for n in range(40):
+        # a few stations change per frame, the whole map now and then
+        changed = rng.random(60) < (0.9 if n % 13 == 5 else 0.1)
+        counts  = np.where(changed, rng.integers(0, 40, 60), counts)
+        frame   = random_frame(rng, counts, summary=n >= 35)
+        patch   = patcher.patch(frame)
+        apply_patch(browser, patch)
+
+        expected = apply_frame(base_map_figure(stations, OVERLAYS, station_opacity=0.8), frame).to_plotly_json()
+        for got, want in zip(browser["data"], expected["data"]):
+            for key in ("customdata", "hovertext", "hovertemplate"):
+                assert list(np.ravel(got.get(key, []))) == list(np.ravel(want.get(key, []))), (n, key)
+            for key in ("color", "size"):
+                assert list(np.ravel(got["marker"].get(key, []))) == list(np.ravel(want["marker"].get(key, []))), (n, key)
+
+    # a quiet frame sends nothing at all
+    assert len(patcher.patch(frame).to_plotly_json()["operations"]) == 0
@@ -0,0 +1,70 @@
+import itertools
+import numpy as np
+import pytest
+from rebalancing import haversine_km, plan_equal_spread, plan_transport
+from spatial_index import StationTree
+
+
+def random_stations(rng, n):
+    """ n stations scattered over ~10 km around Madrid. """
+    return 40.35 + rng.random(n) * 0.1, -3.75 + rng.random(n) * 0.1
+
+def sent_and_received(moves, n):
+    sent, received = np.zeros(n, dtype=int), np.zeros(n, dtype=int)
+    for frm, to, qty, _ in moves:
+        assert qty > 0
+        sent[frm] += qty
+        received[to] += qty
+    return sent, received
+
+def brute_force_km(supply, demand, lats, lons):
+    """ Shortest total distance over every way of pairing the spare bikes with the missing ones. """
+    donors    = [row for row, qty in enumerate(supply) for _ in range(qty)]
+    receivers = [row for row, qty in enumerate(demand) for _ in range(qty)]
+    km = haversine_km(lats[:, None], lons[:, None], lats[None, :], lons[None, :])
+    if len(donors) >= len(receivers):
+        return min(sum(km[d, r] for d, r in zip(order, receivers))
+                   for order in itertools.permutations(donors, len(receivers)))
+    return min(sum(km[d, r] for d, r in zip(donors, order))
+               for order in itertools.permutations(receivers, len(donors)))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_equal_spread_moves_only_surplus_to_need(seed):
+    rng = np.random.default_rng(seed)
+    lats, lons = random_stations(rng, 200)
+    counts = rng.integers(0, 40, 200)
+    moves = plan_equal_spread(counts, StationTree(lats, lons), k=4)
+
+    avg = counts.sum() // len(counts)
+    sent, received = sent_and_received(moves, len(counts))
+    after = counts - sent + received
+    assert after.sum() == counts.sum()                              # no bike created or lost
+    assert np.all(sent <= np.maximum(counts - avg, 0))              # donors give at most their surplus
+    assert np.all(received <= np.maximum(avg - counts, 0))          # receivers get at most their need
+    assert received.sum() == np.maximum(avg - counts, 0).sum()      # and every need is met
+    for frm, to, _, km in moves:
+        assert km == pytest.approx(haversine_km(lats[frm], lons[frm], lats[to], lons[to]))
+
+
+def test_transport_leaves_demand_beyond_supply_unmet():
+    rng = np.random.default_rng(7)
+    lats, lons = random_stations(rng, 50)
+    supply = np.where(np.arange(50) < 10, 2, 0)
+    demand = np.where(np.arange(50) >= 10, 3, 0)
+    sent, received = sent_and_received(plan_transport(supply, demand, StationTree(lats, lons)), 50)
+    assert np.array_equal(sent, supply)
+    assert np.all(received <= demand) and received.sum() == supply.sum()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_plan_is_as_short_as_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    lats, lons = random_stations(rng, 7)
+    donor  = rng.random(7) < 0.5
+    supply = np.where(donor, rng.integers(0, 3, 7), 0)
+    demand = np.where(donor, 0, rng.integers(0, 3, 7))
+    moves = plan_transport(supply, demand, StationTree(lats, lons))  # k >= receivers: every pair a candidate
+
+    total_km = sum(qty * km for _, _, qty, km in moves)
+    assert total_km <= brute_force_km(supply, demand, lats, lons) + 1e-9
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from rebalancing import haversine_km
+from spatial_index import StationTree
+
+
+def brute_force(lats, lons, lat, lon, mask=None):
+    """ (rows, km) of every station, nearest first, by haversine. """
+    km = haversine_km(lats, lons, lat, lon)
+    rows = np.arange(len(lats)) if mask is None else np.flatnonzero(mask)
+    rows = rows[np.argsort(km[rows], kind="stable")]
+    return rows, km[rows]
+
+def random_points(rng, n, lat_range, lon_range):
+    return rng.uniform(*lat_range, n), rng.uniform(*lon_range, n)
+
+
+# (latitudes, longitudes) of the stations and the query points
+REGIONS = {
+    "madrid":      ((40.3, 40.5), (-3.8, -3.6)),
+    "antimeridian": ((-20.0, -15.0), (177.0, 180.0)),   # stations on both sides of ±180°
+    "north_pole":  ((88.0, 90.0), (-180.0, 180.0)),
+    "south_pole":  ((-90.0, -87.0), (-180.0, 180.0)),
+    "world":       ((-90.0, 90.0), (-180.0, 180.0)),
+}
+
+def region_points(rng, region, n):
+    lat_range, lon_range = REGIONS[region]
+    lats, lons = random_points(rng, n, lat_range, lon_range)
+    if region == "antimeridian":
+        lons = np.where(rng.random(n) < 0.5, lons, lons - 360.0)  # half of them just west of 180°
+    return lats, lons
+
+
+@pytest.mark.parametrize("region", REGIONS)
+def test_k_nearest_matches_brute_force(region):
+    rng = np.random.default_rng(1)
+    lats, lons = region_points(rng, region, 500)
+    tree = StationTree(lats, lons)
+    mask = rng.random(500) < 0.3
+    for lat, lon in zip(*region_points(rng, region, 25)):
+        for k in (1, 5, 40):
+            rows, km = tree.query(lat, lon, k)
+            expected_rows, expected_km = brute_force(lats, lons, lat, lon)
+            assert km == pytest.approx(expected_km[:k], abs=1e-6)
+            assert set(rows) == set(expected_rows[:k]) or np.isclose(km[-1], expected_km[k])  # ties at the k-th
+
+            rows, km = tree.query(lat, lon, k, mask=mask)
+            assert mask[rows].all()
+            assert km == pytest.approx(brute_force(lats, lons, lat, lon, mask)[1][:k], abs=1e-6)
+
+        _, many_km = tree.query_many([lat], [lon], 5, mask=mask)
+        assert many_km[0] == pytest.approx(brute_force(lats, lons, lat, lon, mask)[1][:5], abs=1e-6)
+
+
+@pytest.mark.parametrize("region", REGIONS)
+def test_radius_matches_brute_force(region):
+    rng = np.random.default_rng(2)
+    lats, lons = region_points(rng, region, 500)
+    tree = StationTree(lats, lons)
+    for lat, lon in zip(*region_points(rng, region, 25)):
+        expected_rows, expected_km = brute_force(lats, lons, lat, lon)
+        for radius_km in (1.0, 50.0, 500.0):
+            rows, km = tree.query_radius(lat, lon, radius_km)
+            inside = expected_km <= radius_km
+            assert set(rows) == set(expected_rows[inside])
+            assert km == pytest.approx(expected_km[inside], abs=1e-6)
+
+
+def test_across_the_antimeridian_and_the_pole():
+    # neighbours that are close on the sphere but far apart in raw lat / lon
+    tree = StationTree([0.0, 0.0, 0.0, 89.9, 89.9], [179.99, -179.99, 170.0, 0.0, 180.0])
+    rows, km = tree.query(0.0, 179.995, 2)
+    assert set(rows) == {0, 1} and km.max() < 2.0
+    rows, km = tree.query_radius(89.9, 0.0, 25.0)
+    assert set(rows) == {3, 4}
+    assert km[1] == pytest.approx(haversine_km(89.9, 0.0, 89.9, 180.0))
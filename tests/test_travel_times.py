@@ -0,0 +1,82 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import dataset_cache
+from rebalancing import haversine_km
+from travel_times import build_matrices, calibrate, load_travel_times
+
+DETOUR, FIXED_MINUTES, MINUTES_PER_KM = 1.4, 3.0, 4.0  # 15 km/h once rolling
+
+
+@pytest.fixture
+def stations(tmp_path):
+    """ 100 stations on a ~10 km grid, written to a stations CSV. """
+    lats, lons = np.meshgrid(40.38 + np.arange(10) * 0.009, -3.74 + np.arange(10) * 0.012)
+    df = pd.DataFrame({"station_id": np.arange(100), "lat": lats.ravel(), "lon": lons.ravel()})
+    path = tmp_path / "stations.csv"
+    df.to_csv(path, index=False)
+    return df, str(path)
+
+def synthetic_trips(stations_df, n=3000, detour=DETOUR, fixed=FIXED_MINUTES, pace=MINUTES_PER_KM, seed=0):
+    """ Trips between random stations riding `detour` × the straight line at a known pace, with some noise. """
+    rng = np.random.default_rng(seed)
+    start, end = rng.integers(0, len(stations_df), n), rng.integers(0, len(stations_df), n)
+    lat, lon = stations_df.lat.to_numpy(), stations_df.lon.to_numpy()
+    road_km = detour * haversine_km(lat[start], lon[start], lat[end], lon[end])
+    return pd.DataFrame({
+        "start_station_id": stations_df.station_id.to_numpy()[start],
+        "end_station_id":   stations_df.station_id.to_numpy()[end],
+        "distance_km":      road_km * rng.normal(1.0, 0.03, n),
+        "trip_minutes":     (fixed + pace * road_km) * rng.normal(1.0, 0.03, n),
+    })
+
+
+def test_matrices_are_symmetric_float32_with_a_zero_diagonal(stations):
+    df, _ = stations
+    matrices = build_matrices(df.lat.to_numpy(), df.lon.to_numpy(), (DETOUR, FIXED_MINUTES, MINUTES_PER_KM))
+    for name in ("km", "minutes"):
+        matrix = matrices[name]
+        assert matrix.dtype == np.float32 and matrix.shape == (100, 100)
+        assert np.allclose(matrix, matrix.T, atol=1e-3)
+        assert not np.diagonal(matrix).any()
+    straight = haversine_km(df.lat[0], df.lon[0], df.lat[99], df.lon[99])
+    assert matrices["km"][0, 99] == pytest.approx(DETOUR * straight, rel=1e-4)
+    assert matrices["minutes"][0, 99] == pytest.approx(FIXED_MINUTES + MINUTES_PER_KM * DETOUR * straight, rel=1e-4)
+
+
+def test_calibration_recovers_the_riding_speed(stations):
+    df, _ = stations
+    detour, fixed, pace = calibrate([synthetic_trips(df)], df.station_id, df.lat.to_numpy(), df.lon.to_numpy())
+    assert detour == pytest.approx(DETOUR, rel=0.02)
+    assert pace == pytest.approx(MINUTES_PER_KM, rel=0.05)
+    assert fixed == pytest.approx(FIXED_MINUTES, abs=0.5)
+
+
+def test_cache_hit_and_rebuild_on_a_changed_trip_file(stations, tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_cache, "CACHE_DIR", str(tmp_path / ".cache"))
+    df, stations_path = stations
+    trips_path = tmp_path / "trips.csv"
+    synthetic_trips(df).to_csv(trips_path, index=False)
+    reads = []
+    def read_trips(path):
+        reads.append(path)
+        return pd.read_csv(path)
+    def load():
+        return load_travel_times(df.station_id, df.lat, df.lon, [str(trips_path)], stations_path, read_trips)
+
+    first = load()
+    again = load()
+    assert len(reads) == 1  # served from the cache, trips not read again
+    assert np.array_equal(again.km_matrix, first.km_matrix)
+    assert np.array_equal(again.minutes_matrix, first.minutes_matrix)
+
+    # slower riders in a regenerated trip file: a new calibration, new matrices
+    synthetic_trips(df, pace=2 * MINUTES_PER_KM, seed=1).to_csv(trips_path, index=False)
+    mtime_ns = os.stat(trips_path).st_mtime_ns + 1_000_000_000  # even if the size and the clock tick match
+    os.utime(trips_path, ns=(mtime_ns, mtime_ns))
+    rebuilt = load()
+    assert len(reads) == 2
+    assert np.allclose(rebuilt.km_matrix, first.km_matrix, rtol=0.01)  # same stations, same detour
+    assert rebuilt.minutes_per_km == pytest.approx(2 * MINUTES_PER_KM, rel=0.05)
+    assert rebuilt.minutes(0, 99) > first.minutes(0, 99)
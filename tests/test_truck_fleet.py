@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+import numpy as np
+from conftest import fleet_total
+from truck_fleet import TruckFleet
+
+
+def test_small_fleet_conserves_bikes(sim, make_session, monkeypatch):
+    monkeypatch.setattr(sim, "TRUCK_FLEET_SIZE", 2)
+    session = make_session()
+    date = session.dates[0]
+
+    sim.advance_marl_date(session, 0, date)
+    start = fleet_total(session, date)
+    for n in range(1, sim.STEPS_PER_DAY + 1):
+        sim.advance_marl_date(session, n, date)
+        assert fleet_total(session, date) == start, f"frame {n}"
+
+    # two trucks can't move everything, but whatever they took was delivered inside the windows
+    assert 0 < session.moved_3_4[date] + session.moved_12_13[date]
+    assert len(session.in_transit_marl["redistribution_in_transit_list"][date]) == 0
+    assert (session.stations_marl[date].bike_count >= 0).all()
+
+
+def test_plan_keeps_capacity_and_deadline(sim):
+    now      = datetime(2022, 5, 5, 3)
+    deadline = now + timedelta(hours=1)
+    fleet = TruckFleet(3, 20, sim.travel_times, depot_row=0)
+    counts = np.random.default_rng(1).integers(0, 60, len(sim.station_ids))
+    from rebalancing import plan_equal_spread
+    moves = [(frm, to, qty) for frm, to, qty, _ in plan_equal_spread(counts, sim.station_tree)]
+
+    deliveries, km = fleet.plan(moves, now, deadline)
+    assert deliveries and km > 0
+    assert all(now < arrival <= deadline for *_, arrival in deliveries)
+    assert all(qty <= 20 for _, _, qty, _ in deliveries)
+    assert sum(qty for _, _, qty, _ in deliveries) < sum(qty for *_, qty in moves)
+    assert all(free <= deadline for free in fleet.free_at if free is not None)
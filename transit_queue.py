@@ -0,0 +1,36 @@
+import heapq
+from itertools import count
+
+
+class TransitQueue:
+    """
+    Min-heap of in-flight bikes keyed on "end_time".
+    Used for both rider trips and redistribution trucks, so draining the
+    arrivals that are due costs O(k log n) instead of a scan of every trip.
+    """
+    def __init__(self):
+        self._heap = []
+        self._seq  = count()  # tie-breaker, keeps insertion order for equal end_times
+
+    def append(self, trip: dict):
+        heapq.heappush(self._heap, (trip["end_time"], next(self._seq), trip))
+
+    def pop_due(self, current_time):
+        """Remove and return every trip whose end_time is <= current_time, earliest first."""
+        due = []
+        while self._heap and self._heap[0][0] <= current_time:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def ordered(self):
+        """Every in-flight trip in arrival order (earliest first), without removing any."""
+        return [entry[2] for entry in sorted(self._heap, key=lambda entry: entry[:2])]
+
+    def clear(self):
+        self._heap.clear()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __iter__(self):
+        return (entry[2] for entry in self._heap)
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import dataset_cache
+from rebalancing import haversine_km
+from spatial_index import to_unit_vectors, chord_to_km
+
+# Station -> station road distance and travel time for redistribution trucks.
+#
+# Road km = straight-line km × a detour factor; minutes = fixed + pace × road km.
+# Both are calibrated on the trip files: the detour from each trip's distance_km
+# against the straight line between its two stations, the time model from the
+# median trip_minutes per distance band (so leisure rides don't skew it).
+# The n × n matrices are float32 and cached in datasets/.cache, memory-mapped on
+# later starts. Networks larger than MAX_MATRIX_STATIONS skip the matrices and
+# compute each pair from the same calibration instead.
+#
+#   travel = load_travel_times(station_ids, lats, lons, ["datasets/all_trips_05_05.csv"],
+#                              "datasets/all_stations.csv", pd.read_csv)
+#   travel.km(3, 17), travel.minutes(3, 17)   # station rows
+
+DEFAULT_CALIBRATION = (1.3, 2.0, 4.0)  # detour, fixed minutes, minutes per km (no usable trip columns)
+MAX_MATRIX_STATIONS = 8000   # 2 × 256 MB of float32 at this size
+ROW_BLOCK           = 1024   # matrix rows computed at a time
+MIN_TRIPS           = 100    # fewer usable trips than this: DEFAULT_CALIBRATION
+
+def calibrate(trip_dfs, station_ids, lats, lons):
+    """ (detour, fixed_minutes, minutes_per_km) fitted on trips with distance_km / trip_minutes. """
+    index = pd.Index([str(sid) for sid in station_ids])
+    starts, ends, kms, minutes = [], [], [], []
+    for df in trip_dfs:
+        if not {"distance_km", "trip_minutes"} <= set(df.columns):
+            continue
+        start = index.get_indexer(df["start_station_id"].astype(str))
+        end   = index.get_indexer(df["end_station_id"].astype(str))
+        keep  = (start >= 0) & (end >= 0) & (start != end)  # no round trips, no unknown stations
+        starts.append(start[keep])
+        ends.append(end[keep])
+        kms.append(df["distance_km"].to_numpy(dtype=float)[keep])
+        minutes.append(df["trip_minutes"].to_numpy(dtype=float)[keep])
+    if not starts:
+        return DEFAULT_CALIBRATION
+
+    start, end = np.concatenate(starts), np.concatenate(ends)
+    km, minutes = np.concatenate(kms), np.concatenate(minutes)
+    straight = haversine_km(lats[start], lons[start], lats[end], lons[end])
+    # plausible rides only: a few hundred metres apart, 1-120 min, under 30 km/h
+    ok = (straight > 0.2) & (km > 0) & (minutes > 1) & (minutes < 120) & (km < 0.5 * minutes)
+    if ok.sum() < MIN_TRIPS:
+        return DEFAULT_CALIBRATION
+
+    detour  = max(float(np.median(km[ok] / straight[ok])), 1.0)
+    road_km = straight[ok] * detour
+    # median minutes per distance band (20 equal-count bands), then a straight line through them
+    edges = np.unique(np.quantile(road_km, np.linspace(0, 1, 21)))
+    band  = np.clip(np.searchsorted(edges, road_km, side="right") - 1, 0, len(edges) - 2)
+    band_km      = [np.median(road_km[band == b]) for b in np.unique(band)]
+    band_minutes = [np.median(minutes[ok][band == b]) for b in np.unique(band)]
+    if len(band_km) < 2:
+        return DEFAULT_CALIBRATION
+    pace, fixed = np.polyfit(band_km, band_minutes, 1)
+    return detour, max(float(fixed), 0.0), max(float(pace), 0.5)
+
+def build_matrices(lats, lons, calibration):
+    """ {"km", "minutes"}: float32 (n, n) road distance and travel time between station rows. """
+    detour, fixed, pace = calibration
+    points = to_unit_vectors(lats, lons)
+    n = len(points)
+    km = np.empty((n, n), dtype=np.float32)
+    for first in range(0, n, ROW_BLOCK):
+        # |a - b|^2 = 2 - 2 a·b for unit vectors
+        chord2 = np.maximum(2.0 - 2.0 * (points[first:first + ROW_BLOCK] @ points.T), 0.0)
+        km[first:first + ROW_BLOCK] = detour * chord_to_km(np.sqrt(chord2))
+    np.fill_diagonal(km, 0.0)
+    minutes = np.where(km > 0, fixed + pace * km, 0.0).astype(np.float32)
+    return {"km": km, "minutes": minutes}
+
+
+class TravelTimes:
+    """ Road km / minutes between station rows: matrix lookups, or the calibrated model past MAX_MATRIX_STATIONS. """
+    def __init__(self, lats, lons, calibration, km=None, minutes=None):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.detour, self.fixed_minutes, self.minutes_per_km = (float(c) for c in calibration)
+        self.km_matrix      = km
+        self.minutes_matrix = minutes
+
+    def km(self, frm, to):
+        """ Road km from row(s) `frm` to row(s) `to` (float, or an array for array rows). """
+        if self.km_matrix is not None:
+            value = self.km_matrix[frm, to]
+        else:
+            value = self.detour * haversine_km(self.lats[frm], self.lons[frm], self.lats[to], self.lons[to])
+        return float(value) if np.ndim(value) == 0 else np.asarray(value, dtype=float)
+
+    def minutes(self, frm, to):
+        """ Driving minutes from row(s) `frm` to row(s) `to`. """
+        if self.minutes_matrix is not None:
+            value = self.minutes_matrix[frm, to]
+        else:
+            km = self.km(frm, to)
+            value = np.where(np.asarray(km) > 0, self.fixed_minutes + self.minutes_per_km * np.asarray(km), 0.0)
+        return float(value) if np.ndim(value) == 0 else np.asarray(value, dtype=float)
+
+
+def load_travel_times(station_ids, lats, lons, trip_paths, stations_path, read_trips):
+    """
+    TravelTimes for the stations, calibrated on the trips read by `read_trips(path)`
+    for each of `trip_paths`; cached next to the datasets (keyed on those files).
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+
+    def build():
+        calibration = calibrate([read_trips(path) for path in trip_paths], station_ids, lats, lons)
+        arrays = {"calibration": np.array(calibration, dtype=np.float64)}
+        if len(station_ids) <= MAX_MATRIX_STATIONS:
+            arrays.update(build_matrices(lats, lons, calibration))
+        return arrays
+
+    arrays = dataset_cache.cached_arrays("travel_times", [stations_path, *trip_paths], build,
+                                         max_matrix_stations=MAX_MATRIX_STATIONS)
+    return TravelTimes(lats, lons, arrays["calibration"].tolist(), arrays.get("km"), arrays.get("minutes"))
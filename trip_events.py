@@ -0,0 +1,106 @@
+import csv
+import os
+import pandas as pd
+
+TRIP_EVENT_COLUMNS = ["trip_id", "start_time", "end_time", "start_station_id", "end_station_id", "simulated_day"]
+
+# file extension per output format
+TRIP_EVENT_FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+
+class TripEventSink:
+    """
+    Buffers trip events (missed trips, optionally completed ones) in memory
+    and writes them in bulk instead of opening the output file per trip.
+
+    fmt="csv" appends each flush to the CSV (same layout as before).
+    fmt="parquet" / "arrow" (Arrow IPC, readable with pd.read_feather) keep one
+    writer per event kind open from the first flush after reset() and append
+    each flush to it (a row group / record batch); the file is complete once
+    close() runs at the end of the day. Both need pyarrow.
+    """
+    def __init__(self, path, fmt="csv", record_completed=False, flush_rows=10000):
+        if fmt not in TRIP_EVENT_FORMATS:
+            raise ValueError(f"Unknown trip event format '{fmt}', expected one of {list(TRIP_EVENT_FORMATS)}")
+        root, _ = os.path.splitext(path)
+        ext = TRIP_EVENT_FORMATS[fmt]
+        self.fmt = fmt
+        self.record_completed = record_completed
+        self.flush_rows = flush_rows  # flush early if a buffer grows past this many rows
+        self.paths = {
+            "missed":    f"{root}{ext}",
+            "completed": f"{root.replace('missed', 'completed')}{ext}" if "missed" in root else f"{root}_completed{ext}",
+        }
+        self._pending = {"missed": [], "completed": []}   # rows not written yet
+        self._writers = {}                                 # columnar formats: kind -> (open pyarrow writer, schema)
+
+    def reset(self):
+        """Drop buffered rows and start fresh output files (CSV gets just the header)."""
+        self._close_writers()
+        for kind in self._pending:
+            self._pending[kind].clear()
+            if kind == "completed" and not self.record_completed:
+                continue
+            if self.fmt == "csv":
+                with open(self.paths[kind], "w", newline="") as f:
+                    csv.writer(f).writerow(TRIP_EVENT_COLUMNS)
+            elif os.path.exists(self.paths[kind]):
+                os.remove(self.paths[kind])
+
+    def missed(self, trip_id, start_time, end_time, start_station_id, end_station_id, simulated_day):
+        self._add("missed", (trip_id, start_time, end_time, start_station_id, end_station_id, simulated_day))
+
+    def completed(self, trip_id, start_time, end_time, start_station_id, end_station_id, simulated_day):
+        if self.record_completed:
+            self._add("completed", (trip_id, start_time, end_time, start_station_id, end_station_id, simulated_day))
+
+    def _add(self, kind, row):
+        rows = self._pending[kind]
+        rows.append(row)
+        if len(rows) >= self.flush_rows:
+            self._flush_kind(kind)
+
+    def flush(self):
+        """Write every buffered row (call at frame or day boundaries)."""
+        for kind in self._pending:
+            self._flush_kind(kind)
+
+    def close(self):
+        """Flush and finish the columnar files of the day (the CSV needs nothing more)."""
+        self.flush()
+        self._close_writers()
+
+    def _close_writers(self):
+        for writer, _ in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+    def _flush_kind(self, kind):
+        rows = self._pending[kind]
+        if not rows:
+            return
+        path = self.paths[kind]
+        if self.fmt == "csv":
+            write_header = not os.path.exists(path) or os.stat(path).st_size == 0
+            with open(path, "a", newline="") as f:
+                writer = csv.writer(f)
+                if write_header:
+                    writer.writerow(TRIP_EVENT_COLUMNS)
+                writer.writerows(rows)
+        else:
+            import pyarrow as pa
+            df = pd.DataFrame(rows, columns=TRIP_EVENT_COLUMNS)
+            if kind not in self._writers:
+                # the first flush of the day fixes the schema; later flushes are cast to it
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if self.fmt == "parquet":
+                    import pyarrow.parquet as pq
+                    writer = pq.ParquetWriter(path, table.schema)
+                else:
+                    writer = pa.ipc.new_file(path, table.schema)
+                self._writers[kind] = (writer, table.schema)
+            else:
+                writer, schema = self._writers[kind]
+                table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+            writer.write_table(table)
+        rows.clear()
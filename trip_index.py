@@ -0,0 +1,45 @@
+import numpy as np
+
+
+class TripIndex:
+    """
+    Time-sorted, array-backed view of one day of trips.
+    Built once per day; the simulation reads it through a TripCursor so
+    every trip is visited exactly once instead of re-filtering the DataFrame.
+    """
+    def __init__(self, trip_df):
+        df = trip_df.sort_values("start_time", kind="stable")
+
+        # datetime64[ns] keys for searchsorted
+        self.start_keys = df["start_time"].to_numpy(dtype="datetime64[ns]")
+
+        # Plain Python lists: cheap scalar access inside the per-trip loop
+        self.trip_ids    = df["trip_id"].tolist()
+        # (datetime64[us] -> datetime.datetime in C, much faster than building Timestamps)
+        self.start_times = df["start_time"].to_numpy(dtype="datetime64[us]").astype(object).tolist()
+        self.end_times   = df["end_time"].to_numpy(dtype="datetime64[us]").astype(object).tolist()
+        self.start_ids   = df["start_station_id"].astype(str).tolist()
+        self.end_ids     = df["end_station_id"].astype(str).tolist()
+
+    def __len__(self):
+        return len(self.start_keys)
+
+    def position(self, when):
+        """Index of the first trip starting at or after `when`."""
+        return int(np.searchsorted(self.start_keys, np.datetime64(when, "ns"), side="left"))
+
+
+class TripCursor:
+    """Per-run read position into a TripIndex."""
+    def __init__(self, index: TripIndex, start_time):
+        self.index = index
+        self.pos   = index.position(start_time)
+
+    def advance(self, current_time):
+        """
+        Return the range of trips with start_time in [previous position, current_time)
+        and move the cursor past them.
+        """
+        stop = self.index.position(current_time)
+        start, self.pos = self.pos, max(self.pos, stop)
+        return range(start, stop)
@@ -0,0 +1,145 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+import dataset_cache
+
+# Streaming ingestion of one large trip file (e.g. the full year, cleaned to the
+# all_trips_05_05.csv columns): the file is read CHUNK_ROWS rows at a time, every
+# chunk is split by the calendar day of start_time and spilled to disk, and each
+# day then becomes its own memory-mapped entry in datasets/.cache. Only one chunk,
+# or one day, is ever held in memory, and the scan runs once per version of the file.
+#
+#   store = TripStore("datasets/all_trips_2022.csv")
+#   store.dates()                 # ["2022-01-01", ..., "2022-12-31"]
+#   df = store.day("2022-05-05")  # that day's trips, like all_trips_05_05.csv
+
+CHUNK_ROWS   = 200_000
+TRIP_COLUMNS = ["trip_id", "start_time", "end_time", "start_station_id", "end_station_id"]
+
+def date_range(start, end):
+    """ Every date from `start` to `end` (inclusive) as "YYYY-MM-DD" strings. """
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    return [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+
+def _chunk_arrays(chunk):
+    """ One chunk of trips as plain arrays (datetime64[ns] times, string station ids). """
+    return {
+        "trip_id":          chunk["trip_id"].to_numpy(dtype=np.int64),
+        "start_time":       chunk["start_time"].to_numpy(dtype="datetime64[ns]"),
+        "end_time":         chunk["end_time"].to_numpy(dtype="datetime64[ns]"),
+        "start_station_id": chunk["start_station_id"].to_numpy(dtype=str),
+        "end_station_id":   chunk["end_station_id"].to_numpy(dtype=str),
+    }
+
+
+class TripStore:
+    """
+    Day-partitioned view of a trip CSV with (at least) the TRIP_COLUMNS columns.
+    Trips belong to the day they start on; a trip past midnight ends the next day.
+    """
+    def __init__(self, path, chunk_rows=CHUNK_ROWS):
+        self.path       = path
+        self.chunk_rows = chunk_rows
+        self.name       = os.path.splitext(os.path.basename(path))[0]
+        self._dates     = None
+        self._lock      = threading.Lock()  # one partitioning scan at a time
+
+    def dates(self):
+        """ Dates with at least one trip, sorted. Partitions the file on first use. """
+        if self._dates is None:
+            with self._lock:
+                if self._dates is None:
+                    index = dataset_cache.load_arrays(f"{self.name}_days", [self.path])
+                    if index is None:
+                        index = self._partition()[0]
+                    self._dates = index["dates"].tolist()
+        return self._dates
+
+    def day(self, day):
+        """ The trips starting on `day` ("YYYY-MM-DD") as a DataFrame of TRIP_COLUMNS. """
+        if day not in self.dates():
+            raise KeyError(f"no trips on {day} in {self.path}")
+        arrays = dataset_cache.load_arrays(f"{self.name}_{day}", [self.path])
+        if arrays is None:
+            # day entry missing (cache pruned, or a read-only tree): scan again, keep this day
+            with self._lock:
+                arrays = self._partition(keep=day)[1]
+        return pd.DataFrame({column: arrays[column] for column in TRIP_COLUMNS}, copy=False)
+
+    def _partition(self, keep=None):
+        """
+        One pass over the file: spill every chunk's rows per day, then store each day
+        as a cache entry. Returns (the day index, the arrays of day `keep`).
+        """
+        spill  = os.path.join(dataset_cache.CACHE_DIR, f"{self.name}.tmp-days-{os.getpid()}")
+        pieces = defaultdict(int)  # day -> number of spilled pieces
+        counts = {}
+        kept   = None
+        try:
+            reader = pd.read_csv(self.path, usecols=TRIP_COLUMNS, parse_dates=["start_time", "end_time"],
+                                 dtype={"start_station_id": str, "end_station_id": str},
+                                 chunksize=self.chunk_rows)
+            for chunk in reader:
+                arrays = _chunk_arrays(chunk.dropna())
+                days = arrays["start_time"].astype("datetime64[D]")
+                for day in np.unique(days):
+                    rows = days == day
+                    day_dir = os.path.join(spill, str(day))
+                    os.makedirs(day_dir, exist_ok=True)
+                    for column, values in arrays.items():
+                        np.save(os.path.join(day_dir, f"{pieces[str(day)]}.{column}.npy"), values[rows])
+                    pieces[str(day)] += 1
+
+            for day in sorted(pieces):
+                day_dir = os.path.join(spill, day)
+                arrays = {
+                    column: np.concatenate([np.load(os.path.join(day_dir, f"{i}.{column}.npy"))
+                                            for i in range(pieces[day])])
+                    for column in TRIP_COLUMNS
+                }
+                dataset_cache.store_arrays(f"{self.name}_{day}", [self.path], arrays)
+                counts[day] = len(arrays["trip_id"])
+                if day == keep:
+                    kept = arrays
+                shutil.rmtree(day_dir, ignore_errors=True)
+        finally:
+            shutil.rmtree(spill, ignore_errors=True)
+
+        index = dataset_cache.store_arrays(f"{self.name}_days", [self.path], {
+            "dates": np.array(sorted(counts), dtype=str),
+            "trips": np.array([counts[day] for day in sorted(counts)], dtype=np.int64),
+        })
+        return index, kept
+
+
+class DayCache:
+    """
+    {day: load(day)}, loaded on first access. Only the `max_days` most recently
+    used days stay in memory, so a run over months of trips holds a few days at a time.
+    """
+    def __init__(self, load, max_days=8):
+        self.load     = load
+        self.max_days = max_days
+        self._days    = OrderedDict()
+        self._lock    = threading.RLock()  # sessions in other threads read the same days
+
+    def __getitem__(self, day):
+        with self._lock:
+            if day in self._days:
+                self._days.move_to_end(day)
+                return self._days[day]
+            value = self.load(day)
+            self._days[day] = value
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+            return value
+
+    def __contains__(self, day):
+        return day in self._days
+
+    def __len__(self):
+        return len(self._days)
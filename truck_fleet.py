@@ -0,0 +1,195 @@
+import time
+import numpy as np
+from datetime import timedelta
+
+# Redistribution trucks as a fleet: a fixed number of vehicles with a bike capacity,
+# serving (from_row, to_row, qty) moves on multi-stop routes.
+#
+# Every batch of moves (the 3-4h plan, each 12-13h frame of DQN moves) is split into
+# jobs of at most `capacity` bikes and routed by cheapest insertion: each job's pickup
+# and delivery go where they add the fewest driving minutes to some truck's route,
+# as long as the truck never carries more than `capacity` bikes and the route stays
+# under `max_route_minutes`. Several loads can ride together (pickup A, pickup B,
+# drop A, drop B). Routes start where and when each truck finishes its previous
+# batch, so earlier arrival times never move. A job no route can take starts a new
+# route (after the current one) on the truck that finishes first. Planning stops
+# after `budget_s`: whatever is left is appended to the truck that finishes first.
+# With a `deadline` (the end of the rebalancing window) every delivery must be done
+# by then; jobs the fleet cannot fit are left out of the plan, so the caller only
+# takes bikes from the senders of the deliveries it gets back.
+#
+#   fleet = TruckFleet(8, 20, travel_times, depot_row)
+#   deliveries, km = fleet.plan([(3, 17, 12), ...], now, deadline)   # [(3, 17, 12, arrival), ...]
+
+STOP_MINUTES      = 5     # loading or unloading at one stop
+MAX_ROUTE_MINUTES = 90    # duration limit of one route, waiting for the truck excluded
+MAX_ROUTE_STOPS   = 40
+PLAN_BUDGET_S     = 0.2   # insertion time per batch (well inside a 1 s frame)
+
+
+class TruckFleet:
+    """ Positions and next free times of the trucks of one simulated date. """
+    def __init__(self, n_trucks, capacity, travel, depot_row, stop_minutes=STOP_MINUTES,
+                 max_route_minutes=MAX_ROUTE_MINUTES, max_route_stops=MAX_ROUTE_STOPS, budget_s=PLAN_BUDGET_S):
+        self.capacity          = capacity
+        self.travel            = travel   # TravelTimes (travel_times.py)
+        self.stop_minutes      = stop_minutes
+        self.max_route_minutes = max_route_minutes
+        self.max_route_stops   = max_route_stops
+        self.budget_s          = budget_s
+        self.positions = [depot_row] * n_trucks  # station row each truck ends its current route at
+        self.free_at   = [None] * n_trucks       # when it gets there (None = idle since the start)
+
+    def plan(self, moves, now, deadline=None):
+        """
+        Route a batch of (from_row, to_row, qty) moves starting at `now`, every delivery
+        done by `deadline` (None = no limit). Returns ([(from_row, to_row, qty, arrival), ...]
+        one per planned job, total truck km of the batch); jobs that don't fit are left out.
+        """
+        jobs = [(frm, to, min(self.capacity, qty - sent))
+                for frm, to, qty in moves if frm != to
+                for sent in range(0, qty, self.capacity)]
+        if not jobs:
+            return [], 0.0
+
+        waits  = [max((free - now).total_seconds() / 60, 0.0) if free is not None else 0.0
+                  for free in self.free_at]
+        limit  = np.inf if deadline is None else (deadline - now).total_seconds() / 60
+        routes = [Route(position, self, limit - wait) for position, wait in zip(self.positions, waits)]
+
+        stop_at = time.perf_counter() + self.budget_s
+        for job_id, (frm, to, qty) in enumerate(jobs):
+            best = None
+            if time.perf_counter() < stop_at:
+                for t, route in enumerate(routes):
+                    option = route.cheapest_insertion(frm, to, qty)
+                    if option is not None and (best is None or option[0] < best[1][0]):
+                        best = (t, option)
+            if best is None:
+                # no route can take it (or over budget): the truck that finishes first starts another
+                t = min(range(len(routes)), key=lambda t: waits[t] + routes[t].minutes)
+                route = routes[t]
+                sealed = route.first, route.opened
+                route.seal()
+                if time.perf_counter() < stop_at:
+                    option = route.cheapest_insertion(frm, to, qty)
+                else:
+                    option = route.appended(frm, to)
+                if option is None:
+                    route.first, route.opened = sealed
+                    continue  # not deliverable by the deadline: left unplanned
+                best = (t, option)
+            t, (_, i, j) = best
+            routes[t].insert(job_id, frm, to, qty, i, j)
+
+        deliveries, km = [], 0.0
+        for t, route in enumerate(routes):
+            if not route.rows:
+                continue
+            done = route.stop_done_minutes()
+            for (job_id, kind), finished in zip(route.stops, done):
+                if kind == "drop":
+                    frm, to, qty = jobs[job_id]
+                    deliveries.append((frm, to, qty, now + timedelta(minutes=waits[t] + finished)))
+            km += route.km()
+            self.positions[t] = route.rows[-1]
+            self.free_at[t]   = now + timedelta(minutes=waits[t] + done[-1])
+        return deliveries, km
+
+
+class Route:
+    """
+    One truck's stops in this batch: station rows, load after each stop, (job, "pick"/"drop").
+    Stops before `first` belong to earlier, sealed routes and are not changed any more.
+    Every stop must be done within `horizon` minutes of the route start.
+    """
+    def __init__(self, origin, fleet, horizon=np.inf):
+        self.origin  = origin
+        self.fleet   = fleet
+        self.horizon = horizon
+        self.rows    = []
+        self.loads   = []
+        self.stops   = []
+        self.qty     = {}   # job -> bikes
+        self.minutes = 0.0  # driving + handling time of the stops so far
+        self.first   = 0    # first stop of the open route
+        self.opened  = 0.0  # minutes at which the open route started
+
+    def seal(self):
+        """ Close the open route (empty truck at its last stop); later jobs go after it. """
+        self.first, self.opened = len(self.rows), self.minutes
+
+    def _nodes(self):
+        return np.array([self.origin] + self.rows, dtype=np.int64)
+
+    def cheapest_insertion(self, pickup, drop, qty):
+        """
+        (added minutes, i, j) for the cheapest feasible insertion of the pickup before
+        stop i and the drop before stop j (first <= i <= j, original positions), or None.
+        """
+        fleet = self.fleet
+        L = len(self.rows)
+        if L - self.first + 2 > fleet.max_route_stops:
+            return None
+        travel = fleet.travel
+        nodes  = self._nodes()  # nodes[k] comes right before insertion position k
+        legs   = travel.minutes(nodes[:-1], nodes[1:]) if L else np.empty(0)
+
+        def visit(first, last):
+            # minutes of nodes[k] -> first ... last -> nodes[k + 1] instead of nodes[k] -> nodes[k + 1]
+            cost = np.asarray(travel.minutes(nodes, np.full(L + 1, first)), dtype=float)
+            if first != last:
+                cost += travel.minutes(first, last)
+            if L:
+                cost[:-1] += travel.minutes(np.full(L, last), nodes[1:]) - legs
+            return cost
+
+        added = visit(pickup, pickup)[:, None] + visit(drop, drop)[None, :]
+        np.fill_diagonal(added, visit(pickup, drop))  # pickup and drop back to back
+        added += 2 * fleet.stop_minutes
+
+        # load entering each position; between the pickup and the drop it grows by qty
+        before = np.concatenate([[0], self.loads]).astype(float)
+        upper  = np.triu(np.ones((L + 1, L + 1), dtype=bool))
+        upper[:self.first] = False
+        peak   = np.maximum.accumulate(np.where(upper, before[None, :], -np.inf), axis=1)
+        duration = self.minutes - self.opened + added
+        feasible = (upper & (peak + qty <= fleet.capacity) & (duration <= fleet.max_route_minutes)
+                    & (self.minutes + added <= self.horizon))
+        if not feasible.any():
+            return None
+        i, j = divmod(int(np.argmin(np.where(feasible, added, np.inf))), L + 1)
+        return float(added[i, j]), i, j
+
+    def appended(self, pickup, drop):
+        """ (added minutes, L, L) for the job after the last stop, or None past the horizon. """
+        last  = self.rows[-1] if self.rows else self.origin
+        added = (self.fleet.travel.minutes(last, pickup) + self.fleet.travel.minutes(pickup, drop)
+                 + 2 * self.fleet.stop_minutes)
+        if self.minutes + added > self.horizon:
+            return None
+        return added, len(self.rows), len(self.rows)
+
+    def insert(self, job_id, pickup, drop, qty, i, j):
+        """ Pickup before original stop i, drop before original stop j (i <= j). """
+        self.rows.insert(j, drop)
+        self.stops.insert(j, (job_id, "drop"))
+        self.rows.insert(i, pickup)
+        self.stops.insert(i, (job_id, "pick"))
+        self.qty[job_id] = qty
+
+        load, self.loads = 0, []
+        for stop_job, kind in self.stops:
+            load += self.qty[stop_job] if kind == "pick" else -self.qty[stop_job]
+            self.loads.append(load)
+        self.minutes = float(self.stop_done_minutes()[-1])
+
+    def stop_done_minutes(self):
+        """ Minutes from the route start until each stop's loading/unloading is done. """
+        nodes = self._nodes()
+        legs  = np.asarray(self.fleet.travel.minutes(nodes[:-1], nodes[1:]), dtype=float)
+        return np.cumsum(legs + self.fleet.stop_minutes)
+
+    def km(self):
+        nodes = self._nodes()
+        return float(np.sum(self.fleet.travel.km(nodes[:-1], nodes[1:])))